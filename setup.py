@@ -19,7 +19,7 @@ def copy_config_example():
     
     if not config_file.exists():
         if config_example.exists():
-            shutil.copy(config_example, config_file)
+            shutil.copyfile(config_example, config_file)
             print("✓ Создан файл конфигурации config_prod/app.yaml")
             print("  Пожалуйста, отредактируйте его и заполните своими значениями")
         else:
@@ -30,6 +30,29 @@ def copy_config_example():
     
     return True
 
+def requirements_satisfied(requirements_file):
+    """Проверяет, установлены ли уже все зависимости нужных версий"""
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+        from packaging.requirements import Requirement
+    except ImportError:
+        return False
+    
+    with open(requirements_file, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    
+    for line in lines:
+        try:
+            requirement = Requirement(line)
+            if not requirement.specifier.contains(version(requirement.name), prereleases=True):
+                return False
+        except PackageNotFoundError:
+            return False
+        except Exception:
+            return False
+    
+    return True
+
 def install_dependencies():
     """Устанавливает зависимости Python из requirements_prod.txt"""
     requirements_file = "requirements_prod.txt"
@@ -38,9 +61,21 @@ def install_dependencies():
         print(f"✗ Файл {requirements_file} не найден")
         return False
     
+    if requirements_satisfied(requirements_file):
+        print("✓ Зависимости уже установлены")
+        return True
+    
+    # Локальный кэш pip: повторные установки берут готовые wheel-файлы
+    cache_dir = Path(".pipcache")
+    cache_dir.mkdir(exist_ok=True)
+    
     try:
+        print("Обновление pip и wheel...")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "-U", "pip", "wheel",
+                               "--cache-dir", str(cache_dir)])
         print("Установка зависимостей Python...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", requirements_file])
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", requirements_file,
+                               "--prefer-binary", "--cache-dir", str(cache_dir)])
         print("✓ Зависимости успешно установлены")
         return True
     except subprocess.CalledProcessError as e:
@@ -0,0 +1,74 @@
+"""
+Асинхронный вызов Gemini через httpx.AsyncClient.
+Используется ai_pipeline.run_all_summaries при ai.async_http: true —
+независимые промты идут конкурентно через один клиент (HTTP/2, если установлен h2).
+"""
+import asyncio
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+import ai_mod
+
+
+def new_client(config):
+    """
+    Создает AsyncClient для одного event loop (клиент нельзя переиспользовать между asyncio.run).
+    Закрывать через `async with`.
+    """
+    timeout_sec = config.get('ai', {}).get('timeout_sec', 20)
+    return httpx.AsyncClient(
+        http2=H2_AVAILABLE,
+        timeout=timeout_sec,
+        limits=httpx.Limits(max_keepalive_connections=8),
+    )
+
+
+async def acall_model(client, prompt_id: int, input_text: str, config, log) -> dict:
+    """
+    Асинхронный аналог ai_mod.call_model: тот же цикл ai_mod._call_steps (фолбэки
+    по моделям и ключам, ретраи с backoff, формат результата) и тот же кэш
+    ai.cache_results; здесь — только ожидание запросов через httpx и пауз через asyncio.sleep.
+    """
+    if not config.get('ai', {}).get('cache_results', False):
+        return await _acall_model_impl(client, prompt_id, input_text, config, log)
+    
+    cached = ai_mod._cached_result(prompt_id, input_text, log)
+    if cached is not None:
+        return cached
+    result = await _acall_model_impl(client, prompt_id, input_text, config, log)
+    return ai_mod._store_result(prompt_id, input_text, result, config)
+
+
+async def _acall_model_impl(client, prompt_id: int, input_text: str, config, log) -> dict:
+    settings, error_result = ai_mod._prepare_call(prompt_id, input_text, config, log)
+    if error_result is not None:
+        return error_result
+    
+    payload = settings["payload"]
+    steps = ai_mod._call_steps(settings, log, "ai_async")
+    try:
+        step = next(steps)
+        while True:
+            if isinstance(step, str):
+                try:
+                    reply = (await client.post(step, json=payload), None, False)
+                except httpx.TimeoutException as e:
+                    reply = (None, e, True)
+                except Exception as e:
+                    reply = (None, e, False)
+            else:
+                await asyncio.sleep(step)
+                reply = None
+            step = steps.send(reply)
+    except StopIteration as stop:
+        return stop.value
@@ -1,8 +1,21 @@
 import time
 import json
 import re
+import random
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, List
 
+try:
+    # orjson заметно быстрее на больших ответах модели; его JSONDecodeError
+    # наследуется от json.JSONDecodeError, поэтому обработка ошибок не меняется
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
 try:
     from google import genai
     GENAI_AVAILABLE = True
@@ -14,8 +27,36 @@ except ImportError:
 import prompt_notion
 import notion_mod
 
+# Регулярные выражения, используемые на каждом транскрипте
+_JSON_BLOB_RE = re.compile(r'\{.*\}', re.DOTALL)
+_ERR_503_RE = re.compile(r'^(?=.*503)(?=.*(?:unavailable|overloaded|try again later))', re.IGNORECASE | re.DOTALL)
+_PLACEHOLDER_RE = re.compile(r'<<<(\w+)>>>')
+
+# Источник джиттера для задержек между повторами
+_JITTER = random.SystemRandom()
+
+# Сколько символов ответа на запрос 4 достаточно для разбора короткого саммари
+SHORT_SCAN_CHARS = 4096
+
+# Откатные промты на случай, если в Notion нет нужного
+FALLBACK_PROMPTS = {
+    'P1_CLEAN': "Очисти транскрипт от рекламы, спонсорских вставок, CTA. Верни JSON: {{\"clean\":\"текст\", \"links\":[\"ссылки\"]}}. Транскрипт: <<<transcript>>>",
+    'P2_FULL_EXPANDED': "По чистому тексту дай максимально полезное ПОЛНОЕ саммари. Текст: <<<clean_text>>>",
+    'P3_MIDDLE_800': "Суммаризируй чистый текст до 800 символов. Текст: <<<clean_text>>>",
+    'P4_SHORT_300_TITLECHECK': "Короткое саммари до 300 символов. Текст: <<<clean_text>>>",
+    'P5_RESOURCES_FACT': "По чистому тексту выдай список упомянутых ресурсов/ссылок. Текст: <<<clean_text>>>",
+}
+
+# Кэш промтов из Notion: промты меняются редко, а загрузка стоит отдельного запроса
+_PROMPTS_CACHE = {"data": None, "ts": 0.0}
+_PROMPTS_LOCK = threading.Lock()
+
+# Кэш клиента google-genai: переиспользуем его между транскриптами
+_CLIENT_CACHE = {"client": None, "key_index": None}
+_CLIENT_LOCK = threading.Lock()
+
 def init_chat_client(config, log) -> Optional[Any]:
-    """Инициализирует клиент google-genai"""
+    """Инициализирует клиент google-genai (или возвращает закэшированный)"""
     if not GENAI_AVAILABLE:
         log("ERROR", "ai_chat", "google-genai не установлен. Установите: pip install google-genai")
         return None
@@ -27,31 +68,86 @@ def init_chat_client(config, log) -> Optional[Any]:
         log("ERROR", "ai_chat", "API ключи не настроены")
         return None
     
-    # Пробуем первый доступный ключ
-    for key_index, api_key in enumerate(api_keys):
-        try:
-            # Настраиваем API ключ через environment или конфигурацию
-            # Примечание: google-genai может требовать настройки через переменные окружения
-            import os
-            os.environ['GOOGLE_API_KEY'] = api_key
-            
-            client = genai.Client()
-            log("INFO", "ai_chat", "Google GenAI клиент инициализирован", key_index=key_index)
-            return client
-        except Exception as e:
-            log("WARNING", "ai_chat", f"Ошибка с API ключом {key_index}", error=str(e))
-            continue
+    with _CLIENT_LOCK:
+        if _CLIENT_CACHE["client"] is not None:
+            return _CLIENT_CACHE["client"]
+        
+        # Начинаем с ключа, который шел следующим после последнего рабочего
+        start_index = _CLIENT_CACHE["key_index"] or 0
+        for offset in range(len(api_keys)):
+            key_index = (start_index + offset) % len(api_keys)
+            try:
+                # Передаем ключ напрямую, не трогая os.environ
+                client = genai.Client(api_key=api_keys[key_index])
+                _CLIENT_CACHE["client"] = client
+                _CLIENT_CACHE["key_index"] = key_index
+                log("INFO", "ai_chat", "Google GenAI клиент инициализирован", key_index=key_index)
+                return client
+            except Exception as e:
+                log("WARNING", "ai_chat", f"Ошибка с API ключом {key_index}", error=str(e))
+                continue
     
     log("ERROR", "ai_chat", "Все API ключи исчерпаны")
     return None
 
-def load_prompts_from_notion(config, log) -> Dict[str, str]:
+def reset_chat_client(log) -> None:
+    """Сбрасывает закэшированный клиент, следующий init_chat_client возьмет следующий ключ"""
+    with _CLIENT_LOCK:
+        if _CLIENT_CACHE["client"] is None:
+            return
+        _CLIENT_CACHE["client"] = None
+        _CLIENT_CACHE["key_index"] = (_CLIENT_CACHE["key_index"] or 0) + 1
+    log("WARNING", "ai_chat", "Клиент google-genai сброшен, при следующем вызове будет взят другой ключ")
+
+def _error_status_code(error: Exception) -> Optional[int]:
+    """Возвращает HTTP-код из атрибутов исключения (code/status_code), если он есть"""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code if isinstance(code, int) else None
+
+def is_auth_error(error: Exception) -> bool:
+    """Проверяет, является ли ошибка проблемой с API ключом (401/403/невалидный ключ)"""
+    code = _error_status_code(error)
+    if code is not None:
+        return code in (401, 403)
+    error_str = str(error).lower()
+    return ("401" in error_str or "403" in error_str or "api key not valid" in error_str
+            or "permission_denied" in error_str or "unauthenticated" in error_str)
+
+def load_prompts_from_notion(config, log, force_refresh: bool = False) -> Dict[str, str]:
     """
-    Загружает промты из Notion базы данных
+    Загружает промты из Notion базы данных.
+    Результат кэшируется на ai.prompts_ttl_sec секунд (по умолчанию 300).
+    
+    Args:
+        force_refresh: игнорировать кэш и перечитать промты из Notion
     
     Returns:
         Словарь {prompt_name: prompt_text}
     """
+    ttl_sec = config.get('ai', {}).get('prompts_ttl_sec', 300)
+    
+    with _PROMPTS_LOCK:
+        cached = _PROMPTS_CACHE["data"]
+        if not force_refresh and cached and time.time() - _PROMPTS_CACHE["ts"] < ttl_sec:
+            log("DEBUG", "ai_chat", "Промты взяты из кэша", prompts_count=len(cached))
+            return cached
+        
+        prompts = _fetch_prompts_from_notion(config, log)
+        if prompts:
+            _fill_missing_prompts(prompts, log)
+            _PROMPTS_CACHE["data"] = prompts
+            _PROMPTS_CACHE["ts"] = time.time()
+        return prompts
+
+def _fill_missing_prompts(prompts: Dict[str, str], log) -> None:
+    """Подставляет откатные промты вместо отсутствующих в Notion (один раз при загрузке)"""
+    for name, fallback in FALLBACK_PROMPTS.items():
+        if not prompts.get(name):
+            log("ERROR", "ai_chat", f"Промт {name} не найден в Notion, используем откатный")
+            prompts[name] = fallback
+
+def _fetch_prompts_from_notion(config, log) -> Dict[str, str]:
+    """Читает все промты из Notion без использования кэша"""
     try:
         # Инициализируем Notion клиент
         notion_client = notion_mod.init_client(config, log)
@@ -69,7 +165,7 @@ def load_prompts_from_notion(config, log) -> Dict[str, str]:
         prompts = prompt_notion.get_all_prompts_from_notion(notion_client, prompts_db_id, log)
         
         log("INFO", "ai_chat", f"Загружено {len(prompts)} промтов из Notion", 
-            prompts=list(prompts.keys()))
+            _lazy=lambda: {"prompts": list(prompts.keys())})
         
         return prompts
         
@@ -77,49 +173,118 @@ def load_prompts_from_notion(config, log) -> Dict[str, str]:
         log("ERROR", "ai_chat", "Ошибка загрузки промтов из Notion", error=str(e))
         return {}
 
+@lru_cache(maxsize=64)
+def _compile_template(template: str) -> tuple:
+    """Разбивает шаблон промта на (текст, имя, текст, имя, ..., текст) один раз"""
+    return tuple(_PLACEHOLDER_RE.split(template))
+
+def render_prompt_parts(template: str, **values) -> List[str]:
+    """
+    Подставляет значения в плейсхолдеры <<<name>>> шаблона, но не склеивает результат.
+    Список частей можно передать в contents как multi-part запрос, не копируя
+    большой текст (например, clean_text) в отдельную строку для каждого промта.
+    Неизвестные плейсхолдеры остаются как есть, пустые части отбрасываются.
+    """
+    parts = list(_compile_template(template))
+    for i in range(1, len(parts), 2):
+        name = parts[i]
+        parts[i] = values[name] if name in values else f"<<<{name}>>>"
+    return [part for part in parts if part]
+
+def render_prompt(template: str, **values) -> str:
+    """
+    Подставляет значения в плейсхолдеры <<<name>>> шаблона.
+    Шаблон разбирается один раз, дальше это одна склейка частей.
+    """
+    return ''.join(render_prompt_parts(template, **values))
+
+def _fast_json_present(text: str) -> bool:
+    """Быстрая проверка: без '{' в ответе JSON-объекта точно нет"""
+    return '{' in text
+
+def _extract_json(text: str, default: Optional[dict] = None) -> Optional[dict]:
+    """
+    Достает JSON-объект из ответа модели: сначала весь текст, затем первый блок {...}.
+    Возвращает default, если объект найти не удалось.
+    """
+    if not _fast_json_present(text):
+        return default
+    try:
+        data = _json_loads(text)
+    except json.JSONDecodeError:
+        json_match = _JSON_BLOB_RE.search(text)
+        if not json_match:
+            return default
+        try:
+            data = _json_loads(json_match.group(0))
+        except json.JSONDecodeError:
+            return default
+    return data if isinstance(data, dict) else default
+
+def _format_resource(i: int, resource: dict) -> str:
+    """Форматирует ресурс из resources_real_world: '<N>. <name> - <access>[ - <notes>]'"""
+    name = resource.get("name", f"Ресурс {i}")
+    access = resource.get("access_real", "unknown")
+    notes = resource.get("notes", "")
+    sep = " - " if notes else ""
+    return f"{i}. {name} - {access}{sep}{notes}"
+
 def is_503_error(error: Exception) -> bool:
     """Проверяет, является ли ошибка 503 UNAVAILABLE"""
-    error_str = str(error).lower()
-    return "503" in error_str and ("unavailable" in error_str or "overloaded" in error_str or "try again later" in error_str)
+    # Ошибки SDK несут HTTP-код в атрибуте, тогда текст ошибки не разбираем
+    code = _error_status_code(error)
+    if code is not None:
+        return code == 503
+    return bool(_ERR_503_RE.search(str(error)))
 
-def retry_on_503(func, max_retries: int = 3, backoff_ms: List[int] = [1000, 2000, 4000], log=None):
+def retry_on_503(func, max_retries: int = 3, backoff_ms: List[int] = [1000, 2000, 4000], log=None,
+                 rotate_key=None, deadline_sec: Optional[float] = None):
     """
     Выполняет функцию с повторами при ошибке 503 UNAVAILABLE
     
+    Задержка растет экспоненциально от backoff_ms[0] (base * 2^i) со случайной
+    добавкой до base/2, чтобы параллельные запросы не повторялись синхронно.
+    
     Args:
         func: функция для выполнения
         max_retries: максимальное количество повторов
-        backoff_ms: задержки между повторами в миллисекундах
+        backoff_ms: задержки между повторами в миллисекундах (первая берется как база)
         log: функция логирования
+        rotate_key: функция переключения на следующий API ключ перед повтором
+        deadline_sec: общий лимит времени на все попытки в секундах
         
     Returns:
         Результат выполнения функции или None при исчерпании попыток
     """
-    last_error = None
-    
-    # Первый вызов без задержки
-    try:
-        return func()
-    except Exception as e:
-        last_error = e
-        if not is_503_error(e):
-            # Если это не 503 ошибка, пробрасываем её дальше
-            raise e
+    base_ms = backoff_ms[0] if backoff_ms else 1000
+    start = time.monotonic()
+    attempt = 0
     
-    # Повторы с задержкой
-    for i, delay_ms in enumerate(backoff_ms[:max_retries]):
-        if log:
-            log("WARNING", "ai_chat", f"Ошибка 503 UNAVAILABLE, повтор {i+1}/{max_retries} через {delay_ms}мс")
-        
-        time.sleep(delay_ms / 1000.0)
-        
+    while True:
         try:
             return func()
         except Exception as e:
-            last_error = e
             if not is_503_error(e):
                 # Если это не 503 ошибка, пробрасываем её дальше
                 raise e
+            last_error = e
+        
+        if attempt >= max_retries:
+            break
+        
+        delay_ms = base_ms * (2 ** attempt) + _JITTER.uniform(0, base_ms / 2)
+        if deadline_sec is not None and time.monotonic() - start + delay_ms / 1000.0 > deadline_sec:
+            if log:
+                log("ERROR", "ai_chat", "Превышен лимит времени на повторы после 503 UNAVAILABLE", deadline_sec=deadline_sec)
+            raise last_error
+        
+        if log:
+            log("WARNING", "ai_chat", f"Ошибка 503 UNAVAILABLE, повтор {attempt+1}/{max_retries} через {int(delay_ms)}мс")
+        
+        time.sleep(delay_ms / 1000.0)
+        if rotate_key:
+            rotate_key()
+        attempt += 1
     
     # Исчерпаны все попытки
     if log:
@@ -147,12 +312,19 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
         "short_summary": str,
         "resources": List[str],
         "error": None|dict,
-        "performance": dict  # для измерения производительности
+        "performance": dict,  # для измерения производительности
+        "failed_requests": List[int]  # номера запросов 2-5, завершившихся ошибкой
     }
     """
     start_time = time.time()
     log("INFO", "ai_chat", "Начинаем независимую AI обработку с промтами из Notion", input_len=len(transcript_text))
     
+    # Промты из Notion загружаем в фоне, пока инициализируется AI клиент
+    prompts_load_start = time.time()
+    prompts_executor = ThreadPoolExecutor(max_workers=1)
+    prompts_future = prompts_executor.submit(load_prompts_from_notion, config, log)
+    prompts_executor.shutdown(wait=False)
+    
     # Инициализируем клиент
     client = init_chat_client(config, log)
     if not client:
@@ -167,9 +339,8 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
             "performance": {}
         }
     
-    # Загружаем промты из Notion
-    prompts_load_start = time.time()
-    prompts = load_prompts_from_notion(config, log)
+    # Дожидаемся промтов из Notion
+    prompts = prompts_future.result()
     prompts_load_time = int((time.time() - prompts_load_start) * 1000)
     
     if not prompts:
@@ -189,6 +360,16 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
     model = ai_config.get('model_primary', 'gemini-2.5-flash')
     max_retries = ai_config.get('max_retries', 3)
     backoff_ms = ai_config.get('backoff_ms', [1000, 2000, 4000])
+    retry_deadline_sec = ai_config.get('retry_deadline_sec')
+    
+    # При 503 переключаемся на следующий ключ, если их несколько
+    rotate_key = None
+    if len(ai_config.get('api_keys', [])) > 1:
+        rotate_key = lambda: reset_chat_client(log)
+    
+    def current_client():
+        # Клиент мог смениться после ротации ключа
+        return init_chat_client(config, log) or client
     
     try:
         results = {
@@ -199,44 +380,30 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
             "short_summary": "",
             "resources": [],
             "error": None,
-            "performance": {"prompts_load_ms": prompts_load_time}
+            "performance": {"prompts_load_ms": prompts_load_time},
+            "failed_requests": []
         }
         
         # ЗАПРОС 1: Очистка транскрипта (используем промт из Notion)
-        clean_template = prompts.get('P1_CLEAN', '')
-        if not clean_template:
-            log("ERROR", "ai_chat", "Промт P1_CLEAN не найден в Notion")
-            # Откатный промт
-            clean_template = "Очисти транскрипт от рекламы, спонсорских вставок, CTA. Верни JSON: {{\"clean\":\"текст\", \"links\":[\"ссылки\"]}}. Транскрипт: <<<transcript>>>"
+        clean_template = prompts['P1_CLEAN']
         
         # Подставляем транскрипт в промт
-        clean_prompt = clean_template.replace('<<<transcript>>>', transcript_text)
+        clean_prompt = render_prompt(clean_template, transcript=transcript_text)
         
         log("INFO", "ai_chat", "Запрос 1: Очистка транскрипта")
         request1_start = time.time()
         
         def make_request1():
-            chat1 = client.chats.create(model=model)
-            return chat1.send_message(clean_prompt)
+            return current_client().models.generate_content(model=model, contents=clean_prompt)
         
-        response1 = retry_on_503(make_request1, max_retries, backoff_ms, log)
+        response1 = retry_on_503(make_request1, max_retries, backoff_ms, log, rotate_key, retry_deadline_sec)
         request1_time = int((time.time() - request1_start) * 1000)
         results["performance"]["request1_ms"] = request1_time
         
         clean_response = response1.text.strip()
         
         # Парсим JSON ответ очистки
-        try:
-            clean_data = json.loads(clean_response)
-        except json.JSONDecodeError:
-            json_match = re.search(r'\{.*\}', clean_response, re.DOTALL)
-            if json_match:
-                try:
-                    clean_data = json.loads(json_match.group(0))
-                except json.JSONDecodeError:
-                    clean_data = {"clean": "", "links": []}
-            else:
-                clean_data = {"clean": "", "links": []}
+        clean_data = _extract_json(clean_response, {"clean": "", "links": []})
         
         results["clean_text"] = clean_data.get("clean", "")
         results["links"] = clean_data.get("links", [])
@@ -247,64 +414,86 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
         
         clean_text = results["clean_text"]
         
-        # ЗАПРОС 2: Полное саммари (используем промт из Notion)
-        full_template = prompts.get('P2_FULL_EXPANDED', '')
-        if not full_template:
-            log("ERROR", "ai_chat", "Промт P2_FULL_EXPANDED не найден в Notion")
-            full_template = "По чистому тексту дай максимально полезное ПОЛНОЕ саммари. Текст: <<<clean_text>>>"
+        # Промты 2-5 собираем из частей: clean_text передается одной и той же строкой
+        # во все четыре запроса, без склейки отдельной копии под каждый промт
         
-        full_prompt = full_template.replace('<<<clean_text>>>', clean_text)
+        # ЗАПРОС 2: Полное саммари (используем промт из Notion)
+        full_template = prompts['P2_FULL_EXPANDED']
         
-        log("INFO", "ai_chat", "Запрос 2: Полное саммари")
-        request2_start = time.time()
+        full_prompt = render_prompt_parts(full_template, clean_text=clean_text)
         
         def make_request2():
-            chat2 = client.chats.create(model=model)
-            return chat2.send_message(full_prompt)
+            return current_client().models.generate_content(model=model, contents=full_prompt)
+        
+        # ЗАПРОС 3: Среднее саммари (используем промт из Notion)
+        middle_template = prompts['P3_MIDDLE_800']
         
-        response2 = retry_on_503(make_request2, max_retries, backoff_ms, log)
-        request2_time = int((time.time() - request2_start) * 1000)
-        results["performance"]["request2_ms"] = request2_time
+        middle_prompt = render_prompt_parts(middle_template, clean_text=clean_text)
         
-        results["full_summary"] = response2.text.strip()
+        def make_request3():
+            return current_client().models.generate_content(model=model, contents=middle_prompt)
         
-        # ЗАПРОС 3: Среднее саммари (используем промт из Notion)
-        middle_template = prompts.get('P3_MIDDLE_800', '')
-        if not middle_template:
-            log("ERROR", "ai_chat", "Промт P3_MIDDLE_800 не найден в Notion")
-            middle_template = "Суммаризируй чистый текст до 800 символов. Текст: <<<clean_text>>>"
+        # ЗАПРОС 4: Короткое саммари (используем промт из Notion)
+        short_template = prompts['P4_SHORT_300_TITLECHECK']
         
-        middle_prompt = middle_template.replace('<<<clean_text>>>', clean_text)
+        # Подставляем очищенный текст и заголовок (если есть)
+        short_prompt = render_prompt_parts(short_template, clean_text=clean_text,
+                                           video_title='неопределено')  # Заголовок по умолчанию
         
-        log("INFO", "ai_chat", "Запрос 3: Среднее саммари")
-        request3_start = time.time()
+        def make_request4():
+            return current_client().models.generate_content(model=model, contents=short_prompt)
         
-        def make_request3():
-            chat3 = client.chats.create(model=model)
-            return chat3.send_message(middle_prompt)
+        # ЗАПРОС 5: Ресурсы (используем промт из Notion)
+        resources_template = prompts['P5_RESOURCES_FACT']
         
-        response3 = retry_on_503(make_request3, max_retries, backoff_ms, log)
-        request3_time = int((time.time() - request3_start) * 1000)
-        results["performance"]["request3_ms"] = request3_time
+        # Подставляем очищенный текст
+        links_str = ', '.join(results['links']) if results['links'] else 'нет'
+        resources_prompt = render_prompt_parts(resources_template, clean_text=clean_text)
         
-        middle_response = response3.text.strip()
+        def make_request5():
+            return current_client().models.generate_content(model=model, contents=resources_prompt)
+        
+        # Запросы 2-5 зависят только от clean_text, поэтому выполняем их параллельно.
+        # Ошибка одного запроса не отменяет остальные: исключение возвращается вместо ответа
+        def timed_request(func):
+            request_start = time.time()
+            try:
+                response = retry_on_503(func, max_retries, backoff_ms, log, rotate_key, retry_deadline_sec)
+            except Exception as e:
+                response = e
+            return response, int((time.time() - request_start) * 1000)
+        
+        log("INFO", "ai_chat", "Запросы 2-5: Полное, среднее, короткое саммари и ресурсы (параллельно)")
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {
+                number: executor.submit(timed_request, func)
+                for number, func in ((2, make_request2), (3, make_request3),
+                                     (4, make_request4), (5, make_request5))
+            }
+            responses = {}
+            for number, future in futures.items():
+                responses[number], results["performance"][f"request{number}_ms"] = future.result()
+        
+        failed = {number: e for number, e in responses.items() if isinstance(e, Exception)}
+        if len(failed) == len(responses):
+            # Ни один запрос не прошел — это общая ошибка обработки
+            raise failed[2]
+        for number, e in failed.items():
+            log("ERROR", "ai_chat", "Запрос завершился ошибкой, поле останется пустым", request=number, error=str(e))
+            if is_auth_error(e):
+                reset_chat_client(log)
+        results["failed_requests"] = sorted(failed)
+        
+        def response_text(number):
+            return "" if number in failed else responses[number].text
+        
+        results["full_summary"] = response_text(2).strip()
+        
+        middle_response = response_text(3).strip()
         
         # Парсим ответ для среднего саммари (может быть JSON или простой текст)
-        middle_text = middle_response
-        try:
-            # Пробуем парсить как JSON
-            middle_data = json.loads(middle_response)
-            middle_text = middle_data.get("middle_800", middle_response)
-        except json.JSONDecodeError:
-            # Если не JSON, ищем JSON в тексте
-            json_match = re.search(r'\{.*\}', middle_response, re.DOTALL)
-            if json_match:
-                try:
-                    middle_data = json.loads(json_match.group(0))
-                    middle_text = middle_data.get("middle_800", middle_response)
-                except json.JSONDecodeError:
-                    # Оставляем как обычный текст
-                    middle_text = middle_response
+        middle_data = _extract_json(middle_response)
+        middle_text = middle_data.get("middle_800", middle_response) if middle_data else middle_response
         
         # Проверяем лимит 800 символов
         if len(middle_text) > 800:
@@ -312,28 +501,9 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
         
         results["middle_summary"] = middle_text
         
-        # ЗАПРОС 4: Короткое саммари (используем промт из Notion)
-        short_template = prompts.get('P4_SHORT_300_TITLECHECK', '')
-        if not short_template:
-            log("ERROR", "ai_chat", "Промт P4_SHORT_300_TITLECHECK не найден в Notion")
-            short_template = "Короткое саммари до 300 символов. Текст: <<<clean_text>>>"
-        
-        # Подставляем очищенный текст и заголовок (если есть)
-        short_prompt = short_template.replace('<<<clean_text>>>', clean_text)
-        short_prompt = short_prompt.replace('<<<video_title>>>', 'неопределено')  # По умолчанию
-        
-        log("INFO", "ai_chat", "Запрос 4: Короткое саммари")
-        request4_start = time.time()
-        
-        def make_request4():
-            chat4 = client.chats.create(model=model)
-            return chat4.send_message(short_prompt)
-        
-        response4 = retry_on_503(make_request4, max_retries, backoff_ms, log)
-        request4_time = int((time.time() - request4_start) * 1000)
-        results["performance"]["request4_ms"] = request4_time
-        
-        short_response = response4.text.strip()
+        # Из короткого саммари нужны только первые строки и 300 символов,
+        # поэтому не прогоняем strip по всему (возможно огромному) ответу
+        short_response = response_text(4)[:SHORT_SCAN_CHARS].strip()
         
         # Парсим ответ нового формата (3 строки)
         lines = short_response.split('\n')
@@ -347,80 +517,17 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
         else:
             results["short_summary"] = short_response[:300]
         
-        # ЗАПРОС 5: Ресурсы (используем промт из Notion)
-        resources_template = prompts.get('P5_RESOURCES_FACT', '')
-        if not resources_template:
-            log("ERROR", "ai_chat", "Промт P5_RESOURCES_FACT не найден в Notion")
-            resources_template = "По чистому тексту выдай список упомянутых ресурсов/ссылок. Текст: <<<clean_text>>>"
-        
-        # Подставляем очищенный текст
-        links_str = ', '.join(results['links']) if results['links'] else 'нет'
-        resources_prompt = resources_template.replace('<<<clean_text>>>', clean_text)
-        
-        log("INFO", "ai_chat", "Запрос 5: Ресурсы")
-        request5_start = time.time()
-        
-        def make_request5():
-            chat5 = client.chats.create(model=model)
-            return chat5.send_message(resources_prompt)
-        
-        response5 = retry_on_503(make_request5, max_retries, backoff_ms, log)
-        request5_time = int((time.time() - request5_start) * 1000)
-        results["performance"]["request5_ms"] = request5_time
-        
-        resources_response = response5.text.strip()
+        resources_response = response_text(5).strip()
         
         # Парсим ответ для ресурсов (может быть JSON или простой список)
-        resources_list = []
-        try:
-            # Пробуем парсить как JSON
-            resources_data = json.loads(resources_response)
+        resources_data = _extract_json(resources_response)
+        if resources_data is not None:
             real_world_resources = resources_data.get("resources_real_world", [])
-            
-            for i, resource in enumerate(real_world_resources, 1):
-                name = resource.get("name", f"Ресурс {i}")
-                access = resource.get("access_real", "unknown")
-                notes = resource.get("notes", "")
-                
-                resource_str = f"{i}. {name} - {access}"
-                if notes:
-                    resource_str += f" - {notes}"
-                
-                resources_list.append(resource_str)
-                
-        except json.JSONDecodeError:
-            # Если не JSON, ищем JSON в тексте
-            json_match = re.search(r'\{.*\}', resources_response, re.DOTALL)
-            if json_match:
-                try:
-                    resources_data = json.loads(json_match.group(0))
-                    real_world_resources = resources_data.get("resources_real_world", [])
-                    
-                    for i, resource in enumerate(real_world_resources, 1):
-                        name = resource.get("name", f"Ресурс {i}")
-                        access = resource.get("access_real", "unknown")
-                        notes = resource.get("notes", "")
-                        
-                        resource_str = f"{i}. {name} - {access}"
-                        if notes:
-                            resource_str += f" - {notes}"
-                        
-                        resources_list.append(resource_str)
-                        
-                except json.JSONDecodeError:
-                    # Обрабатываем как обычный текст (список по строкам)
-                    lines = resources_response.split('\n')
-                    for line in lines:
-                        line = line.strip()
-                        if line and not line.startswith('#') and len(line) > 5:
-                            resources_list.append(line)
-            else:
-                # Обрабатываем как обычный текст
-                lines = resources_response.split('\n')
-                for line in lines:
-                    line = line.strip()
-                    if line and not line.startswith('#') and len(line) > 5:
-                        resources_list.append(line)
+            resources_list = [_format_resource(i, resource) for i, resource in enumerate(real_world_resources, 1)]
+        else:
+            # Обрабатываем как обычный текст (список по строкам)
+            resources_list = [line for line in map(str.strip, resources_response.split('\n'))
+                              if line and not line.startswith('#') and len(line) > 5]
         
         results["resources"] = resources_list
         
@@ -429,17 +536,21 @@ def process_transcript_chat(transcript_text: str, config, log) -> Dict[str, Any]
         results["performance"]["total_ms"] = total_time
         
         log("INFO", "ai_chat", "Независимая обработка с Notion промтами завершена", 
-            clean_len=len(results["clean_text"]),
-            links_count=len(results["links"]),
-            resources_count=len(results["resources"]),
-            total_time_ms=total_time,
-            performance=results["performance"])
+            _lazy=lambda: {
+                "clean_len": len(results["clean_text"]),
+                "links_count": len(results["links"]),
+                "resources_count": len(results["resources"]),
+                "total_time_ms": total_time,
+                "performance": results["performance"]
+            })
         
         return results
         
     except Exception as e:
         total_time = int((time.time() - start_time) * 1000)
         log("ERROR", "ai_chat", "Ошибка независимой обработки с Notion промтами", error=str(e), total_time_ms=total_time)
+        if is_auth_error(e):
+            reset_chat_client(log)
         return {
             "clean_text": "",
             "links": [],
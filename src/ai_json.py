@@ -0,0 +1,35 @@
+"""
+Модуль для разбора JSON-ответов AI моделей
+"""
+import re
+import json
+
+
+_JSON_BRACE_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def parse_clean_json(raw: str) -> tuple:
+    """
+    Разбирает строку как JSON целиком.
+    Возвращает (data, None) при успехе или (None, текст ошибки).
+    """
+    try:
+        return json.loads(raw), None
+    except json.JSONDecodeError as e:
+        return None, str(e)
+
+
+def extract_and_parse(raw: str) -> tuple:
+    """
+    Разбирает ответ модели: сначала весь текст, затем первый блок {...} внутри него.
+    Возвращает (data, None) при успехе или (None, текст последней ошибки).
+    """
+    parsed_data, parse_error = parse_clean_json(raw)
+    
+    if parsed_data is None:
+        # Пытаемся извлечь JSON из фигурных скобок
+        json_match = _JSON_BRACE_RE.search(raw)
+        if json_match:
+            parsed_data, parse_error = parse_clean_json(json_match.group(0))
+    
+    return parsed_data, parse_error
@@ -1,270 +1,372 @@
 import os
-import json
 import re
 import time
+import random
+import threading
+from collections import OrderedDict
+from typing import Optional
 from pathlib import Path
 import requests
 
+import ai_json
+import log_mod
+
+
+# Корень проекта: относительно него ищется ai.prompt_file
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Секция файла промтов: "### <id> <name>" и текст до следующей секции
+_SECTION_RE = re.compile(r'(?:^|\n)### (\d+) (\w+)\n([\s\S]*?)(?=\n### \d+ \w+\n|\Z)')
+
+# Кэш разобранных файлов промтов: {путь: (mtime, prompts)}
+_PROMPTS_CACHE = {}
+
+# LRU-кэш успешных ответов call_model: {(prompt_id, input_text): result}.
+# Включается ai.cache_results; ключи и модели считаются неизменными за время жизни процесса
+_RESULTS_CACHE = OrderedDict()
+_RESULTS_LOCK = threading.Lock()
+
+# Общая HTTP-сессия для вызовов Gemini: keep-alive между промтами и повторами
+_SESSION = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+_SESSION.mount("https://", _adapter)
+
 
 def load_prompts(config, log) -> dict:
     """
     Читает ai.prompt_file. Возвращает {id: {"name": str, "text": str}}.
     Ошибка, если файл отсутствует или нет нужного id. Лог: prompts_loaded count=...
+    Результат кэшируется, пока не изменится mtime файла.
     """
     ai_config = config.get('ai', {})
     prompt_file = ai_config.get('prompt_file', 'prompts/yt_prompts.txt')
     
-    # Строим путь относительно корня проекта
-    project_root = Path(__file__).parent.parent
-    prompt_path = project_root / prompt_file
+    prompt_path = _PROJECT_ROOT / prompt_file
     
-    if not prompt_path.exists():
-        log("ERROR", "ai_mod", f"Файл промтов не найден: {prompt_path}")
+    try:
+        mtime = prompt_path.stat().st_mtime
+    except FileNotFoundError:
+        log("ERROR", "ai_mod", "prompt_file_missing", path=str(prompt_path))
         raise ValueError(f"prompt_file_missing: {prompt_path}")
     
+    # Файл не менялся с прошлого разбора — отдаем закэшированный результат
+    cache_key = str(prompt_path)
+    cached = _PROMPTS_CACHE.get(cache_key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    
     try:
         with open(prompt_path, 'r', encoding='utf-8') as f:
             content = f.read()
     except Exception as e:
-        log("ERROR", "ai_mod", f"Ошибка чтения файла промтов: {e}")
+        log("ERROR", "ai_mod", "prompt_file_read_error", error=str(e))
         raise ValueError(f"prompt_file_read_error: {e}")
     
     # Парсим секции ### <id> <name>
     prompts = {}
     
-    # Добавляем разделитель в начало если его нет
-    if not content.startswith('\n'):
-        content = '\n' + content
-    
-    sections = re.split(r'\n### (\d+) (\w+)\n', content)
+    # Один проход по секциям: id, имя и текст до следующего заголовка или конца файла
+    for match in _SECTION_RE.finditer(content):
+        prompts[int(match.group(1))] = {
+            "name": match.group(2),
+            "text": match.group(3).strip()
+        }
     
-    if len(sections) < 4:  # Должно быть: [prefix, id, name, text, ...]
+    if not prompts:
         log("ERROR", "ai_mod", "Файл промтов не содержит корректных секций")
         raise ValueError("prompt_file_invalid_format")
     
-    # Обрабатываем секции: sections[0] - префикс, затем триплеты (id, name, text)
-    for i in range(1, len(sections), 3):
-        if i + 2 >= len(sections):
-            break
-        
-        prompt_id = int(sections[i])
-        prompt_name = sections[i + 1]
-        prompt_text = sections[i + 2].strip()
-        
-        prompts[prompt_id] = {
-            "name": prompt_name,
-            "text": prompt_text
-        }
-    
-    log("INFO", "ai_mod", f"Промты загружены успешно", count=len(prompts))
+    _PROMPTS_CACHE[cache_key] = (mtime, prompts)
+    log("INFO", "ai_mod", "prompts_loaded", count=len(prompts))
     return prompts
 
 
-def call_model(prompt_id: int, input_text: str, config, log) -> dict:
+def _backoff_delay(retry: int, base_sec: float, max_sec: float, jitter: float) -> float:
+    """Задержка перед повтором номер retry (с нуля): min(max, base * 2^retry) * (1 + rand * jitter)"""
+    return min(max_sec, base_sec * (2 ** retry)) * (1 + random.random() * jitter)
+
+
+def _error_result(code: str, detail: str, latency_ms: int = 0, model: str = "", key_index: int = -1) -> dict:
+    """Результат call_model для неудачного вызова"""
+    return {
+        "ok": False,
+        "text": "",
+        "model_used": model,
+        "key_index": key_index,
+        "tokens_in": None,
+        "tokens_out": None,
+        "latency_ms": latency_ms,
+        "error": {"code": code, "detail": detail}
+    }
+
+
+def _prepare_call(prompt_id: int, input_text: str, config, log):
     """
-    Склеивает финальный запрос: <prompt_text> + '\\n\\nВХОД: <<<input_text>>>'
-    Выполняет вызов к провайдеру (Gemini) с фолбэками
+    Общая подготовка вызова для call_model и ai_async.acall_model.
+    Возвращает (settings, None) или (None, error_result).
     """
     ai_config = config.get('ai', {})
     
     # Загружаем промты
     prompts = load_prompts(config, log)
     if prompt_id not in prompts:
-        log("ERROR", "ai_mod", f"Промт с ID {prompt_id} не найден")
-        return {
-            "ok": False,
-            "text": "",
-            "model_used": "",
-            "key_index": -1,
-            "tokens_in": None,
-            "tokens_out": None,
-            "latency_ms": 0,
-            "error": {"code": "prompt_not_found", "detail": f"Prompt ID {prompt_id} not found"}
-        }
+        log("ERROR", "ai_mod", "prompt_not_found", prompt_id=prompt_id)
+        return None, _error_result("prompt_not_found", f"Prompt ID {prompt_id} not found")
+    
+    api_keys = ai_config.get('api_keys', [])
+    if not api_keys:
+        log("ERROR", "ai_mod", "API ключи не настроены")
+        return None, _error_result("no_api_keys", "No API keys configured")
     
     # Формируем финальный запрос
     prompt_text = prompts[prompt_id]["text"]
     full_prompt = f"{prompt_text}\n\nВХОД: <<<{input_text}>>>"
     
-    # Параметры для ретраев
-    timeout_sec = ai_config.get('timeout_sec', 20)
-    max_retries = ai_config.get('max_retries', 2)
-    backoff_ms = ai_config.get('backoff_ms', [600, 1200])
-    api_keys = ai_config.get('api_keys', [])
-    model_primary = ai_config.get('model_primary', 'gemini-2.0-flash')
-    model_backup = ai_config.get('model_backup', [])
+    # Экспоненциальный backoff: base * 2^retry с джиттером, не больше backoff_max_sec.
+    # Устаревший backoff_ms, если задан, определяет только базовую задержку
+    legacy_backoff_ms = ai_config.get('backoff_ms')
     
-    if not api_keys:
-        log("ERROR", "ai_mod", "API ключи не настроены")
-        return {
-            "ok": False,
-            "text": "",
-            "model_used": "",
-            "key_index": -1,
-            "tokens_in": None,
-            "tokens_out": None,
-            "latency_ms": 0,
-            "error": {"code": "no_api_keys", "detail": "No API keys configured"}
-        }
+    return {
+        "payload": {
+            "contents": [{
+                "parts": [{
+                    "text": full_prompt
+                }]
+            }],
+            "generationConfig": {
+                "temperature": 0.1,
+                "maxOutputTokens": 4096
+            }
+        },
+        "timeout_sec": ai_config.get('timeout_sec', 20),
+        "max_retries": ai_config.get('max_retries', 2),
+        "backoff_base_sec": ai_config.get('backoff_base_sec',
+                                          legacy_backoff_ms[0] / 1000 if legacy_backoff_ms else 1.0),
+        "backoff_max_sec": ai_config.get('backoff_max_sec', 30.0),
+        "backoff_jitter": ai_config.get('backoff_jitter', 0.5),
+        "api_keys": api_keys,
+        "models": [ai_config.get('model_primary', 'gemini-2.0-flash')] + ai_config.get('model_backup', []),
+    }, None
+
+
+def _gemini_url(model: str, api_key: str) -> str:
+    return f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+
+
+def _extract_text(response, log) -> str:
+    """Достает текст первого кандидата из HTTP-ответа Gemini (requests или httpx)"""
+    result = response.json()
+    # DEBUG: начало сырого ответа; .text декодирует тело заново, поэтому только при DEBUG
+    debug_enabled = log_mod.debug_enabled()
+    if debug_enabled:
+        log("DEBUG", "ai_mod", "response_head", raw=response.text[:500])
     
-    models_to_try = [model_primary] + model_backup
+    text_response = ""
+    if 'candidates' in result and len(result['candidates']) > 0:
+        candidate = result['candidates'][0]
+        if debug_enabled:
+            log("DEBUG", "ai_mod", "candidate_parts", parts=str(candidate.get('content', {}).get('parts'))[:300])
+        
+        # Проверяем finishReason - возможно контент заблокирован
+        finish_reason = candidate.get('finishReason', 'UNKNOWN')
+        if finish_reason != 'STOP':
+            log("WARN", "ai_mod", "finish_reason_not_stop", finish_reason=finish_reason)
+        
+        if 'content' in candidate and 'parts' in candidate['content']:
+            parts = candidate['content']['parts']
+            if len(parts) > 0 and 'text' in parts[0]:
+                text_response = parts[0]['text']
+    
+    return text_response
+
+
+def call_model(prompt_id: int, input_text: str, config, log) -> dict:
+    """
+    Склеивает финальный запрос: <prompt_text> + '\\n\\nВХОД: <<<input_text>>>'
+    Выполняет вызов к провайдеру (Gemini) с фолбэками.
+    При ai.cache_results: true повторный вызов с тем же (prompt_id, input_text)
+    возвращает закэшированный успешный ответ (ai.cache_size, по умолчанию 32).
+    """
+    if not config.get('ai', {}).get('cache_results', False):
+        return _call_model_impl(prompt_id, input_text, config, log)
+    
+    cached = _cached_result(prompt_id, input_text, log)
+    if cached is not None:
+        return cached
+    return _store_result(prompt_id, input_text, _call_model_impl(prompt_id, input_text, config, log), config)
+
+
+def _cached_result(prompt_id: int, input_text: str, log) -> Optional[dict]:
+    """Копия закэшированного успешного ответа или None (кэш общий с ai_async)"""
+    cache_key = (prompt_id, input_text)
+    with _RESULTS_LOCK:
+        cached = _RESULTS_CACHE.get(cache_key)
+        if cached is not None:
+            _RESULTS_CACHE.move_to_end(cache_key)
+    if cached is None:
+        return None
+    log("INFO", "ai_mod", "ai_cache_hit", prompt_id=prompt_id)
+    return dict(cached)
+
+
+def _store_result(prompt_id: int, input_text: str, result: dict, config) -> dict:
+    """Кладет успешный ответ в LRU-кэш (ai.cache_size) и возвращает его копию"""
+    # Ошибки не кэшируем: следующий вызов должен снова сходить к модели
+    if result["ok"]:
+        with _RESULTS_LOCK:
+            _RESULTS_CACHE[(prompt_id, input_text)] = result
+            while len(_RESULTS_CACHE) > config.get('ai', {}).get('cache_size', 32):
+                _RESULTS_CACHE.popitem(last=False)
+    return dict(result)
+
+
+def _call_steps(settings: dict, log, module: str = "ai_mod"):
+    """
+    Цикл вызова Gemini без ввода-вывода — общий для call_model и ai_async.acall_model:
+    перебор моделей и ключей, ретраи с backoff, разбор статусов ответа.
+    Генератор отдает либо URL запроса (str) и ждет в ответ (response, error, is_timeout),
+    либо задержку перед повтором (float) и ждет None. Итог — результат вызова
+    в StopIteration.value.
+    """
+    max_retries = settings["max_retries"]
+    api_keys = settings["api_keys"]
+    
+    def _delay(retry):
+        return _backoff_delay(retry, settings["backoff_base_sec"], settings["backoff_max_sec"],
+                              settings["backoff_jitter"])
     
     start_time = time.time()
     
-    for model in models_to_try:
+    def _fail(code, detail):
+        return _error_result(code, detail, int((time.time() - start_time) * 1000))
+    
+    for model in settings["models"]:
+        # Ключи общие для всех моделей: если каждый ключ отклонён (401/403),
+        # резервная модель не поможет. 429 так не обрабатываем — квоты у моделей свои
+        auth_failed = 0
         for key_index, api_key in enumerate(api_keys):
-            log("INFO", "ai_mod", "Начинаем вызов AI", model=model, key_index=key_index)
+            log("INFO", module, "Начинаем вызов AI", model=model, key_index=key_index)
             
             for retry in range(max_retries + 1):
-                try:
-                    # Формируем запрос к Gemini API
-                    headers = {
-                        'Content-Type': 'application/json',
-                    }
-                    
-                    # URL для Gemini API
-                    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-                    
-                    payload = {
-                        "contents": [{
-                            "parts": [{
-                                "text": full_prompt
-                            }]
-                        }],
-                        "generationConfig": {
-                            "temperature": 0.1,
-                            "maxOutputTokens": 4096
-                        }
-                    }
-                    
-                    response = requests.post(url, json=payload, headers=headers, timeout=timeout_sec)
-                    latency_ms = int((time.time() - start_time) * 1000)
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        # DEBUG: Логируем структуру ответа для отладки
-                        log("DEBUG", "ai_mod", f"Response structure: {json.dumps(result, ensure_ascii=False)[:500]}...")
-                        
-                        # Извлекаем текст из ответа Gemini
-                        text_response = ""
-                        if 'candidates' in result and len(result['candidates']) > 0:
-                            candidate = result['candidates'][0]
-                            log("DEBUG", "ai_mod", f"Candidate structure: {json.dumps(candidate, ensure_ascii=False)[:300]}...")
-                            
-                            # Проверяем finishReason - возможно контент заблокирован
-                            finish_reason = candidate.get('finishReason', 'UNKNOWN')
-                            if finish_reason != 'STOP':
-                                log("WARN", "ai_mod", f"Gemini finish_reason={finish_reason}, возможна блокировка контента")
-                            
-                            if 'content' in candidate and 'parts' in candidate['content']:
-                                parts = candidate['content']['parts']
-                                if len(parts) > 0 and 'text' in parts[0]:
-                                    text_response = parts[0]['text']
-                        
-                        # Проверяем что текст не пустой
-                        if not text_response.strip():
-                            log("WARN", "ai_mod", "Gemini вернул пустой ответ, пробуем другой ключ")
-                            break  # Пробуем следующий ключ
-                        
-                        log("INFO", "ai_mod", "AI вызов успешен", model=model, key_index=key_index, latency_ms=latency_ms, response_len=len(text_response))
-                        
-                        return {
-                            "ok": True,
-                            "text": text_response,
-                            "model_used": model,
-                            "key_index": key_index,
-                            "tokens_in": None,  # Gemini API не всегда возвращает token count
-                            "tokens_out": None,
-                            "latency_ms": latency_ms,
-                            "error": None
-                        }
-                    
-                    elif response.status_code == 429:
-                        # Rate limit - ретрай с backoff
+                response, error, is_timeout = yield _gemini_url(model, api_key)
+                
+                if error is not None:
+                    if is_timeout:
                         if retry < max_retries:
-                            backoff_time = backoff_ms[min(retry, len(backoff_ms) - 1)] / 1000
-                            log("WARN", "ai_mod", f"Rate limit, retry {retry + 1}/{max_retries}", backoff_sec=backoff_time)
-                            time.sleep(backoff_time)
+                            backoff_time = _delay(retry)
+                            log("WARN", module, "timeout_retry", retry=retry + 1, max_retries=max_retries, backoff_sec=backoff_time)
+                            yield backoff_time
                             continue
-                        else:
-                            log("WARN", "ai_mod", "Rate limit, переключаемся на следующий ключ", key_index=key_index)
-                            break
-                    
-                    elif response.status_code in [401, 403]:
-                        # Auth error - сразу следующий ключ
-                        log("WARN", "ai_mod", "Auth failed, переключаемся на следующий ключ", status=response.status_code, key_index=key_index)
+                        log("WARN", module, "Timeout, переключаемся на следующий ключ")
                         break
-                    
-                    elif response.status_code >= 500:
-                        # Server error - ретрай
+                    log("ERROR", module, "api_call_error", error=str(error))
+                    if retry < max_retries:
+                        yield _delay(retry)
+                        continue
+                    break
+                
+                latency_ms = int((time.time() - start_time) * 1000)
+                status = response.status_code
+                
+                if status == 200:
+                    try:
+                        text_response = _extract_text(response, log)
+                    except ValueError as e:
+                        # Тело не JSON — как любая ошибка вызова: повтор, затем следующий ключ
+                        log("ERROR", module, "api_call_error", error=str(e))
                         if retry < max_retries:
-                            backoff_time = backoff_ms[min(retry, len(backoff_ms) - 1)] / 1000
-                            log("WARN", "ai_mod", f"Server error, retry {retry + 1}/{max_retries}", status=response.status_code, backoff_sec=backoff_time)
-                            time.sleep(backoff_time)
+                            yield _delay(retry)
                             continue
-                        else:
-                            log("WARN", "ai_mod", "Server error, переключаемся на следующий ключ", status=response.status_code)
-                            break
+                        break
+                    
+                    # Проверяем что текст не пустой
+                    if not text_response.strip():
+                        log("WARN", module, "Gemini вернул пустой ответ, пробуем другой ключ")
+                        break  # Пробуем следующий ключ
                     
-                    else:
-                        # Другие 4xx ошибки - завершаем
-                        log("ERROR", "ai_mod", "Bad request", status=response.status_code, response=response.text[:200])
-                        return {
-                            "ok": False,
-                            "text": "",
-                            "model_used": model,
-                            "key_index": key_index,
-                            "tokens_in": None,
-                            "tokens_out": None,
-                            "latency_ms": latency_ms,
-                            "error": {"code": "bad_request", "detail": f"HTTP {response.status_code}: {response.text[:200]}"}
-                        }
+                    log("INFO", module, "AI вызов успешен", model=model, key_index=key_index, latency_ms=latency_ms, response_len=len(text_response))
+                    
+                    return {
+                        "ok": True,
+                        "text": text_response,
+                        "model_used": model,
+                        "key_index": key_index,
+                        "tokens_in": None,  # Gemini API не всегда возвращает token count
+                        "tokens_out": None,
+                        "latency_ms": latency_ms,
+                        "error": None
+                    }
                 
-                except requests.exceptions.Timeout:
-                    if retry < max_retries:
-                        backoff_time = backoff_ms[min(retry, len(backoff_ms) - 1)] / 1000
-                        log("WARN", "ai_mod", f"Timeout, retry {retry + 1}/{max_retries}", backoff_sec=backoff_time)
-                        time.sleep(backoff_time)
-                        continue
-                    else:
-                        log("WARN", "ai_mod", "Timeout, переключаемся на следующий ключ")
-                        break
+                elif status in (401, 403):
+                    # Auth error - сразу следующий ключ
+                    log("WARN", module, "Auth failed, переключаемся на следующий ключ", status=status, key_index=key_index)
+                    auth_failed += 1
+                    break
                 
-                except Exception as e:
-                    log("ERROR", "ai_mod", f"Unexpected error during API call: {e}")
+                elif status == 429 or status >= 500:
+                    # Rate limit / server error - ретрай с backoff
                     if retry < max_retries:
-                        backoff_time = backoff_ms[min(retry, len(backoff_ms) - 1)] / 1000
-                        time.sleep(backoff_time)
+                        backoff_time = _delay(retry)
+                        event = "rate_limit_retry" if status == 429 else "server_error_retry"
+                        log("WARN", module, event, retry=retry + 1, max_retries=max_retries, status=status, backoff_sec=backoff_time)
+                        yield backoff_time
                         continue
-                    else:
-                        break
+                    log("WARN", module, "Ретраи исчерпаны, переключаемся на следующий ключ", status=status, key_index=key_index)
+                    break
+                
+                else:
+                    # Другие 4xx ошибки - завершаем
+                    log("ERROR", module, "Bad request", status=status, response=response.text[:200])
+                    return _error_result("bad_request", f"HTTP {status}: {response.text[:200]}",
+                                         latency_ms, model, key_index)
+        
+        if auth_failed == len(api_keys):
+            log("ERROR", module, "Все AI ключи отклонены (401/403)", model=model)
+            return _fail("all_auth_failed", "All API keys rejected with 401/403")
     
     # Все попытки неудачны
-    latency_ms = int((time.time() - start_time) * 1000)
-    log("ERROR", "ai_mod", "Все AI ключи и модели исчерпаны")
+    log("ERROR", module, "Все AI ключи и модели исчерпаны")
+    return _fail("all_failed", "All API keys and models exhausted")
+
+
+def _call_model_impl(prompt_id: int, input_text: str, config, log) -> dict:
+    settings, error_result = _prepare_call(prompt_id, input_text, config, log)
+    if error_result is not None:
+        return error_result
     
-    return {
-        "ok": False,
-        "text": "",
-        "model_used": "",
-        "key_index": -1,
-        "tokens_in": None,
-        "tokens_out": None,
-        "latency_ms": latency_ms,
-        "error": {"code": "all_failed", "detail": "All API keys and models exhausted"}
-    }
+    payload = settings["payload"]
+    timeout_sec = settings["timeout_sec"]
+    
+    # Транспорт для _call_steps: синхронный POST через общую сессию и time.sleep
+    steps = _call_steps(settings, log)
+    try:
+        step = next(steps)
+        while True:
+            if isinstance(step, str):
+                try:
+                    reply = (_SESSION.post(step, json=payload, timeout=timeout_sec), None, False)
+                except requests.exceptions.Timeout as e:
+                    reply = (None, e, True)
+                except Exception as e:
+                    reply = (None, e, False)
+            else:
+                time.sleep(step)
+                reply = None
+            step = steps.send(reply)
+    except StopIteration as stop:
+        return stop.value
 
 
-def ai_clean_ads(transcript_text: str, config, log) -> dict:
+def ai_clean_ads(transcript_text: str, config, log, prompt_id: int = 1) -> dict:
     """
-    Использует prompt_id=1 (P1_CLEAN) и call_model.
+    Использует prompt_id (по умолчанию 1, P1_CLEAN) и call_model.
     Ожидает одну строку JSON: {"clean":"...","links":[...]}.
+    Если JSON кривой — попытка автопочинки, затем один повторный запрос.
     """
     log("INFO", "ai_mod", "Начинаем очистку от рекламы", len=len(transcript_text))
     
     # Вызываем модель
-    result = call_model(1, transcript_text, config, log)
+    result = call_model(prompt_id, transcript_text, config, log)
     
     if not result["ok"]:
         log("ERROR", "ai_mod", "Ошибка вызова модели", error=result["error"])
@@ -278,38 +380,17 @@ def ai_clean_ads(transcript_text: str, config, log) -> dict:
     
     raw_response = result["text"]
     
-    # Пытаемся распарсить JSON
-    def try_parse_json(text):
-        try:
-            return json.loads(text), None
-        except json.JSONDecodeError as e:
-            return None, str(e)
-    
-    # Первая попытка парсинга
-    parsed_data, parse_error = try_parse_json(raw_response)
-    
-    if parsed_data is None:
-        # Пытаемся извлечь JSON из фигурных скобок
-        json_match = re.search(r'\{.*\}', raw_response, re.DOTALL)
-        if json_match:
-            json_text = json_match.group(0)
-            parsed_data, parse_error = try_parse_json(json_text)
+    # Пытаемся распарсить JSON (целиком или из фигурных скобок)
+    parsed_data, parse_error = ai_json.extract_and_parse(raw_response)
     
     if parsed_data is None:
         # Второй вызов с уточнением
         log("WARN", "ai_mod", "Невалидный JSON, делаем повторный вызов", error=parse_error)
         clarification_prompt = "Верни JSON строго в формате: {\"clean\":\"текст\",\"links\":[\"url1\",\"url2\"]}"
-        retry_result = call_model(1, transcript_text + "\n\n" + clarification_prompt, config, log)
+        retry_result = call_model(prompt_id, transcript_text + "\n\n" + clarification_prompt, config, log)
         
         if retry_result["ok"]:
-            parsed_data, parse_error = try_parse_json(retry_result["text"])
-            
-            # Еще раз пытаемся извлечь из скобок
-            if parsed_data is None:
-                json_match = re.search(r'\{.*\}', retry_result["text"], re.DOTALL)
-                if json_match:
-                    json_text = json_match.group(0)
-                    parsed_data, parse_error = try_parse_json(json_text)
+            parsed_data, parse_error = ai_json.extract_and_parse(retry_result["text"])
     
     if parsed_data is None:
         log("ERROR", "ai_mod", "Не удалось распарсить JSON после повторного вызова", error=parse_error)
@@ -1,11 +1,17 @@
 """
 Модуль для полной AI-обработки транскриптов
 """
+import asyncio
 import re
-import json
+from concurrent.futures import ThreadPoolExecutor
+import ai_async
 import ai_mod
 
 
+# Предложение: непустой текст до знаков конца ('.', '!', '?') или до конца строки
+_SENT_RE = re.compile(r'[^.!?]*[^\s.!?][^.!?]*(?:[.!?]+|$)')
+
+
 def run_clean(transcript_text: str, config, log) -> dict:
     """
     Вызывает промт CLEAN (id=ai.prompts_map.CLEAN).
@@ -19,86 +25,24 @@ def run_clean(transcript_text: str, config, log) -> dict:
     prompts_map = config.get('ai', {}).get('prompts_map', {})
     prompt_id = prompts_map.get('CLEAN', 1)
     
-    # Вызываем модель
-    result = ai_mod.call_model(prompt_id, transcript_text, config, log)
+    # Разбор JSON, автопочинка и повторный запрос выполняются в ai_mod.ai_clean_ads
+    result = ai_mod.ai_clean_ads(transcript_text, config, log, prompt_id=prompt_id)
     
-    if not result["ok"]:
+    if result["error"] is not None:
         log("ERROR", "ai_pipeline", "ai_clean_error", error=result["error"])
         return {
             "clean": "",
             "links": [],
-            "raw": "",
+            "raw": result["raw"],
             "error": result["error"]
         }
     
-    raw_response = result["text"]
-    
-    # Пытаемся распарсить JSON
-    def try_parse_json(text):
-        try:
-            return json.loads(text), None
-        except json.JSONDecodeError as e:
-            return None, str(e)
-    
-    # Первая попытка парсинга
-    parsed_data, parse_error = try_parse_json(raw_response)
-    
-    if parsed_data is None:
-        # Пытаемся извлечь JSON из фигурных скобок
-        json_match = re.search(r'\{.*\}', raw_response, re.DOTALL)
-        if json_match:
-            json_text = json_match.group(0)
-            parsed_data, parse_error = try_parse_json(json_text)
-    
-    if parsed_data is None:
-        # Второй вызов с уточнением
-        log("WARN", "ai_pipeline", "Invalid JSON, retrying", error=parse_error)
-        clarification_prompt = "Верни JSON строго в формате: {\"clean\":\"текст\",\"links\":[\"url1\",\"url2\"]}"
-        retry_result = ai_mod.call_model(prompt_id, transcript_text + "\n\n" + clarification_prompt, config, log)
-        
-        if retry_result["ok"]:
-            parsed_data, parse_error = try_parse_json(retry_result["text"])
-            
-            # Еще раз пытаемся извлечь из скобок
-            if parsed_data is None:
-                json_match = re.search(r'\{.*\}', retry_result["text"], re.DOTALL)
-                if json_match:
-                    json_text = json_match.group(0)
-                    parsed_data, parse_error = try_parse_json(json_text)
-    
-    if parsed_data is None:
-        log("ERROR", "ai_pipeline", "ai_clean_error", error=f"JSON parse error: {parse_error}")
-        return {
-            "clean": "",
-            "links": [],
-            "raw": raw_response,
-            "error": {"code": "invalid_json", "detail": f"JSON parse error: {parse_error}"}
-        }
-    
-    # Извлекаем данные
-    clean_text = parsed_data.get("clean", "")
-    links = parsed_data.get("links", [])
-    
-    # Валидируем структуру
-    if not isinstance(clean_text, str):
-        clean_text = str(clean_text)
-    
-    if not isinstance(links, list):
-        links = []
-    else:
-        # Фильтруем только строки и URL
-        valid_links = []
-        for link in links:
-            if isinstance(link, str) and (link.startswith("http://") or link.startswith("https://")):
-                valid_links.append(link)
-        links = valid_links
-    
-    log("INFO", "ai_pipeline", "ai_clean_parsed", clean_len=len(clean_text), links=len(links))
+    log("INFO", "ai_pipeline", "ai_clean_parsed", clean_len=len(result["clean"]), links=len(result["links"]))
     
     return {
-        "clean": clean_text,
-        "links": links,
-        "raw": raw_response,
+        "clean": result["clean"],
+        "links": result["links"],
+        "raw": result["raw"],
         "error": None
     }
 
@@ -112,8 +56,10 @@ def run_full(clean_text: str, config, log) -> str:
     prompts_map = config.get('ai', {}).get('prompts_map', {})
     prompt_id = prompts_map.get('FULL', 2)
     
-    result = ai_mod.call_model(prompt_id, clean_text, config, log)
-    
+    return _finish_full(ai_mod.call_model(prompt_id, clean_text, config, log), log)
+
+
+def _finish_full(result: dict, log) -> str:
     if not result["ok"]:
         log("ERROR", "ai_pipeline", "ai_full_error", error=result["error"])
         return ""
@@ -134,8 +80,10 @@ def run_middle_10(clean_text: str, config, log) -> str:
     prompts_map = config.get('ai', {}).get('prompts_map', {})
     prompt_id = prompts_map.get('MIDDLE_10', 3)
     
-    result = ai_mod.call_model(prompt_id, clean_text, config, log)
-    
+    return _finish_middle_10(ai_mod.call_model(prompt_id, clean_text, config, log), log)
+
+
+def _finish_middle_10(result: dict, log) -> str:
     if not result["ok"]:
         log("ERROR", "ai_pipeline", "ai_middle_error", error=result["error"])
         return ""
@@ -143,15 +91,13 @@ def run_middle_10(clean_text: str, config, log) -> str:
     middle_text = result["text"].strip()
     
     # Подсчет предложений
-    sentences = re.split(r'[.!?]+', middle_text)
-    sentences = [s.strip() for s in sentences if s.strip()]
+    sentences = [m.group(0).strip() for m in _SENT_RE.finditer(middle_text)]
     
     actual_count = len(sentences)
     
     if actual_count > 10:
-        # Обрезаем до 10 предложений
-        truncated_sentences = sentences[:10]
-        middle_text = '. '.join(truncated_sentences) + '.'
+        # Обрезаем до 10 предложений, сохраняя их исходные знаки конца
+        middle_text = ' '.join(sentences[:10])
         log("INFO", "ai_pipeline", "ai_middle_done", sentences=10, original_count=actual_count, truncated=True)
     else:
         log("INFO", "ai_pipeline", "ai_middle_done", sentences=actual_count, short_count=actual_count < 10)
@@ -168,8 +114,10 @@ def run_short_300(clean_text: str, config, log) -> str:
     prompts_map = config.get('ai', {}).get('prompts_map', {})
     prompt_id = prompts_map.get('SHORT_300', 4)
     
-    result = ai_mod.call_model(prompt_id, clean_text, config, log)
-    
+    return _finish_short_300(ai_mod.call_model(prompt_id, clean_text, config, log), log)
+
+
+def _finish_short_300(result: dict, log) -> str:
     if not result["ok"]:
         log("ERROR", "ai_pipeline", "ai_short_error", error=result["error"])
         return ""
@@ -203,29 +151,106 @@ def run_resources(clean_text: str, links_from_clean: list[str], config, log) ->
     Объединить, дедуплицировать (по точной строке), вернуть список.
     Лог: ai_resources_done count=...
     """
-    all_resources = set()
-    
-    # Добавляем ссылки из CLEAN
+    links = _dedupe_links(links_from_clean)
+    if links:
+        log("INFO", "ai_pipeline", "ai_resources_done", count=len(links), source="clean")
+        return links
+    
+    # Ссылок из CLEAN нет — пытаемся извлечь через RESOURCES промт
+    prompt_id = config.get('ai', {}).get('prompts_map', {}).get('RESOURCES', 5)
+    return _finish_resources(ai_mod.call_model(prompt_id, clean_text, config, log), log)
+
+
+def _dedupe_links(links_from_clean: list[str]) -> list[str]:
+    # dict сохраняет порядок добавления и дедуплицирует за один проход
+    all_resources = {}
     for link in links_from_clean:
-        if isinstance(link, str) and link.strip():
-            all_resources.add(link.strip())
-    
-    # Если ссылок из CLEAN нет, пытаемся извлечь через RESOURCES промт
-    if not all_resources:
-        prompts_map = config.get('ai', {}).get('prompts_map', {})
-        prompt_id = prompts_map.get('RESOURCES', 5)
-        
-        result = ai_mod.call_model(prompt_id, clean_text, config, log)
-        
-        if result["ok"]:
-            resources_text = result["text"].strip()
-            # Простой парсинг ресурсов построчно
-            for line in resources_text.split('\n'):
-                line = line.strip()
-                if line and (line.startswith('http') or '://' in line):
-                    all_resources.add(line)
+        if isinstance(link, str):
+            link = link.strip()
+            if link:
+                all_resources[link] = None
+    return list(all_resources)
+
+
+def _finish_resources(result: dict, log) -> list[str]:
+    all_resources = {}
+    if result["ok"]:
+        # Простой парсинг ресурсов построчно
+        for line in result["text"].strip().split('\n'):
+            line = line.strip()
+            if line and (line.startswith('http') or '://' in line):
+                all_resources[line] = None
     
     final_list = list(all_resources)
-    log("INFO", "ai_pipeline", "ai_resources_done", count=len(final_list))
+    log("INFO", "ai_pipeline", "ai_resources_done", count=len(final_list), source="prompt")
+    
+    return final_list
+
+
+def _in_event_loop() -> bool:
+    """Вызваны ли мы из потока с работающим event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def run_all_summaries(clean_text: str, links: list[str], config, log) -> dict:
+    """
+    Запускает независимые промты FULL, MIDDLE_10, SHORT_300 и RESOURCES параллельно:
+    все они зависят только от clean_text (и ссылок из CLEAN).
+    Возвращает {"full": str, "middle": str, "short": str, "resources": list[str]}.
+    При ai.async_http: true запросы идут через ai_async (один httpx.AsyncClient).
+    """
+    if config.get('ai', {}).get('async_http', False):
+        if not ai_async.HTTPX_AVAILABLE:
+            log("WARN", "ai_pipeline", "async_http_unavailable", reason="httpx not installed")
+        elif _in_event_loop():
+            # asyncio.run внутри работающего цикла невозможен — используем пул потоков
+            log("WARN", "ai_pipeline", "async_http_unavailable", reason="event loop already running")
+        else:
+            return asyncio.run(run_all_summaries_async(clean_text, links, config, log))
     
-    return final_list
\ No newline at end of file
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        future_full = executor.submit(run_full, clean_text, config, log)
+        future_middle = executor.submit(run_middle_10, clean_text, config, log)
+        future_short = executor.submit(run_short_300, clean_text, config, log)
+        future_resources = executor.submit(run_resources, clean_text, links, config, log)
+        
+        return {
+            "full": future_full.result(),
+            "middle": future_middle.result(),
+            "short": future_short.result(),
+            "resources": future_resources.result()
+        }
+
+
+async def run_all_summaries_async(clean_text: str, links: list[str], config, log) -> dict:
+    """
+    То же, что run_all_summaries, но через asyncio.gather и ai_async.acall_model.
+    """
+    prompts_map = config.get('ai', {}).get('prompts_map', {})
+    resources = _dedupe_links(links)
+    
+    async with ai_async.new_client(config) as client:
+        calls = [
+            ai_async.acall_model(client, prompts_map.get('FULL', 2), clean_text, config, log),
+            ai_async.acall_model(client, prompts_map.get('MIDDLE_10', 3), clean_text, config, log),
+            ai_async.acall_model(client, prompts_map.get('SHORT_300', 4), clean_text, config, log),
+        ]
+        if not resources:
+            calls.append(ai_async.acall_model(client, prompts_map.get('RESOURCES', 5), clean_text, config, log))
+        results = await asyncio.gather(*calls)
+    
+    if resources:
+        log("INFO", "ai_pipeline", "ai_resources_done", count=len(resources), source="clean")
+    else:
+        resources = _finish_resources(results[3], log)
+    
+    return {
+        "full": _finish_full(results[0], log),
+        "middle": _finish_middle_10(results[1], log),
+        "short": _finish_short_300(results[2], log),
+        "resources": resources
+    }
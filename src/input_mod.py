@@ -1,4 +1,10 @@
+import ipaddress
 import re
+from urllib.parse import urlparse
+
+
+# Метка доменного имени: буквы/цифры, дефис не по краям
+_HOST_LABEL_RE = re.compile(r'^[^\W_](?:[\w-]{0,61}[^\W_])?$')
 
 
 def get_source_url(config) -> str:
@@ -37,13 +43,28 @@ def get_source_url(config) -> str:
 
 
 def _is_valid_url(url: str) -> bool:
-    """Базовая валидация URL - проверяем что строка начинается с http/https"""
-    url_pattern = re.compile(
-        r'^https?://'  # http:// или https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # домен
-        r'localhost|'  # localhost
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # IP
-        r'(?::\d+)?'  # опциональный порт
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-    
-    return bool(url_pattern.match(url))
\ No newline at end of file
+    """
+    Базовая валидация URL - проверяем схему http/https, отсутствие пробелов и хост:
+    домен с точкой, localhost или IP-адрес
+    """
+    if any(ch.isspace() for ch in url):
+        return False
+    try:
+        parsed = urlparse(url)
+        parsed.port  # некорректный порт — ValueError
+    except ValueError:
+        return False
+    if parsed.scheme not in ("http", "https"):
+        return False
+    host = parsed.hostname
+    if not host:
+        return False
+    if host == "localhost":
+        return True
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        pass
+    labels = host.rstrip(".").split(".")
+    return len(labels) > 1 and all(_HOST_LABEL_RE.match(label) for label in labels)
@@ -1,20 +1,33 @@
 import os
+import atexit
+import threading
 from datetime import datetime
 
 
-def log(level: str, module: str, msg: str, **kv) -> str:
+def log(level: str, module: str, msg: str, _lazy=None, **kv) -> str:
     """
     Формат строки:
     [ISO8601][<module>][<level>] <msg> key1=val1 key2=val2 ...
     Назначение: stdout; если logging.to_file=true — дублировать в /logs/app.log.
     Уровни: DEBUG, INFO, WARN, ERROR.
+    Сообщения ниже logging.level не форматируются и не выводятся.
+    _lazy — функция, возвращающая dict дополнительных полей; вызывается,
+    только если сообщение действительно будет выведено.
     """
-    # Формируем временную метку в ISO8601
-    timestamp = datetime.now().isoformat()
+    if not is_enabled(level):
+        return ""
     
-    # Формируем дополнительные параметры
-    kv_str = " ".join([f"{k}={v}" for k, v in kv.items()])
-    kv_part = f" {kv_str}" if kv_str else ""
+    if _lazy is not None:
+        kv.update(_lazy())
+    
+    # Формируем временную метку в ISO8601 (фиксированная точность — миллисекунды)
+    timestamp = datetime.now().isoformat(timespec='milliseconds')
+    
+    # Формируем дополнительные параметры (без полей — без лишней сборки строки)
+    if kv:
+        kv_part = " " + " ".join([f"{k}={v}" for k, v in kv.items()])
+    else:
+        kv_part = ""
     
     # Формируем полное сообщение
     log_message = f"[{timestamp}][{module}][{level}] {msg}{kv_part}"
@@ -23,10 +36,10 @@ def log(level: str, module: str, msg: str, **kv) -> str:
     print(log_message)
     
     # Записываем в файл если включено
-    if _log_to_file:
+    if _log_file is not None:
         try:
-            with open("logs/app.log", "a", encoding="utf-8") as f:
-                f.write(log_message + "\n")
+            with _log_file_lock:
+                _log_file.write(log_message + "\n")
         except Exception as e:
             print(f"[{timestamp}][log_mod][ERROR] Failed to write to log file: {e}")
     
@@ -36,11 +49,42 @@ def log(level: str, module: str, msg: str, **kv) -> str:
 # Глобальная переменная для контроля файлового логирования
 _log_to_file = False
 
+# Файл лога открывается один раз (построчная буферизация) и закрывается при выходе
+_log_file = None
+_log_file_lock = threading.Lock()
+
+# Порядок уровней логирования; WARNING — синоним WARN
+_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40}
+_min_level = _LEVELS["DEBUG"]
+
+# init_logging уже применил конфиг
+_initialized = False
+
+
+def is_enabled(level: str) -> bool:
+    """Проверяет, будет ли выведено сообщение данного уровня"""
+    return _LEVELS.get(level, _LEVELS["ERROR"]) >= _min_level
+
+
+def debug_enabled() -> bool:
+    """Проверяет, выводятся ли DEBUG-сообщения (для дорогого форматирования отладочных данных)"""
+    return _min_level <= _LEVELS["DEBUG"]
+
 
 def init_logging(config):
-    """Инициализация логирования на основе конфига"""
-    global _log_to_file
-    _log_to_file = config.get('logging', {}).get('to_file', False)
+    """
+    Инициализация логирования на основе конфига.
+    Выполняется один раз за процесс: повторные вызовы ничего не делают
+    """
+    global _log_to_file, _min_level, _log_file, _initialized
+    if _initialized:
+        return
+    _initialized = True
+    logging_config = config.get('logging', {})
+    _log_to_file = logging_config.get('to_file', False)
+    _min_level = _LEVELS.get(str(logging_config.get('level', 'DEBUG')).upper(), _LEVELS["DEBUG"])
     
-    if _log_to_file:
-        os.makedirs("logs", exist_ok=True)
\ No newline at end of file
+    if _log_to_file and _log_file is None:
+        os.makedirs("logs", exist_ok=True)
+        _log_file = open("logs/app.log", "a", encoding="utf-8", buffering=1)
+        atexit.register(_log_file.close)
\ No newline at end of file
@@ -1,7 +1,8 @@
 import sys
 import os
-import yaml
 import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Добавляем текущую директорию в путь для импорта модулей
@@ -12,14 +13,32 @@ import input_mod
 import transcribe_mod
 import output_mod
 import store_excel
-import ai_mod
-import ai_pipeline
-import ai_chat
-import notion_mod
+
+# yaml, notion_mod (notion_client) и ai_chat (google-genai) импортируются там,
+# где нужны: на ранних ошибках запуска они не загружаются вовсе
+
+# Сообщения для пользователя по кодам ошибок (ValueError) из модулей
+_ERROR_MESSAGES = {
+    "invalid_url_exit": "Пользователь не ввел корректный URL",
+    "invalid_url_repeated": "Повторно введен некорректный URL. Программа завершена.",
+    "unauthorized": "Проблемы с авторизацией API ключей",
+    "rate_limited": "Превышен лимит запросов API",
+    "server_error": "Проблемы на сервере Supadata",
+    "job_timeout": "Таймаут получения результата",
+    "bad_url": "Проверьте ссылку в браузере - сервис не может её обработать",
+    "no_api_keys": "Не настроены API ключи в конфигурации",
+    "excel_file_locked": "Excel файл заблокирован. Закройте Excel и перезапустите.",
+    "all_failed": "Все AI ключи и модели исчерпаны",
+}
 
 
 def load_config():
     """Загружаем конфигурацию из config/app.yaml"""
+    import yaml
+    
+    # libyaml-парсер, если PyYAML собран с ним; иначе чистый Python
+    SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    
     config_path = Path(__file__).parent.parent / "config" / "app.yaml"
     
     if not config_path.exists():
@@ -29,7 +48,7 @@ def load_config():
     
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=SafeLoader)
         return config
     except Exception as e:
         print(f"ОШИБКА: Не удалось прочитать конфигурацию: {e}")
@@ -42,9 +61,9 @@ def main():
     1) handle = store_excel.init_excel(config, log)
     2) run_id = store_excel.allocate_run_id(handle, log)
     3) url = input_mod.get_source_url(config)
-    4) store_excel.write_step(handle, run_id, {"Ссылка": url}, log)
+    4) pending["Ссылка"] = url  (поля копятся в памяти и пишутся одним write_step)
     5) res = transcribe_mod.fetch_transcript(url, config, log)
-    6) store_excel.write_step(handle, run_id, {"Субтитры": res['content']}, log)
+    6) pending["Субтитры"] = res['content']
     7) output_mod.print_preview(res['lang'], res['content'], config.test.preview_chars, log)
     8) store_excel.close(handle)
     9) В конце вывести короткий итог 'OK' либо описание ошибки.
@@ -63,11 +82,34 @@ def main():
     notion_client = None
     notion_db_info = None
     notion_page_id = None
+    run_id = None
+    
+    # Поля строки копятся здесь и записываются в Excel одним write_step:
+    # каждая запись сохраняет книгу целиком
+    pending = {}
+    
+    def flush_pending():
+        if excel_handle and run_id is not None and pending:
+            store_excel.write_step(excel_handle, run_id, pending, log)
+            pending.clear()
+    
+    def flush_pending_on_error():
+        # Сохраняем то, что успели получить, не маскируя исходную ошибку; сбой сохранения
+        # логируем здесь — close() ошибки глотает
+        try:
+            flush_pending()
+        except Exception as e:
+            log("ERROR", "main", "Не удалось сохранить накопленные поля в Excel", error=str(e))
+        try:
+            store_excel.flush(excel_handle, log)
+        except Exception as e:
+            log("ERROR", "main", "Не удалось сохранить Excel файл", error=str(e))
     
     # Инициализируем Notion (если включен)
     notion_config = config.get('notion', {})
     if notion_config.get('enabled', False):
         log("INFO", "main", "Инициализируем Notion интеграцию")
+        import notion_mod
         notion_client = notion_mod.init_client(config, log)
         if notion_client:
             notion_db_info = notion_mod.ensure_database(notion_client, config, log)
@@ -83,35 +125,45 @@ def main():
         # Шаг 2: Выделяем ID для новой записи
         log("INFO", "main", "Выделяем ID для новой записи")
         run_id = store_excel.allocate_run_id(excel_handle, log)
+        # Сразу сохраняем зарезервированную строку: заблокированный файл (открыт в Excel)
+        # дает excel_file_locked до того, как потрачены квоты Supadata/Gemini/Notion
+        store_excel.flush(excel_handle, log)
         
         # Шаг 3: Получаем URL от пользователя
         log("INFO", "main", "Запрашиваем URL у пользователя")
         url = input_mod.get_source_url(config)
         log("INFO", "main", "URL получен", url=url)
         
-        # Шаг 4: Сохраняем ссылку в Excel
-        log("INFO", "main", "Сохраняем ссылку в Excel")
-        store_excel.write_step(excel_handle, run_id, {"Ссылка": url}, log)
+        # Шаг 4: Запоминаем ссылку для записи в Excel
+        pending["Ссылка"] = url
         
-        # Шаг 4.5: Создаем страницу в Notion (если доступен)
+        # Шаг 4.5: Создаем страницу в Notion (если доступен) в фоне,
+        # параллельно с запросом транскрипта — они не зависят друг от друга
+        notion_future = None
+        notion_update_future = None
         if notion_client and notion_db_info:
             log("INFO", "main", "Создаем страницу в Notion")
-            import datetime
-            created_at_iso = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            notion_page_id = notion_mod.upsert_page_for_run(
-                notion_client, notion_db_info['id'], run_id, url, None, created_at_iso, log
+            created_at_iso = datetime.date.today().isoformat()
+            notion_executor = ThreadPoolExecutor(max_workers=1)
+            notion_future = notion_executor.submit(
+                notion_mod.upsert_page_for_run,
+                notion_client, notion_db_info['id'], run_id, url, None, created_at_iso, log,
+                is_new_run=True  # run_id только что выделен allocate_run_id
             )
+            notion_executor.shutdown(wait=False)
         
         # Шаг 5: Получаем транскрипт через Supadata (измеряем время)
         log("INFO", "main", "Запрашиваем транскрипт")
-        supadata_start = time.time()
+        supadata_start = time.perf_counter_ns()
         result = transcribe_mod.fetch_transcript(url, config, log)
-        supadata_time_ms = int((time.time() - supadata_start) * 1000)
+        supadata_time_ms = (time.perf_counter_ns() - supadata_start) // 1_000_000
         log("INFO", "main", "Транскрипт получен успешно", time_ms=supadata_time_ms)
         
-        # Шаг 6: Сохраняем транскрипт в Excel
-        log("INFO", "main", "Сохраняем транскрипт в Excel")
-        store_excel.write_step(excel_handle, run_id, {"Субтитры": result['content']}, log)
+        if notion_future is not None:
+            notion_page_id = notion_future.result()
+        
+        # Шаг 6: Запоминаем транскрипт для записи в Excel
+        pending["Субтитры"] = result['content']
         
         # Шаг 7: Независимая AI-обработка транскрипта (5 запросов)
         log("INFO", "main", "Запускаем независимую AI-обработку")
@@ -120,9 +172,10 @@ def main():
         chars_original = len(result['content'])
         
         # Независимая обработка через google-genai
-        ai_start = time.time()
+        import ai_chat
+        ai_start = time.perf_counter_ns()
         ai_results = ai_chat.process_transcript_chat(result['content'], config, log)
-        ai_time_ms = int((time.time() - ai_start) * 1000)
+        ai_time_ms = (time.perf_counter_ns() - ai_start) // 1_000_000
         
         if ai_results.get('error') is None:
             # Все саммари получены успешно
@@ -146,37 +199,42 @@ def main():
                 "Материалы": materials_text
             }
             
-            log("INFO", "main", "Записываем AI результаты в Excel", updates=list(excel_updates.keys()))
-            store_excel.write_step(excel_handle, run_id, excel_updates, log)
+            # Обновляем Notion (если доступен) в фоне, параллельно с записью в Excel
+            if notion_client and notion_page_id:
+                prop_max_len = notion_config.get('prop_max_len', 1950)
+                notion_executor = ThreadPoolExecutor(max_workers=1)
+                notion_update_future = notion_executor.submit(
+                    notion_mod.set_properties_bulk, notion_client, notion_page_id, {
+                        "Фулл саммари": full_summary,
+                        "Мидл саммари": middle_summary,
+                        "Шорт саммари": short_summary,
+                        "Материалы": "\n".join(resources_list),
+                    }, prop_max_len, log)
+                notion_executor.shutdown(wait=False)
+            
+            pending.update(excel_updates)
+            log("INFO", "main", "Записываем результаты в Excel", updates=list(pending.keys()))
+            flush_pending()
             
-            # Выводим результаты в консоль
+            # Выводим результаты в консоль одной записью в stdout
+            out = []
             if full_summary:
-                print(f"\n=== ПОЛНОЕ САММАРИ ===")
-                print(full_summary)
+                out.append(f"\n=== ПОЛНОЕ САММАРИ ===\n{full_summary}")
             
             if middle_summary:
-                print(f"\n=== СРЕДНЕЕ САММАРИ ===")
-                print(middle_summary)
+                out.append(f"\n=== СРЕДНЕЕ САММАРИ ===\n{middle_summary}")
             
             if short_summary:
-                print(f"\n=== КОРОТКОЕ САММАРИ ===")
-                print(short_summary)
+                out.append(f"\n=== КОРОТКОЕ САММАРИ ===\n{short_summary}")
             
+            out.append("\n=== РЕСУРСЫ ===")
             if resources_list:
-                print(f"\n=== РЕСУРСЫ ===")
-                for resource in resources_list:
-                    print(resource)
+                out.extend(resources_list)
             else:
-                print(f"\n=== РЕСУРСЫ ===")
-                print("Ресурсы не найдены.")
+                out.append("Ресурсы не найдены.")
             
-            # Обновляем Notion (если доступен)
-            if notion_client and notion_page_id:
-                prop_max_len = notion_config.get('prop_max_len', 1950)
-                notion_mod.set_rich_text(notion_client, notion_page_id, "Фулл саммари", full_summary, prop_max_len, log)
-                notion_mod.set_rich_text(notion_client, notion_page_id, "Мидл саммари", middle_summary, prop_max_len, log)
-                notion_mod.set_rich_text(notion_client, notion_page_id, "Шорт саммари", short_summary, prop_max_len, log)
-                notion_mod.set_materials(notion_client, notion_page_id, resources_list, prop_max_len, log)
+            sys.stdout.write("\n".join(out) + "\n")
+            sys.stdout.flush()
             
             # Логируем успешную обработку
             log("INFO", "main", "ai_independent_processing_complete", 
@@ -188,15 +246,9 @@ def main():
             chars_cleaned = 0
             error_msg = ai_results['error'].get('detail', ai_results['error'].get('code', 'unknown'))
             print(f"\n❌ Ошибка AI обработки: {error_msg}")
-            # Записываем пустые значения
-            empty_fields = {
-                "Чистый текст": "",
-                "Фулл саммари": "", 
-                "Мидл саммари": "",
-                "Шорт саммари": "",
-                "Материалы": ""
-            }
-            store_excel.write_step(excel_handle, run_id, empty_fields, log)
+            # AI-колонки новой строки и так пустые — записываем только накопленные
+            # ссылку и субтитры, без явной записи пустых значений
+            flush_pending()
         
         # Шаг 8: Записываем тестовые данные (в тестовый лист)
         test_data = {
@@ -210,9 +262,14 @@ def main():
         }
         store_excel.write_test_record(excel_handle, test_data, log)
         
-        # Шаг 9: Закрываем Excel ресурсы
+        # Шаг 9: Сохраняем книгу (ошибка блокировки файла — ValueError) и закрываем Excel ресурсы
+        store_excel.flush(excel_handle, log)
         store_excel.close(excel_handle)
         
+        # Дожидаемся фонового обновления Notion
+        if notion_update_future is not None:
+            notion_update_future.result()
+        
         # Шаг 10: Итог
         print(f"\n✅ Обработка завершена! Данные сохранены в Excel (запись №{run_id})")
         log("INFO", "main", "Программа завершена успешно", run_id=run_id)
@@ -220,44 +277,27 @@ def main():
     except ValueError as e:
         # Закрываем Excel ресурсы при ошибке
         if excel_handle:
+            flush_pending_on_error()
             store_excel.close(excel_handle)
             
         error_code = str(e)
         log("ERROR", "main", "Ошибка выполнения", error_code=error_code)
         
-        # Обрабатываем различные типы ошибок
-        if error_code == "invalid_url_exit":
-            print("Ошибка: Пользователь не ввел корректный URL")
-        elif error_code == "invalid_url_repeated":
-            print("Ошибка: Повторно введен некорректный URL. Программа завершена.")
-        elif error_code == "unauthorized":
-            print("Ошибка: Проблемы с авторизацией API ключей")
-        elif error_code == "rate_limited":
-            print("Ошибка: Превышен лимит запросов API")
-        elif error_code == "server_error":
-            print("Ошибка: Проблемы на сервере Supadata")
-        elif error_code == "job_timeout":
-            print("Ошибка: Таймаут получения результата")
-        elif error_code == "bad_url":
-            print("Ошибка: Проверьте ссылку в браузере - сервис не может её обработать")
-        elif error_code == "no_api_keys":
-            print("Ошибка: Не настроены API ключи в конфигурации")
-        elif error_code == "excel_file_locked":
-            print("Ошибка: Excel файл заблокирован. Закройте Excel и перезапустите.")
-        elif error_code.startswith("prompt_file_"):
-            print("Ошибка: Проблема с файлом промтов. Проверьте prompts/yt_prompts.txt")
-        elif error_code == "no_api_keys":
-            print("Ошибка: Не настроены AI API ключи в конфигурации")
-        elif error_code == "all_failed":
-            print("Ошибка: Все AI ключи и модели исчерпаны")
-        else:
-            print(f"Ошибка: {error_code}")
+        # Сообщение по коду ошибки
+        message = _ERROR_MESSAGES.get(error_code)
+        if message is None:
+            if error_code.startswith("prompt_file_"):
+                message = "Проблема с файлом промтов. Проверьте prompts/yt_prompts.txt"
+            else:
+                message = error_code
+        print(f"Ошибка: {message}")
         
         sys.exit(1)
         
     except Exception as e:
         # Закрываем Excel ресурсы при ошибке
         if excel_handle:
+            flush_pending_on_error()
             store_excel.close(excel_handle)
             
         log("ERROR", "main", "Неожиданная ошибка", error=str(e))
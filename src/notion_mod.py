@@ -9,16 +9,171 @@
 - Обработка ошибок без падения основной программы
 """
 
+import re
 import time
+import random
+import atexit
+import threading
+from collections import OrderedDict
 from typing import Optional, List, Dict, Any
+from urllib.parse import urlparse
 
 try:
     from notion_client import Client
+    from notion_client.helpers import iterate_paginated_api
     NOTION_AVAILABLE = True
 except ImportError:
     NOTION_AVAILABLE = False
     Client = None
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Статусы, которые Notion отдает при перегрузке: повторяем на уровне транспорта.
+# 429 — запрос отклонен без выполнения, его можно повторять для любого метода;
+# 502/503 — только для идемпотентных (POST pages/databases.create мог уже выполниться
+# за прокси, повтор создал бы дубликат)
+_RETRY_ANY_METHOD_STATUSES = frozenset((429,))
+_RETRY_IDEMPOTENT_STATUSES = frozenset((429, 502, 503))
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+_TRANSPORT_RETRIES = 3
+_TRANSPORT_BACKOFF_SEC = 0.5
+# Суммарное ожидание повторов на один запрос: сверху еще ретраи вызывающих
+_TRANSPORT_MAX_TOTAL_DELAY_SEC = 10.0
+# Размер пула соединений общего клиента (фоновые записи + параллельная синхронизация промтов)
+_HTTP_POOL_SIZE = 32
+
+
+if httpx is not None:
+    class _RetryTransport(httpx.HTTPTransport):
+        """
+        HTTP-транспорт с повтором перегрузочных ответов (см. _RETRY_*_STATUSES): ждет
+        Retry-After, если он задан, иначе экспоненциальную задержку с full jitter;
+        суммарно не дольше _TRANSPORT_MAX_TOTAL_DELAY_SEC. Ошибки соединения повторяет сам httpx.
+        """
+        
+        def handle_request(self, request):
+            if request.method in _IDEMPOTENT_METHODS:
+                retry_statuses = _RETRY_IDEMPOTENT_STATUSES
+            else:
+                retry_statuses = _RETRY_ANY_METHOD_STATUSES
+            waited = 0.0
+            for attempt in range(_TRANSPORT_RETRIES + 1):
+                response = super().handle_request(request)
+                if response.status_code not in retry_statuses or attempt == _TRANSPORT_RETRIES:
+                    return response
+                delay = _retry_after_sec(response)
+                if delay is None:
+                    delay = random.uniform(0, _TRANSPORT_BACKOFF_SEC * (2 ** attempt))
+                if waited + delay > _TRANSPORT_MAX_TOTAL_DELAY_SEC:
+                    # Бюджет ожидания исчерпан — решение за вызывающим
+                    return response
+                response.close()
+                time.sleep(delay)
+                waited += delay
+            return response
+
+
+    class _SharedTransport(httpx.BaseTransport):
+        """
+        Обертка общего транспорта для отдельного httpx.Client: close() клиента
+        не закрывает пул, которым пользуются остальные (он закрывается при выходе)
+        """
+        
+        def __init__(self, transport: httpx.BaseTransport):
+            self._transport = transport
+        
+        def handle_request(self, request):
+            return self._transport.handle_request(request)
+
+
+def _retry_after_sec(response) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах или None"""
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+# Общий HTTP-транспорт для всех Notion клиентов: keep-alive соединения
+# переживают пересоздание клиента, TLS-рукопожатие не повторяется
+_http_transport = None
+_http_transport_lock = threading.Lock()
+
+# ID страницы Notion в конце пути URL
+_PAGE_ID_RE = re.compile(r'([0-9a-f]{32}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$', re.I)
+
+# Кэш схем баз: {database_id: (время загрузки, properties)}, чтобы не делать
+# databases.retrieve на каждую запись свойства с переполнением
+_DB_SCHEMA_TTL_SEC = 300
+_db_schema_cache: Dict[str, tuple] = {}
+_db_schema_lock = threading.Lock()
+
+# Родительская база страницы не меняется: {page_id: database_id}. LRU на последние
+# страницы — в боте кэш живет весь процесс, страница нужна только пока пишутся ее свойства
+_PAGE_DB_CACHE_SIZE = 256
+_page_db_cache: "OrderedDict[str, str]" = OrderedDict()
+_page_db_lock = threading.Lock()
+
+
+def _cache_db_schema(database_id: str, properties: Dict[str, Any]) -> None:
+    with _db_schema_lock:
+        _db_schema_cache[database_id] = (time.time(), dict(properties))
+
+
+def _get_db_properties(client: Client, database_id: str) -> Dict[str, Any]:
+    """Свойства базы из кэша (TTL _DB_SCHEMA_TTL_SEC) или через databases.retrieve"""
+    with _db_schema_lock:
+        cached = _db_schema_cache.get(database_id)
+    if cached is not None and time.time() - cached[0] < _DB_SCHEMA_TTL_SEC:
+        return cached[1]
+    
+    db_info = client.databases.retrieve(database_id=database_id)
+    properties = db_info.get('properties', {})
+    _cache_db_schema(database_id, properties)
+    return properties
+
+
+# Значения свойств страницы в формате Notion API. Словари строятся на каждый вызов:
+# общий изменяемый шаблон небезопасен, записи в Notion идут и из фоновых потоков
+def _rich_text_payload(text: str) -> Dict[str, Any]:
+    return {"rich_text": [{"text": {"content": text}}]}
+
+def _title_payload(text: str) -> Dict[str, Any]:
+    return {"title": [{"text": {"content": text}}]}
+
+def _number_payload(value) -> Dict[str, Any]:
+    return {"number": value}
+
+def _url_payload(url: str) -> Dict[str, Any]:
+    return {"url": url}
+
+def _date_payload(start: str) -> Dict[str, Any]:
+    return {"date": {"start": start}}
+
+
+def _get_http_client():
+    """
+    Новый httpx.Client поверх общего транспорта или None, если httpx недоступен.
+    Клиент у каждого notion_client.Client свой: конструктор SDK записывает в него
+    Authorization, base_url и timeout, и общий клиент переключил бы токен всем остальным
+    """
+    global _http_transport
+    if httpx is None:
+        return None
+    with _http_transport_lock:
+        if _http_transport is None:
+            limits = httpx.Limits(max_connections=_HTTP_POOL_SIZE,
+                                  max_keepalive_connections=_HTTP_POOL_SIZE)
+            _http_transport = _RetryTransport(limits=limits, retries=3)
+            atexit.register(_http_transport.close)
+        transport = _http_transport
+    return httpx.Client(transport=_SharedTransport(transport))
+
 def init_client(config, log) -> Optional[Client]:
     """Инициализирует клиент Notion API"""
     if not NOTION_AVAILABLE:
@@ -33,7 +188,11 @@ def init_client(config, log) -> Optional[Client]:
         return None
     
     try:
-        client = Client(auth=token)
+        http_client = _get_http_client()
+        if http_client is not None:
+            client = Client(auth=token, client=http_client)
+        else:
+            client = Client(auth=token)
         log("INFO", "notion_mod", "Notion клиент инициализирован успешно")
         return client
     except Exception as e:
@@ -90,6 +249,7 @@ def ensure_database(client: Client, config, log) -> Optional[Dict[str, Any]]:
         if database_id:
             try:
                 db_info = client.databases.retrieve(database_id=database_id)
+                _cache_db_schema(db_info['id'], db_info.get('properties', {}))
                 log("INFO", "notion_mod", "Использую существующую базу данных", database_id=database_id)
                 return db_info
             except Exception as e:
@@ -98,8 +258,11 @@ def ensure_database(client: Client, config, log) -> Optional[Dict[str, Any]]:
         # Ищем базы данных с именем YT_SUM_QO
         log("INFO", "notion_mod", "Ищу базы данных с именем YT_SUM_QO")
         
-        # Получаем список всех баз данных
-        search_result = client.search(
+        # Notion сам отбирает базы по названию (query), а все страницы выдачи
+        # обходятся постранично; точное совпадение имени проверяем ниже
+        search_results = iterate_paginated_api(
+            client.search,
+            query="YT_SUM_QO",
             filter={
                 "value": "database",
                 "property": "object"
@@ -108,7 +271,7 @@ def ensure_database(client: Client, config, log) -> Optional[Dict[str, Any]]:
         
         # Фильтруем по имени YT_SUM_QO
         matching_databases = []
-        for result in search_result.get('results', []):
+        for result in search_results:
             if result.get('object') == 'database':
                 title_parts = result.get('title', [])
                 if title_parts and len(title_parts) > 0:
@@ -120,6 +283,7 @@ def ensure_database(client: Client, config, log) -> Optional[Dict[str, Any]]:
             # Сортируем по дате создания (самая новая первой)
             matching_databases.sort(key=lambda x: x.get('created_time', ''), reverse=True)
             latest_db = matching_databases[0]
+            _cache_db_schema(latest_db['id'], latest_db.get('properties', {}))
             
             db_id = latest_db['id']
             created_time = latest_db.get('created_time', '')
@@ -140,14 +304,14 @@ def ensure_database(client: Client, config, log) -> Optional[Dict[str, Any]]:
             log("ERROR", "notion_mod", "parent_page_url не настроен для создания базы")
             return None
         
-        # Извлекаем ID страницы из URL
-        if 'notion.so/' in parent_page_url:
-            page_id = parent_page_url.split('/')[-1].split('?')[0]
-            if '-' in page_id:
-                page_id = page_id.replace('-', '')
-        else:
+        # Извлекаем ID страницы из URL: 32 hex-символа (или UUID с дефисами) в конце пути,
+        # после возможного слага "Название-страницы-"
+        parsed_url = urlparse(parent_page_url)
+        page_id_match = _PAGE_ID_RE.search(parsed_url.path) if 'notion.so' in parsed_url.netloc else None
+        if not page_id_match:
             log("ERROR", "notion_mod", "Неверный формат parent_page_url")
             return None
+        page_id = page_id_match.group(1).replace('-', '')
         
         # Создаем базу данных
         new_db = client.databases.create(
@@ -157,6 +321,7 @@ def ensure_database(client: Client, config, log) -> Optional[Dict[str, Any]]:
         )
         
         new_db_id = new_db['id']
+        _cache_db_schema(new_db_id, new_db.get('properties', {}))
         log("INFO", "notion_mod", "Создана новая база данных YT_SUM_QO", database_id=new_db_id)
         
         return new_db
@@ -166,9 +331,12 @@ def ensure_database(client: Client, config, log) -> Optional[Dict[str, Any]]:
         return None
 
 def upsert_page_for_run(client: Client, db_id: str, run_id: int, url: str, 
-                       video_title: Optional[str], created_at_iso: str, log) -> Optional[str]:
+                       video_title: Optional[str], created_at_iso: str, log,
+                       is_new_run: bool = False) -> Optional[str]:
     """
     Создает или обновляет страницу для run_id.
+    is_new_run=True — run_id только что выделен и страницы для него быть не может:
+    поиск через databases.query пропускается, страница сразу создается.
     Возвращает page_id или None при ошибке.
     """
     if not client or not db_id:
@@ -176,20 +344,22 @@ def upsert_page_for_run(client: Client, db_id: str, run_id: int, url: str,
     
     try:
         # Ищем существующую страницу с таким Номер
-        query_result = client.databases.query(
-            database_id=db_id,
-            filter={
-                "property": "Номер",
-                "number": {"equals": run_id}
-            }
-        )
+        query_result = None
+        if not is_new_run:
+            query_result = client.databases.query(
+                database_id=db_id,
+                filter={
+                    "property": "Номер",
+                    "number": {"equals": run_id}
+                }
+            )
         
         # Определяем заголовок страницы
         page_title = video_title if video_title else url
         if len(page_title) > 100:  # Ограничиваем заголовок
             page_title = page_title[:97] + "..."
         
-        if query_result['results']:
+        if query_result and query_result['results']:
             # Страница существует, возвращаем её ID
             page_id = query_result['results'][0]['id']
             log("INFO", "notion_mod", "Найдена существующая страница", page_id=page_id, run_id=run_id)
@@ -199,10 +369,10 @@ def upsert_page_for_run(client: Client, db_id: str, run_id: int, url: str,
             new_page = client.pages.create(
                 parent={"database_id": db_id},
                 properties={
-                    "Видео": {"title": [{"text": {"content": page_title}}]},
-                    "Номер": {"number": run_id},
-                    "Ссылка": {"url": url},
-                    "Дата добавления": {"date": {"start": created_at_iso[:10]}}  # Только дата без времени
+                    "Видео": _title_payload(page_title),
+                    "Номер": _number_payload(run_id),
+                    "Ссылка": _url_payload(url),
+                    "Дата добавления": _date_payload(created_at_iso)  # Только дата (YYYY-MM-DD)
                 }
             )
             
@@ -214,9 +384,11 @@ def upsert_page_for_run(client: Client, db_id: str, run_id: int, url: str,
         log("ERROR", "notion_mod", "Ошибка при создании/поиске страницы", error=str(e), run_id=run_id)
         return None
 
-def set_rich_text(client: Client, page_id: str, property_name: str, text: str, max_len: int, log) -> bool:
+def set_rich_text(client: Client, page_id: str, property_name: str, text: str, max_len: int, log,
+                  start: int = 0) -> bool:
     """
     Обновляет свойство rich_text с ограничением длины.
+    Записывается text[start:start + max_len] — одним срезом, без промежуточных копий.
     Возвращает True при успехе, False при ошибке.
     """
     if not client or not page_id:
@@ -224,15 +396,11 @@ def set_rich_text(client: Client, page_id: str, property_name: str, text: str, m
     
     try:
         # Обрезаем текст до max_len
-        truncated_text = (text or "")[:max_len]
+        truncated_text = (text or "")[start:start + max_len]
         
         client.pages.update(
             page_id=page_id,
-            properties={
-                property_name: {
-                    "rich_text": [{"text": {"content": truncated_text}}]
-                }
-            }
+            properties={property_name: _rich_text_payload(truncated_text)}
         )
         
         char_info = f"{len(truncated_text)}/{max_len}"
@@ -245,6 +413,29 @@ def set_rich_text(client: Client, page_id: str, property_name: str, text: str, m
             page_id=page_id, error=str(e))
         return False
 
+def set_properties_bulk(client: Client, page_id: str, texts: Dict[str, str], max_len: int, log) -> bool:
+    """
+    Обновляет несколько свойств rich_text одним запросом pages.update.
+    texts: {имя свойства: текст}; каждый текст обрезается до max_len.
+    Возвращает True при успехе, False при ошибке.
+    """
+    if not client or not page_id:
+        return False
+    
+    properties = {
+        name: _rich_text_payload((text or "")[:max_len])
+        for name, text in texts.items()
+    }
+    
+    try:
+        client.pages.update(page_id=page_id, properties=properties)
+        log("INFO", "notion_mod", "Обновлены свойства", page_id=page_id, properties=list(properties))
+        return True
+        
+    except Exception as e:
+        log("ERROR", "notion_mod", "Ошибка обновления свойств", page_id=page_id, error=str(e))
+        return False
+
 def ensure_property_exists(client: Client, database_id: str, property_name: str, property_type: str, log) -> bool:
     """
     Проверяет существование свойства в базе данных и добавляет его при необходимости.
@@ -260,11 +451,11 @@ def ensure_property_exists(client: Client, database_id: str, property_name: str,
         True если свойство существует или было успешно добавлено
     """
     try:
-        # Получаем информацию о базе данных
-        db_info = client.databases.retrieve(database_id=database_id)
+        # Получаем свойства базы данных (из кэша, если схема загружалась недавно)
+        db_properties = _get_db_properties(client, database_id)
         
         # Проверяем, существует ли свойство
-        if property_name in db_info.get('properties', {}):
+        if property_name in db_properties:
             log("INFO", "notion_mod", f"Свойство {property_name} уже существует")
             return True
         
@@ -309,6 +500,10 @@ def ensure_property_exists(client: Client, database_id: str, property_name: str,
             }
         )
         
+        # Дополняем закэшированную схему вместо повторного databases.retrieve
+        with _db_schema_lock:
+            db_properties[property_name] = property_definition
+        
         log("INFO", "notion_mod", f"Свойство {property_name} успешно добавлено в базу данных")
         return True
         
@@ -331,25 +526,15 @@ def set_rich_text_with_overflow(client: Client, page_id: str, property_name: str
             return set_rich_text(client, page_id, property_name, text, max_len, log)
         
         # Если текст длиннее лимита, сохраняем первую часть в основном свойстве
-        main_text = text[:max_len]
-        overflow_text = text[max_len:]
-        
-        # Сохраняем основную часть
-        success1 = set_rich_text(client, page_id, property_name, main_text, max_len, log)
+        success1 = set_rich_text(client, page_id, property_name, text, max_len, log)
         
         # Проверяем существование дополнительного свойства и добавляем его при необходимости
         if success1:
-            # Получаем database_id из страницы
-            try:
-                page_info = client.pages.retrieve(page_id=page_id)
-                database_id = page_info['parent']['database_id']
-                # Проверяем и добавляем свойство при необходимости
-                ensure_property_exists(client, database_id, overflow_property_name, "rich_text", log)
-            except Exception as e:
-                log("WARNING", "notion_mod", "Не удалось получить database_id для проверки свойства", error=str(e))
+            _ensure_overflow_property(client, page_id, overflow_property_name, log)
         
-        # Сохраняем остаток в дополнительном свойстве
-        success2 = set_rich_text(client, page_id, overflow_property_name, overflow_text, max_len, log)
+        # Сохраняем остаток в дополнительном свойстве (срез берется сразу от max_len)
+        success2 = set_rich_text(client, page_id, overflow_property_name, text, max_len, log,
+                                 start=max_len)
         
         return success1 and success2
         
@@ -358,62 +543,127 @@ def set_rich_text_with_overflow(client: Client, page_id: str, property_name: str
             page_id=page_id, error=str(e))
         return False
 
-def set_materials(client: Client, page_id: str, lines: List[str], max_len: int, log) -> bool:
+def _ensure_overflow_property(client: Client, page_id: str, overflow_property_name: str, log) -> None:
+    """Добавляет свойство переполнения в базу страницы, если его еще нет"""
+    try:
+        # Получаем database_id из страницы
+        with _page_db_lock:
+            database_id = _page_db_cache.get(page_id)
+            if database_id is not None:
+                _page_db_cache.move_to_end(page_id)
+        if database_id is None:
+            page_info = client.pages.retrieve(page_id=page_id)
+            database_id = page_info['parent']['database_id']
+            with _page_db_lock:
+                _page_db_cache[page_id] = database_id
+                while len(_page_db_cache) > _PAGE_DB_CACHE_SIZE:
+                    _page_db_cache.popitem(last=False)
+        # Проверяем и добавляем свойство при необходимости
+        ensure_property_exists(client, database_id, overflow_property_name, "rich_text", log)
+    except Exception as e:
+        log("WARNING", "notion_mod", "Не удалось получить database_id для проверки свойства", error=str(e))
+
+def overflow_texts(client: Client, page_id: str, property_name: str, text: str, max_len: int,
+                   overflow_property_name: str, log) -> Dict[str, str]:
+    """
+    Тексты свойств для set_properties_bulk: первые max_len символов — в property_name,
+    следующие — в overflow_property_name (свойство создается в базе при необходимости).
+    Позволяет записать переполнение в том же pages.update, что и остальные свойства.
+    """
+    if len(text) <= max_len:
+        return {property_name: text}
+    _ensure_overflow_property(client, page_id, overflow_property_name, log)
+    return {property_name: text[:max_len], overflow_property_name: text[max_len:]}
+
+def set_materials(client: Client, page_id: str, lines: List[str], max_len: int, log,
+                  force_clear: bool = False) -> bool:
     """
     Обновляет свойство 'Материалы' объединяя строки через \n.
+    Пустой список не отправляется в Notion (свойство новой страницы и так пустое);
+    force_clear=True очищает уже заполненное свойство.
     Возвращает True при успехе, False при ошибке.
     """
     if not lines:
+        if not force_clear:
+            return True
         lines = []
     
     body = "\n".join(lines)
     return set_rich_text(client, page_id, "Материалы", body, max_len, log)
 
-def handle_api_error(error: Exception, operation: str, log) -> bool:
+def _retry_after_ms(error: Exception) -> Optional[int]:
+    """Retry-After (секунды) из ответа Notion, переведенный в мс; None если заголовка нет"""
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return int(float(headers.get('Retry-After')) * 1000)
+    except (TypeError, ValueError):
+        return None
+
+def handle_api_error(error: Exception, operation: str, log):
     """
     Обрабатывает ошибки Notion API.
-    Возвращает True если нужно прекратить дальнейшие попытки, False если можно повторить.
+    Возвращает (should_stop, suggested_delay_ms):
+    should_stop — True если нужно прекратить дальнейшие попытки, False если можно повторить;
+    suggested_delay_ms — задержка из Retry-After для 429, иначе None.
     """
     error_str = str(error)
+    status = getattr(error, 'status', None)
     
     # Ошибки авторизации - прекращаем работу с Notion
-    if "401" in error_str or "403" in error_str or "unauthorized" in error_str.lower():
+    if status in (401, 403) or "401" in error_str or "403" in error_str or "unauthorized" in error_str.lower():
         log("ERROR", "notion_mod", f"Ошибка авторизации при {operation}, отключаю Notion", error=error_str)
-        return True
+        return True, None
     
-    # Rate limiting - можно повторить
-    if "429" in error_str or "rate_limit" in error_str.lower():
-        log("WARNING", "notion_mod", f"Rate limit при {operation}, повторю позже", error=error_str)
-        return False
+    # Rate limiting - можно повторить, с задержкой из Retry-After если она есть
+    if status == 429 or "429" in error_str or "rate_limit" in error_str.lower():
+        retry_after_ms = _retry_after_ms(error)
+        log("WARNING", "notion_mod", f"Rate limit при {operation}, повторю позже", error=error_str, retry_after_ms=retry_after_ms)
+        return False, retry_after_ms
+    
+    # Некорректный запрос или страница не найдена - повтор не поможет
+    if status in (400, 404):
+        log("ERROR", "notion_mod", f"Неповторяемая ошибка при {operation}", status=status, error=error_str)
+        return True, None
     
     # Серверные ошибки - можно повторить
-    if any(code in error_str for code in ["500", "502", "503", "504"]):
+    if (status is not None and status >= 500) or any(code in error_str for code in ["500", "502", "503", "504"]):
         log("WARNING", "notion_mod", f"Серверная ошибка при {operation}, повторю позже", error=error_str)
-        return False
+        return False, None
     
     # Другие ошибки - логируем но не прекращаем
     log("ERROR", "notion_mod", f"Неизвестная ошибка при {operation}", error=error_str)
-    return False
+    return False, None
 
 def retry_with_backoff(func, backoff_ms: List[int], operation: str, log, *args, **kwargs):
     """
     Выполняет функцию с повторами по backoff.
+    Задержка — случайная в [0, delay_ms] (full jitter), чтобы параллельные запуски
+    не повторяли запросы одновременно; для 429 используется Retry-After, если он задан.
     Возвращает результат функции или None при неудаче.
     """
     last_error = None
+    suggested_delay_ms = None
     
     for i, delay_ms in enumerate([0] + backoff_ms):  # Первый вызов без задержки
         if delay_ms > 0:
-            time.sleep(delay_ms / 1000.0)
-            log("INFO", "notion_mod", f"Повтор {i}/{len(backoff_ms)} для {operation} через {delay_ms}мс")
+            if suggested_delay_ms is not None:
+                sleep_ms = suggested_delay_ms
+            else:
+                sleep_ms = random.uniform(0, delay_ms)
+            time.sleep(sleep_ms / 1000.0)
+            log("INFO", "notion_mod", f"Повтор {i}/{len(backoff_ms)} для {operation}", delay_ms=int(sleep_ms))
         
         try:
             return func(*args, **kwargs)
         except Exception as e:
             last_error = e
-            should_stop = handle_api_error(e, operation, log)
+            should_stop, suggested_delay_ms = handle_api_error(e, operation, log)
             if should_stop:
                 break
     
     log("ERROR", "notion_mod", f"Все попытки {operation} исчерпаны", error=str(last_error))
-    return None
\ No newline at end of file
+    return None
@@ -1,18 +1,23 @@
+import sys
+
+
 def print_preview(lang: str, content: str, preview_chars: int, log) -> None:
     """
     Напечатать: 'Язык: <lang>' и 'Длина: <N> символов', затем 'Первые <preview_chars> символов:' и сам префью.
     Префью формировать как content[:preview_chars] с заменой \n на пробел.
     Залогировать факт печати префью.
     """
-    # Выводим информацию о языке и длине
-    print(f"Язык: {lang}")
-    print(f"Длина: {len(content)} символов")
+    length = len(content)
     
-    # Формируем и выводим превью
+    # Формируем превью (replace для одного символа быстрее str.translate)
     preview = content[:preview_chars].replace('\n', ' ')
-    print(f"Первые {preview_chars} символов:")
-    print(preview)
+    
+    # Информация о языке и длине и само превью — одной записью в stdout
+    sys.stdout.write(f"Язык: {lang}\n"
+                     f"Длина: {length} символов\n"
+                     f"Первые {preview_chars} символов:\n"
+                     f"{preview}\n")
     
     # Логируем факт печати
     log("INFO", "output_mod", "Превью транскрипта выведено", 
-        lang=lang, length=len(content), preview_chars=preview_chars)
\ No newline at end of file
+        lang=lang, length=length, preview_chars=preview_chars)
\ No newline at end of file
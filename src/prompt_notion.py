@@ -10,15 +10,69 @@
 """
 
 import re
-from typing import Dict, List, Optional, Tuple
+import time
+import hashlib
+import threading
+from bisect import bisect_left
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from pathlib import Path
 
-try:
+# notion_client (и httpx за ним) импортируется только при первом запросе к API:
+# клиент создает notion_mod, здесь нужен лишь помощник пагинации
+if TYPE_CHECKING:
     from notion_client import Client
-    NOTION_AVAILABLE = True
-except ImportError:
-    NOTION_AVAILABLE = False
-    Client = None
+
+
+def _iterate_paginated(function, **kwargs):
+    """Обертка над notion_client.helpers.iterate_paginated_api с отложенным импортом"""
+    from notion_client.helpers import iterate_paginated_api
+    return iterate_paginated_api(function, **kwargs)
+
+
+class _RateLimiter:
+    """
+    Ограничитель частоты запросов, общий для потоков:
+    между двумя вызовами wait() проходит не меньше 1/calls_per_sec секунд.
+    """
+    
+    def __init__(self, calls_per_sec: float):
+        self._interval = 1.0 / calls_per_sec
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_at)
+            self._next_at = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Заголовок секции файла промтов "### <N> <NAME>" и разделитель "---" между абзацами
+_SECTION_RE = re.compile(r'### (\d+) ([A-Z0-9_]+)')
+_SEP_RE = re.compile(r'\n---+\n')
+
+# Возможные места разреза длинного текста в split_long_text
+_NEWLINE_RE = re.compile(r'\n')
+_SENTENCE_END_RE = re.compile(r'\. ')
+_SPACE_RE = re.compile(r' ')
+
+# Notion допускает в среднем ~3 запроса в секунду на интеграцию
+_NOTION_RATE = _RateLimiter(3)
+
+# Сколько промтов синхронизируется параллельно
+SYNC_WORKERS = 4
+
+# Части промта 1-3 живут в колонках "Промт", "Промт 2", "Промт 3", остальные — блоками страницы
+_PROPERTY_PARTS = 3
+# Лимит Notion на число блоков в одном blocks.children.append
+_CHILDREN_BATCH = 100
+
+# Найденные/созданные базы промтов: {(parent_page_url, database_name): db_id}
+_prompts_db_cache: Dict[Tuple[str, str], str] = {}
 
 
 def split_long_text(text: str, max_length: int = 1950) -> List[str]:
@@ -36,39 +90,54 @@ def split_long_text(text: str, max_length: int = 1950) -> List[str]:
     if len(text) <= max_length:
         return [text]
     
+    # Позиции возможных разрезов собираем за один проход по тексту,
+    # затем для каждой части ищем ближайшую к лимиту бинарным поиском
+    newlines = [m.start() for m in _NEWLINE_RE.finditer(text)]
+    sentence_ends = [m.start() + 1 for m in _SENTENCE_END_RE.finditer(text)]
+    spaces = [m.start() for m in _SPACE_RE.finditer(text)]
+    
+    def last_before(positions: List[int], start: int, limit: int) -> int:
+        # Последняя позиция в [start, limit) или -1
+        index = bisect_left(positions, limit) - 1
+        return positions[index] if index >= 0 and positions[index] >= start else -1
+    
     parts = []
-    remaining_text = text
+    start = 0
+    end = len(text)
+    min_offset = max_length * 0.7  # Разрез не слишком близко к началу части
     
-    while len(remaining_text) > max_length:
-        # Находим оптимальное место разреза
-        cut_position = max_length
+    while end - start > max_length:
+        limit = start + max_length
         
-        # Ищем последний перенос строки в пределах лимита
-        last_newline = remaining_text.rfind('\n', 0, max_length)
-        if last_newline > max_length * 0.7:  # Если перенос не слишком близко к началу
+        # Находим оптимальное место разреза: перенос строки, конец предложения, пробел
+        cut_position = limit
+        last_newline = last_before(newlines, start, limit)
+        if last_newline - start > min_offset:
             cut_position = last_newline
         else:
-            # Ищем последнюю точку с пробелом
-            last_sentence = remaining_text.rfind('. ', 0, max_length)
-            if last_sentence > max_length * 0.7:
-                cut_position = last_sentence + 1
+            # sentence_ends хранит позицию после точки: ". " должна целиком уместиться до limit
+            last_sentence = last_before(sentence_ends, start + 1, limit)
+            if last_sentence - 1 - start > min_offset:
+                cut_position = last_sentence
             else:
-                # Ищем последний пробел
-                last_space = remaining_text.rfind(' ', 0, max_length)
-                if last_space > max_length * 0.7:
+                last_space = last_before(spaces, start, limit)
+                if last_space - start > min_offset:
                     cut_position = last_space
         
-        # Извлекаем часть текста
-        part = remaining_text[:cut_position].strip()
+        # Извлекаем часть текста без копирования остатка
+        part = text[start:cut_position].strip()
         if part:
             parts.append(part)
         
-        # Оставляем оставшийся текст
-        remaining_text = remaining_text[cut_position:].strip()
+        # Остаток начинается после пробельных символов (и без хвостовых пробелов)
+        start = cut_position
+        while start < end and text[start].isspace():
+            start += 1
+        end = len(text.rstrip())
     
     # Добавляем последнюю часть
-    if remaining_text:
-        parts.append(remaining_text)
+    if start < end:
+        parts.append(text[start:end])
     
     return parts
 
@@ -86,27 +155,20 @@ def parse_prompts_file(file_path: str) -> Dict[str, str]:
     prompts = {}
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Разделяем по секциям ### N NAME
-        sections = re.split(r'### (\d+) ([A-Z0-9_]+)', content)
+        content = Path(file_path).read_text(encoding='utf-8')
         
-        # sections = [пустое, '1', 'P1_CLEAN', контент_1, '2', 'P2_FULL', контент_2, ...]
-        i = 1
-        while i + 2 < len(sections):
-            section_num = sections[i].strip()
-            section_name = sections[i + 1].strip() 
-            section_content = sections[i + 2].strip()
+        # Секции ### N NAME: текст секции — от конца заголовка до начала следующего
+        headers = list(_SECTION_RE.finditer(content))
+        for index, header in enumerate(headers):
+            section_name = header.group(2)
+            section_end = headers[index + 1].start() if index + 1 < len(headers) else len(content)
             
             # Убираем разделители и лишние переносы
-            section_content = re.sub(r'\n---+\n', '\n', section_content)
+            section_content = _SEP_RE.sub('\n', content[header.end():section_end].strip())
             section_content = section_content.strip()
             
             prompts[section_name] = section_content
             print(f"Найден промт: {section_name} ({len(section_content)} символов)")
-            
-            i += 3
     
     except Exception as e:
         print(f"Ошибка при чтении файла промтов {file_path}: {e}")
@@ -114,7 +176,7 @@ def parse_prompts_file(file_path: str) -> Dict[str, str]:
     return prompts
 
 
-def ensure_prompts_database(client: Client, config, log) -> Optional[str]:
+def ensure_prompts_database(client: "Client", config, log) -> Optional[str]:
     """
     Создает или находит базу данных для промтов в Notion.
     
@@ -155,9 +217,21 @@ def ensure_prompts_database(client: Client, config, log) -> Optional[str]:
         },
         "Обновлен": {
             "date": {}  # Дата последнего обновления
+        },
+        "Hash": {
+            "rich_text": {}  # Хеш текста промта: неизмененные промты не переписываются
         }
     }
     
+    notion_config = config.get('notion', {})
+    parent_page_url = notion_config.get('parent_page_url', '')
+    
+    # База уже найдена в этом процессе — повторный поиск не нужен
+    cache_key = (parent_page_url, database_name)
+    cached_db_id = _prompts_db_cache.get(cache_key)
+    if cached_db_id:
+        return cached_db_id
+    
     try:
         # Ищем существующую базу данных с промтами
         log("INFO", "prompt_notion", f"Ищу базу данных {database_name}")
@@ -177,15 +251,19 @@ def ensure_prompts_database(client: Client, config, log) -> Optional[str]:
                     title_text = title_parts[0].get('text', {}).get('content', '')
                     if title_text == database_name:
                         db_id = result['id']
+                        # Базы, созданные до появления колонки Hash, дополняем ею
+                        if 'Hash' not in result.get('properties', {}):
+                            client.databases.update(
+                                database_id=db_id,
+                                properties={"Hash": required_properties["Hash"]}
+                            )
                         log("INFO", "prompt_notion", f"Найдена существующая база {database_name}", database_id=db_id)
+                        _prompts_db_cache[cache_key] = db_id
                         return db_id
         
         # База не найдена - создаем новую
         log("INFO", "prompt_notion", f"База {database_name} не найдена, создаю новую")
         
-        notion_config = config.get('notion', {})
-        parent_page_url = notion_config.get('parent_page_url', '')
-        
         if not parent_page_url:
             log("ERROR", "prompt_notion", "parent_page_url не настроен для создания базы")
             return None
@@ -209,6 +287,7 @@ def ensure_prompts_database(client: Client, config, log) -> Optional[str]:
         db_id = new_db['id']
         log("INFO", "prompt_notion", f"Создана новая база данных {database_name}", database_id=db_id)
         
+        _prompts_db_cache[cache_key] = db_id
         return db_id
         
     except Exception as e:
@@ -216,7 +295,7 @@ def ensure_prompts_database(client: Client, config, log) -> Optional[str]:
         return None
 
 
-def sync_prompts_to_notion(client: Client, db_id: str, prompts_file_path: str, log) -> bool:
+def sync_prompts_to_notion(client: "Client", db_id: str, prompts_file_path: str, log) -> bool:
     """
     Синхронизирует промты из файла в базу данных Notion.
     
@@ -242,60 +321,27 @@ def sync_prompts_to_notion(client: Client, db_id: str, prompts_file_path: str, l
         
         log("INFO", "prompt_notion", f"Найдено {len(prompts)} промтов для синхронизации")
         
-        import datetime
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        current_date = date.today().isoformat()
         
-        # Обрабатываем каждый промт
-        for prompt_name, prompt_text in prompts.items():
-            log("INFO", "prompt_notion", f"Обрабатываю промт {prompt_name}")
-            
-            # Разделяем промт на части если нужно
-            prompt_parts = split_long_text(prompt_text, max_length=1950)
-            is_split = len(prompt_parts) > 1
-            
-            # Ищем существующую страницу для этого промта
-            query_result = client.databases.query(
-                database_id=db_id,
-                filter={
-                    "property": "Имя промта",
-                    "title": {"equals": prompt_name}
-                }
-            )
-            
-            # Подготавливаем данные для страницы
-            page_properties = {
-                "Имя промта": {"title": [{"text": {"content": prompt_name}}]},
-                "Промт": {"rich_text": [{"text": {"content": prompt_parts[0]}}]},
-                "Разделен": {"checkbox": is_split},
-                "Длина": {"number": len(prompt_text)},
-                "Обновлен": {"date": {"start": current_date}}
+        # Промты независимы: синхронизируем параллельно, частоту запросов ограничивает _NOTION_RATE
+        failed = []
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as executor:
+            futures = {
+                executor.submit(_sync_single_prompt, client, db_id, prompt_name, prompt_text,
+                                current_date, log): prompt_name
+                for prompt_name, prompt_text in prompts.items()
             }
-            
-            # Добавляем дополнительные части если есть
-            if len(prompt_parts) > 1:
-                page_properties["Промт 2"] = {"rich_text": [{"text": {"content": prompt_parts[1]}}]}
-            
-            if len(prompt_parts) > 2:
-                page_properties["Промт 3"] = {"rich_text": [{"text": {"content": prompt_parts[2]}}]}
-            
-            if query_result['results']:
-                # Обновляем существующую страницу
-                page_id = query_result['results'][0]['id']
-                client.pages.update(
-                    page_id=page_id,
-                    properties=page_properties
-                )
-                log("INFO", "prompt_notion", f"Обновлен промт {prompt_name}", page_id=page_id, 
-                    is_split=is_split, parts=len(prompt_parts))
-            else:
-                # Создаем новую страницу
-                new_page = client.pages.create(
-                    parent={"database_id": db_id},
-                    properties=page_properties
-                )
-                page_id = new_page['id']
-                log("INFO", "prompt_notion", f"Создан новый промт {prompt_name}", page_id=page_id,
-                    is_split=is_split, parts=len(prompt_parts))
+            for future in as_completed(futures):
+                prompt_name = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    log("ERROR", "prompt_notion", f"Ошибка синхронизации промта {prompt_name}", error=str(e))
+                    failed.append(prompt_name)
+        
+        if failed:
+            log("ERROR", "prompt_notion", "Синхронизация промтов завершена с ошибками", failed=sorted(failed))
+            return False
         
         log("INFO", "prompt_notion", "Синхронизация промтов завершена успешно")
         return True
@@ -305,7 +351,179 @@ def sync_prompts_to_notion(client: Client, db_id: str, prompts_file_path: str, l
         return False
 
 
-def get_prompt_from_notion(client: Client, db_id: str, prompt_name: str, log) -> Optional[str]:
+def _sync_single_prompt(client: "Client", db_id: str, prompt_name: str, prompt_text: str,
+                        current_date: str, log) -> None:
+    """Создает или обновляет страницу одного промта. Ошибки Notion пробрасываются вызывающему."""
+    log("INFO", "prompt_notion", f"Обрабатываю промт {prompt_name}")
+    
+    # Разделяем промт на части если нужно
+    prompt_parts = split_long_text(prompt_text, max_length=1950)
+    is_split = len(prompt_parts) > 1
+    prompt_hash = _prompt_hash(prompt_text)
+    
+    # Ищем существующую страницу для этого промта
+    _NOTION_RATE.wait()
+    query_result = client.databases.query(
+        database_id=db_id,
+        filter={
+            "property": "Имя промта",
+            "title": {"equals": prompt_name}
+        }
+    )
+    
+    if query_result['results'] and _page_hash(query_result['results'][0]) == prompt_hash:
+        log("INFO", "prompt_notion", f"Промт {prompt_name} не изменился, пропускаю")
+        return
+    
+    # Подготавливаем данные для страницы
+    page_properties = {
+        "Имя промта": {"title": [{"text": {"content": prompt_name}}]},
+        "Промт": {"rich_text": [{"text": {"content": prompt_parts[0]}}]},
+        "Разделен": {"checkbox": is_split},
+        "Длина": {"number": len(prompt_text)},
+        "Обновлен": {"date": {"start": current_date}},
+        # Hash пишется последним, когда тело страницы уже записано: иначе сбой на блоках
+        # оставил бы обрезанный промт с новым хешем, и синхронизация его бы пропускала
+        "Hash": {"rich_text": []}
+    }
+    
+    # Добавляем дополнительные части если есть
+    if len(prompt_parts) > 1:
+        page_properties["Промт 2"] = {"rich_text": [{"text": {"content": prompt_parts[1]}}]}
+    
+    if len(prompt_parts) > 2:
+        page_properties["Промт 3"] = {"rich_text": [{"text": {"content": prompt_parts[2]}}]}
+    
+    # Все, что не влезло в три колонки, пишем блоками-абзацами в тело страницы
+    overflow_parts = prompt_parts[_PROPERTY_PARTS:]
+    hash_property = {"Hash": {"rich_text": [{"text": {"content": prompt_hash}}]}}
+    
+    _NOTION_RATE.wait()
+    if query_result['results']:
+        # Обновляем существующую страницу
+        page_id = query_result['results'][0]['id']
+        client.pages.update(
+            page_id=page_id,
+            properties=page_properties
+        )
+        # Старый хвост удаляем всегда: промт мог укоротиться
+        _clear_page_children(client, page_id)
+        log("INFO", "prompt_notion", f"Обновлен промт {prompt_name}", page_id=page_id, 
+            is_split=is_split, parts=len(prompt_parts))
+    else:
+        # Создаем новую страницу; без блоков хвоста хеш можно записать сразу
+        if not overflow_parts:
+            page_properties.update(hash_property)
+        new_page = client.pages.create(
+            parent={"database_id": db_id},
+            properties=page_properties
+        )
+        page_id = new_page['id']
+        log("INFO", "prompt_notion", f"Создан новый промт {prompt_name}", page_id=page_id,
+            is_split=is_split, parts=len(prompt_parts))
+    
+    if overflow_parts:
+        _append_overflow_blocks(client, page_id, overflow_parts)
+        log("INFO", "prompt_notion", f"Хвост промта {prompt_name} записан блоками",
+            page_id=page_id, blocks=len(overflow_parts))
+    
+    if query_result['results'] or overflow_parts:
+        _NOTION_RATE.wait()
+        client.pages.update(page_id=page_id, properties=hash_property)
+
+
+def _prompt_hash(prompt_text: str) -> str:
+    """Короткий хеш текста промта для сравнения с сохраненным в Notion."""
+    return hashlib.blake2b(prompt_text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _page_hash(page: dict) -> str:
+    """Хеш промта, сохраненный на странице, или пустая строка."""
+    rich_text = page['properties'].get('Hash', {}).get('rich_text')
+    if not rich_text:
+        return ""
+    return rich_text[0]['text']['content']
+
+
+def _paragraph_block(text: str) -> dict:
+    """Блок-абзац Notion с одним фрагментом текста."""
+    return {
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {"rich_text": [{"type": "text", "text": {"content": text}}]}
+    }
+
+
+def _append_overflow_blocks(client: "Client", page_id: str, parts: List[str]) -> None:
+    """Дописывает части промта в тело страницы пачками по лимиту API."""
+    for i in range(0, len(parts), _CHILDREN_BATCH):
+        _NOTION_RATE.wait()
+        client.blocks.children.append(
+            block_id=page_id,
+            children=[_paragraph_block(part) for part in parts[i:i + _CHILDREN_BATCH]]
+        )
+
+
+def _clear_page_children(client: "Client", page_id: str) -> None:
+    """Удаляет все блоки из тела страницы промта."""
+    _NOTION_RATE.wait()
+    block_ids = [block['id'] for block in
+                 _iterate_paginated(client.blocks.children.list, block_id=page_id)]
+    for block_id in block_ids:
+        _NOTION_RATE.wait()
+        client.blocks.delete(block_id=block_id)
+
+
+def _read_overflow_blocks(client: "Client", page_id: str) -> List[str]:
+    """Читает части промта, записанные блоками-абзацами в тело страницы."""
+    parts = []
+    for block in _iterate_paginated(client.blocks.children.list, block_id=page_id):
+        if block.get('type') != 'paragraph':
+            continue
+        text = "".join(rt.get('plain_text') or rt.get('text', {}).get('content', '')
+                       for rt in block['paragraph'].get('rich_text', []))
+        if text:
+            parts.append(text)
+    return parts
+
+
+def _prompt_from_page(page: dict, client: Optional["Client"] = None) -> Tuple[str, str, bool]:
+    """
+    Извлекает из страницы базы промтов (имя, полный текст, разделен ли),
+    собирая все части, если промт разделен. С client дочитывает хвост из блоков страницы.
+    """
+    properties = page['properties']
+    
+    # Получаем имя промта
+    prompt_name = ""
+    if 'Имя промта' in properties and properties['Имя промта']['title']:
+        prompt_name = properties['Имя промта']['title'][0]['text']['content']
+    
+    # Получаем основную часть промта
+    parts = [""]
+    if 'Промт' in properties and properties['Промт']['rich_text']:
+        parts[0] = properties['Промт']['rich_text'][0]['text']['content']
+    
+    # Проверяем, разделен ли промт
+    is_split = False
+    if 'Разделен' in properties:
+        is_split = properties['Разделен']['checkbox']
+    
+    # Если промт разделен, собираем все части
+    if is_split:
+        if 'Промт 2' in properties and properties['Промт 2']['rich_text']:
+            parts.append(properties['Промт 2']['rich_text'][0]['text']['content'])
+        
+        if 'Промт 3' in properties and properties['Промт 3']['rich_text']:
+            parts.append(properties['Промт 3']['rich_text'][0]['text']['content'])
+            # Хвост в блоках возможен только когда заняты все три колонки
+            if client is not None:
+                parts.extend(_read_overflow_blocks(client, page['id']))
+    
+    return prompt_name, "\n".join(parts).strip(), is_split
+
+
+def get_prompt_from_notion(client: "Client", db_id: str, prompt_name: str, log) -> Optional[str]:
     """
     Получает промт из базы данных Notion, собирая все части если промт разделен.
     
@@ -335,38 +553,19 @@ def get_prompt_from_notion(client: Client, db_id: str, prompt_name: str, log) ->
             log("WARNING", "prompt_notion", f"Промт {prompt_name} не найден в Notion")
             return None
         
-        page = query_result['results'][0]
-        properties = page['properties']
-        
-        # Получаем основную часть промта
-        prompt_text = ""
-        if 'Промт' in properties and properties['Промт']['rich_text']:
-            prompt_text = properties['Промт']['rich_text'][0]['text']['content']
-        
-        # Проверяем, разделен ли промт
-        is_split = False
-        if 'Разделен' in properties:
-            is_split = properties['Разделен']['checkbox']
-        
-        # Если промт разделен, собираем все части
-        if is_split:
-            if 'Промт 2' in properties and properties['Промт 2']['rich_text']:
-                prompt_text += "\n" + properties['Промт 2']['rich_text'][0]['text']['content']
-            
-            if 'Промт 3' in properties and properties['Промт 3']['rich_text']:
-                prompt_text += "\n" + properties['Промт 3']['rich_text'][0]['text']['content']
+        _, prompt_text, is_split = _prompt_from_page(query_result['results'][0], client)
         
         log("INFO", "prompt_notion", f"Получен промт {prompt_name}", 
             length=len(prompt_text), is_split=is_split)
         
-        return prompt_text.strip()
+        return prompt_text
         
     except Exception as e:
         log("ERROR", "prompt_notion", f"Ошибка получения промта {prompt_name}", error=str(e))
         return None
 
 
-def get_all_prompts_from_notion(client: Client, db_id: str, log) -> Dict[str, str]:
+def get_all_prompts_from_notion(client: "Client", db_id: str, log) -> Dict[str, str]:
     """
     Получает все промты из базы данных Notion.
     
@@ -382,26 +581,14 @@ def get_all_prompts_from_notion(client: Client, db_id: str, log) -> Dict[str, st
         return {}
     
     try:
-        # Получаем все страницы из базы данных
-        query_result = client.databases.query(database_id=db_id)
-        
         prompts = {}
         
-        for page in query_result['results']:
-            properties = page['properties']
-            
-            # Получаем имя промта
-            prompt_name = ""
-            if 'Имя промта' in properties and properties['Имя промта']['title']:
-                prompt_name = properties['Имя промта']['title'][0]['text']['content']
-            
-            if not prompt_name:
-                continue
-            
-            # Получаем текст промта (со всеми частями)
-            prompt_text = get_prompt_from_notion(client, db_id, prompt_name, log)
+        # Все страницы базы (постранично); текст берем прямо из свойств страниц,
+        # без отдельного запроса на каждый промт
+        for page in _iterate_paginated(client.databases.query, database_id=db_id):
+            prompt_name, prompt_text, _ = _prompt_from_page(page, client)
             
-            if prompt_text:
+            if prompt_name and prompt_text:
                 prompts[prompt_name] = prompt_text
         
         log("INFO", "prompt_notion", f"Получено {len(prompts)} промтов из Notion")
@@ -5,14 +5,6 @@ import os
 from datetime import datetime
 from pathlib import Path
 
-try:
-    from openpyxl import Workbook, load_workbook
-    from openpyxl.utils import get_column_letter
-except ImportError:
-    Workbook = None
-    load_workbook = None
-    get_column_letter = None
-
 
 # Константы заголовков колонок (строго не менять порядок и названия)
 REQUIRED_COLUMNS = [
@@ -27,6 +19,12 @@ REQUIRED_COLUMNS = [
     "Дата добавления"
 ]
 
+# Поля, длина которых обрезается до excel.max_cell_chars
+_TRIMMED_FIELDS = frozenset(("Субтитры", "Чистый текст"))
+
+# Буфер записи xlsx при сохранении
+_SAVE_BUFFER_SIZE = 1 << 17
+
 
 class ExcelHandle:
     """Объект для работы с Excel файлом"""
@@ -36,6 +34,90 @@ class ExcelHandle:
         self.file_path = file_path
         self.column_mapping = column_mapping  # {column_name: column_index}
         self.config = config
+        # Есть несохраненные изменения; книга пишется на диск в flush()/close(),
+        # а не после каждой записи
+        self._dirty = False
+        self._unsaved_writes = 0
+        # Индекс колонки 'Номер', строится один раз в init_excel:
+        # последний выданный номер и {номер: строка}
+        self.last_run_id = 0
+        self.run_id_to_row = {}
+        # Лист AI_TESTS: находится/создается при первой записи теста
+        self.test_sheet = None
+
+
+def _index_run_ids(handle) -> None:
+    """Один проход по колонке 'Номер': максимальный номер и строка каждого номера"""
+    number_col = handle.column_mapping.get("Номер")
+    if number_col is None:
+        return
+    
+    max_number = 0
+    run_id_to_row = {}
+    # Начинаем со 2й строки, т.к. 1я - заголовки
+    for row, (cell_value,) in enumerate(
+            handle.worksheet.iter_rows(min_row=2, min_col=number_col, max_col=number_col,
+                                       values_only=True), start=2):
+        if cell_value is None:
+            continue
+        try:
+            number = int(cell_value)
+        except (ValueError, TypeError):
+            continue
+        max_number = max(max_number, number)
+        # Как и раньше при поиске сверху вниз, номеру соответствует первая строка
+        run_id_to_row.setdefault(number, row)
+    
+    handle.last_run_id = max_number
+    handle.run_id_to_row = run_id_to_row
+
+
+def _mark_dirty(handle, log) -> None:
+    """
+    Отмечает изменения в книге. Если задан excel.save_every=N,
+    сохраняет книгу после каждых N изменений (страховка от падения процесса).
+    """
+    handle._dirty = True
+    handle._unsaved_writes += 1
+    save_every = handle.config.get('save_every', 0)
+    if save_every and handle._unsaved_writes >= save_every:
+        flush(handle, log)
+
+
+def _atomic_save(workbook, file_path: str) -> None:
+    """
+    Сохраняет книгу во временный файл рядом и подменяет им основной через os.replace:
+    при падении посреди записи старый xlsx остается целым.
+    """
+    tmp_path = file_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb', buffering=_SAVE_BUFFER_SIZE) as f:
+            workbook.save(f)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def flush(handle, log) -> None:
+    """
+    Сохраняет книгу, если есть несохраненные изменения.
+    Ошибка блокировки файла — ValueError("excel_file_locked").
+    """
+    if not handle or not handle.workbook or not handle._dirty:
+        return
+    try:
+        _atomic_save(handle.workbook, handle.file_path)
+    except PermissionError as e:
+        log("ERROR", "store_excel", "Excel файл заблокирован при сохранении",
+            action="flush", reason=str(e), file=handle.file_path)
+        raise ValueError("excel_file_locked")
+    handle._dirty = False
+    handle._unsaved_writes = 0
+    log("DEBUG", "store_excel", "Excel сохранен", file=handle.file_path)
 
 
 def init_excel(config, log):
@@ -48,7 +130,10 @@ def init_excel(config, log):
     Залогировать: excel_init file=... sheet=... created={true|false} added_cols=[...]
     """
     
-    if load_workbook is None or Workbook is None:
+    # openpyxl тяжелый (десятки мс на импорт) — грузим только когда Excel действительно нужен
+    try:
+        from openpyxl import Workbook, load_workbook
+    except ImportError:
         log("ERROR", "store_excel", "openpyxl не установлен. Запустите: pip install openpyxl")
         raise ValueError("openpyxl_not_installed")
     
@@ -95,15 +180,14 @@ def init_excel(config, log):
             sheet_created = True
             log("DEBUG", "store_excel", "Создан новый лист", sheet=sheet_name)
         
-        # Анализируем существующие заголовки
+        # Анализируем существующие заголовки (одна строка значений, без обращения к ячейкам по одной)
         existing_headers = []
-        if worksheet.max_row >= 1:
-            for col in range(1, worksheet.max_column + 1):
-                cell_value = worksheet.cell(row=1, column=col).value
-                if cell_value:
-                    existing_headers.append(str(cell_value))
-                else:
-                    break
+        header_row = next(worksheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        for cell_value in header_row:
+            if cell_value:
+                existing_headers.append(str(cell_value))
+            else:
+                break
         
         # Создаем mapping существующих колонок
         column_mapping = {}
@@ -119,15 +203,18 @@ def init_excel(config, log):
                 added_cols.append(required_col)
                 next_col += 1
         
-        # Сохраняем файл если были изменения
-        if file_created or sheet_created or added_cols:
-            workbook.save(file_path)
-        
         log("INFO", "store_excel", "Excel инициализирован", 
             file=file_path, sheet=sheet_name, created=file_created or sheet_created, 
             added_cols=added_cols)
         
-        return ExcelHandle(workbook, worksheet, file_path, column_mapping, excel_config)
+        handle = ExcelHandle(workbook, worksheet, file_path, column_mapping, excel_config)
+        _index_run_ids(handle)
+        
+        # Изменения структуры сохранятся вместе с первыми данными
+        if file_created or sheet_created or added_cols:
+            _mark_dirty(handle, log)
+        
+        return handle
         
     except PermissionError as e:
         log("ERROR", "store_excel", "Excel файл заблокирован", 
@@ -156,20 +243,9 @@ def allocate_run_id(handle, log) -> int:
             raise ValueError("column_not_found")
         
         number_col = column_mapping["Номер"]
-        max_number = 0
         
-        # Ищем максимальный номер (начинаем с 2й строки, т.к. 1я - заголовки)
-        for row in range(2, worksheet.max_row + 1):
-            cell_value = worksheet.cell(row=row, column=number_col).value
-            if cell_value is not None:
-                try:
-                    number = int(cell_value)
-                    max_number = max(max_number, number)
-                except (ValueError, TypeError):
-                    continue
-        
-        # Новый ID
-        run_id = max_number + 1
+        # Новый ID: максимальный номер известен из индекса init_excel
+        run_id = handle.last_run_id + 1
         
         # Находим первую свободную строку
         new_row = worksheet.max_row + 1
@@ -178,6 +254,8 @@ def allocate_run_id(handle, log) -> int:
         
         # Записываем номер
         worksheet.cell(row=new_row, column=number_col, value=run_id)
+        handle.last_run_id = run_id
+        handle.run_id_to_row[run_id] = new_row
         
         # Записываем дату добавления (без миллисекунд)
         if "Дата добавления" in column_mapping:
@@ -185,8 +263,7 @@ def allocate_run_id(handle, log) -> int:
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             worksheet.cell(row=new_row, column=date_col, value=current_time)
         
-        # Сохраняем файл
-        handle.workbook.save(handle.file_path)
+        _mark_dirty(handle, log)
         
         log("INFO", "store_excel", "Выделен ID для записи", 
             excel_allocate_run_id=True, id=run_id)
@@ -204,7 +281,7 @@ def write_step(handle, run_id: int, updates: dict, log) -> None:
     Обновить только переданные поля в строке с данным 'Номер'.
     Поддерживаемые ключи: 'Ссылка', 'Субтитры', 'Чистый текст', 'Дата добавления'.
     Перед записью в 'Субтитры' и 'Чистый текст' применить тримминг: len>max_cell_chars → text[:max_cell_chars].
-    Сохранить файл.
+    Файл сохраняется в flush()/close().
     Лог: excel_write_step id=<N> fields=[...] (если 'Субтитры'/'Чистый текст' триммированы — truncated=true orig_len=... saved_len=32767)
     """
     
@@ -217,19 +294,12 @@ def write_step(handle, run_id: int, updates: dict, log) -> None:
             log("ERROR", "store_excel", "Колонка 'Номер' не найдена")
             raise ValueError("column_not_found")
         
-        number_col = column_mapping["Номер"]
-        target_row = None
-        
-        # Находим строку с нужным номером
-        for row in range(2, worksheet.max_row + 1):
-            cell_value = worksheet.cell(row=row, column=number_col).value
-            if cell_value is not None:
-                try:
-                    if int(cell_value) == run_id:
-                        target_row = row
-                        break
-                except (ValueError, TypeError):
-                    continue
+        # Находим строку с нужным номером по индексу; при промахе индекс
+        # перестраивается один раз (лист мог измениться в обход handle)
+        target_row = handle.run_id_to_row.get(run_id)
+        if target_row is None:
+            _index_run_ids(handle)
+            target_row = handle.run_id_to_row.get(run_id)
         
         if target_row is None:
             log("ERROR", "store_excel", "Строка с указанным ID не найдена", 
@@ -250,19 +320,18 @@ def write_step(handle, run_id: int, updates: dict, log) -> None:
             col_index = column_mapping[field_name]
             value_to_write = field_value
             
-            # Применяем тримминг для текстовых полей
-            if field_name in ["Субтитры", "Чистый текст"] and isinstance(field_value, str):
+            # Применяем тримминг для текстовых полей (только если текст длиннее лимита)
+            if (field_name in _TRIMMED_FIELDS and isinstance(field_value, str)
+                    and len(field_value) > max_cell_chars):
+                value_to_write = field_value[:max_cell_chars]
+                truncated = True
                 orig_len = len(field_value)
-                if orig_len > max_cell_chars:
-                    value_to_write = field_value[:max_cell_chars]
-                    truncated = True
-                    saved_len = len(value_to_write)
+                saved_len = max_cell_chars
             
             worksheet.cell(row=target_row, column=col_index, value=value_to_write)
             updated_fields.append(field_name)
         
-        # Сохраняем файл
-        handle.workbook.save(handle.file_path)
+        _mark_dirty(handle, log)
         
         # Логируем результат
         log_params = {
@@ -293,15 +362,18 @@ def write_step(handle, run_id: int, updates: dict, log) -> None:
 def close(handle):
     """
     Закрыть ресурсы, если требуется выбранной библиотекой.
+    Несохраненные изменения записываются на диск; ошибки при этом игнорируются —
+    чтобы узнать о них, вызовите flush() перед close().
     """
     try:
-        # openpyxl не требует явного закрытия, но сохраним файл на всякий случай
-        if handle and handle.workbook:
-            handle.workbook.save(handle.file_path)
+        # openpyxl не требует явного закрытия, но сохраним несохраненные изменения
+        if handle and handle.workbook and handle._dirty:
+            _atomic_save(handle.workbook, handle.file_path)
         # Обнуляем ссылки
         if handle:
             handle.workbook = None
             handle.worksheet = None
+            handle.test_sheet = None
     except Exception:
         # Игнорируем ошибки при закрытии
         pass
@@ -339,7 +411,7 @@ def init_test_sheet(handle, log):
             for col, header in enumerate(headers, 1):
                 test_sheet.cell(row=1, column=col, value=header)
                 
-            workbook.save(handle.file_path)
+            _mark_dirty(handle, log)
             log("INFO", "store_excel", "Создан тестовый лист AI_TESTS")
         else:
             test_sheet = workbook[sheet_name]
@@ -352,9 +424,11 @@ def init_test_sheet(handle, log):
         return None
 
 
-def write_test_record(handle, test_data: dict, log):
+def write_test_record(handle, test_data: dict, log, now: str = None):
     """
     Записывает данные теста в лист AI_TESTS.
+    now — готовая метка времени 'YYYY-MM-DD HH:MM:SS' (общая для пачки записей);
+    если не задана, берется текущее время.
     test_data = {
         'run_id': int,
         'success': bool,
@@ -367,13 +441,12 @@ def write_test_record(handle, test_data: dict, log):
     }
     """
     try:
-        test_sheet = init_test_sheet(handle, log)
+        if handle.test_sheet is None:
+            handle.test_sheet = init_test_sheet(handle, log)
+        test_sheet = handle.test_sheet
         if test_sheet is None:
             return
             
-        # Находим следующую свободную строку
-        next_row = test_sheet.max_row + 1
-        
         # Вычисляем процент сжатия
         chars_original = test_data.get('chars_original', 0)
         chars_cleaned = test_data.get('chars_cleaned', 0)
@@ -383,19 +456,20 @@ def write_test_record(handle, test_data: dict, log):
         else:
             compression_percent = 0.0
         
-        # Записываем данные
-        test_sheet.cell(row=next_row, column=1, value=test_data.get('run_id', 0))
-        test_sheet.cell(row=next_row, column=2, value="ДА" if test_data.get('success', False) else "НЕТ")
-        test_sheet.cell(row=next_row, column=3, value=test_data.get('model', 'unknown'))
-        test_sheet.cell(row=next_row, column=4, value=test_data.get('supadata_time_ms', 0))
-        test_sheet.cell(row=next_row, column=5, value=test_data.get('ai_time_ms', 0))
-        test_sheet.cell(row=next_row, column=6, value=chars_original)  # новая колонка
-        test_sheet.cell(row=next_row, column=7, value=chars_cleaned)   # новая колонка
-        test_sheet.cell(row=next_row, column=8, value=compression_percent)  # новая колонка
-        test_sheet.cell(row=next_row, column=9, value=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        
-        # Сохраняем файл
-        handle.workbook.save(handle.file_path)
+        # Записываем данные одной строкой в конец листа
+        test_sheet.append([
+            test_data.get('run_id', 0),
+            "ДА" if test_data.get('success', False) else "НЕТ",
+            test_data.get('model', 'unknown'),
+            test_data.get('supadata_time_ms', 0),
+            test_data.get('ai_time_ms', 0),
+            chars_original,
+            chars_cleaned,
+            compression_percent,
+            now or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ])
+        
+        _mark_dirty(handle, log)
         
         log("INFO", "store_excel", "Записан тест в AI_TESTS", 
             run_id=test_data.get('run_id'), 
@@ -0,0 +1,95 @@
+"""
+Общий HTTP-клиент для Telegram Bot API.
+Keep-alive соединение с api.telegram.org переиспользуется между long polling
+и отправкой сообщений, TLS-рукопожатие не повторяется на каждый запрос.
+Если установлены httpx и h2 — HTTP/2: параллельные sendMessage из пула отправки
+идут потоками одного соединения. Иначе — requests.Session (HTTP/1.1).
+"""
+import functools
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+if HTTP2_AVAILABLE:
+    # Ошибки соединения повторяет транспорт; 429/5xx обрабатывают вызывающие (backoff цикла)
+    _CLIENT = httpx.Client(
+        http2=True,
+        transport=httpx.HTTPTransport(
+            http2=True, retries=3,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=120),
+        ),
+    )
+    SESSION = None
+else:
+    # POST (sendMessage) urllib3 по умолчанию не повторяет — дубликатов сообщений не будет;
+    # для 429 учитывается Retry-After
+    _RETRY = Retry(total=5, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                   respect_retry_after_header=True, raise_on_status=False)
+
+    _CLIENT = SESSION = requests.Session()
+    SESSION.headers['Connection'] = 'keep-alive'
+    # Хост один, но соединений в пуле с запасом: long polling + пул фоновой отправки,
+    # чтобы всплеск sendMessage не выбрасывал соединения из пула
+    SESSION.mount(TELEGRAM_API_URL, HTTPAdapter(pool_connections=2, pool_maxsize=32, pool_block=False,
+                                                max_retries=_RETRY))
+
+
+@functools.lru_cache(maxsize=16)
+def api_url(bot_token: str, method: str) -> str:
+    """URL метода Bot API; строится один раз на пару (токен, метод)"""
+    return f"{TELEGRAM_API_URL}/bot{bot_token}/{method}"
+
+
+# Установка соединения с api.telegram.org не должна ждать весь таймаут чтения
+# (у long polling он под минуту): недоступный хост обнаруживается за секунды
+CONNECT_TIMEOUT_SEC = 5
+
+
+def _timeout(read_timeout: float):
+    """Таймаут с отдельным лимитом на соединение в формате текущего клиента"""
+    if HTTP2_AVAILABLE:
+        return httpx.Timeout(read_timeout, connect=CONNECT_TIMEOUT_SEC)
+    return (CONNECT_TIMEOUT_SEC, read_timeout)
+
+
+def get(url: str, params: dict, timeout: float):
+    """GET к Bot API через общий клиент"""
+    return _CLIENT.get(url, params=params, timeout=_timeout(timeout))
+
+
+def post_json(url: str, payload: dict, timeout: float):
+    """POST с JSON-телом; сериализация через orjson, если он установлен"""
+    timeout = _timeout(timeout)
+    if orjson is None:
+        return _CLIENT.post(url, json=payload, timeout=timeout)
+    headers = {'Content-Type': 'application/json'}
+    if HTTP2_AVAILABLE:
+        return _CLIENT.post(url, content=orjson.dumps(payload), headers=headers, timeout=timeout)
+    return _CLIENT.post(url, data=orjson.dumps(payload), headers=headers, timeout=timeout)
+
+
+def response_json(response):
+    """Разбирает JSON ответа; через orjson прямо из байтов, без промежуточного decode"""
+    if orjson is None:
+        return response.json()
+    return orjson.loads(response.content)
+
+
+def close() -> None:
+    """Закрывает соединения клиента (при остановке бота)"""
+    _CLIENT.close()
@@ -1,16 +1,20 @@
-import requests
 import json
 import time
 from typing import Optional, Dict, Any
 
+import telegram_http
+from telegram_http import api_url, response_json
 
-def get_telegram_updates(config: Dict[str, Any], offset: int = 0) -> Dict[str, Any]:
+
+def get_telegram_updates(config: Dict[str, Any], offset: int = 0,
+                         long_poll_timeout: int = 30) -> Dict[str, Any]:
     """
     Получает обновления от Telegram Bot API
 
     Args:
         config: конфигурация с telegram.bot_token
         offset: offset для получения новых сообщений
+        long_poll_timeout: сколько секунд Telegram держит запрос, ожидая сообщений (0 — сразу вернуть)
 
     Returns:
         Dict с обновлениями или пустой dict при ошибке
@@ -19,16 +23,16 @@ def get_telegram_updates(config: Dict[str, Any], offset: int = 0) -> Dict[str, A
     if not bot_token:
         return {"ok": False, "error": "No bot token configured"}
 
-    url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
+    url = api_url(bot_token, "getUpdates")
     params = {
         "offset": offset,
-        "timeout": 30,
+        "timeout": long_poll_timeout,
         "allowed_updates": ["message"]
     }
 
     try:
-        response = requests.get(url, params=params, timeout=35)
-        return response.json()
+        response = telegram_http.get(url, params, timeout=long_poll_timeout + 5)
+        return response_json(response)
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -109,7 +113,10 @@ def wait_for_message(config: Dict[str, Any], log_func=None, timeout: int = 60) -
     last_update_id = 0
 
     while time.time() - start_time < timeout:
-        updates = get_telegram_updates(config, offset=last_update_id + 1)
+        # Telegram сам держит запрос до прихода сообщения, но не дольше оставшегося времени
+        remaining = int(timeout - (time.time() - start_time))
+        updates = get_telegram_updates(config, offset=last_update_id + 1,
+                                       long_poll_timeout=max(0, min(remaining, 30)))
 
         if not updates.get("ok"):
             time.sleep(1)
@@ -139,8 +146,6 @@ def wait_for_message(config: Dict[str, Any], log_func=None, timeout: int = 60) -
 
                 return message_data
 
-        time.sleep(1)
-
     if log_func:
         log_func("WARNING", "telegram_input", "Таймаут ожидания сообщения")
 
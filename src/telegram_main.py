@@ -1,130 +1,144 @@
 import time
 import sys
+import functools
+import threading
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 # Добавляем путь для импорта модулей
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import telegram_input
 import telegram_output
+import telegram_http
 import url_queue
 import yt_processor
 import log_mod
 
+# Сколько секунд Telegram держит getUpdates без новых сообщений
+LONG_POLL_TIMEOUT_SEC = 50
+# Сколько обработчик очереди спит без сигнала о новой ссылке
+QUEUE_IDLE_WAIT_SEC = 5.0
+# Пауза после ошибок подряд: 0.5, 1, 2, ... но не больше потолка
+_ERROR_BACKOFF_BASE_SEC = 0.5
+_ERROR_BACKOFF_MAX_SEC = 8.0
+
+
+def _error_backoff(error_streak: int) -> float:
+    """Задержка перед повтором после error_streak ошибок подряд"""
+    return min(_ERROR_BACKOFF_BASE_SEC * (2 ** (error_streak - 1)), _ERROR_BACKOFF_MAX_SEC)
+
+@functools.lru_cache(maxsize=1)
 def load_config():
-    """Загружаем конфигурацию"""
+    """Загружаем конфигурацию (разбирается один раз за процесс, дальше — тот же dict)"""
     import yaml
     from pathlib import Path
     
+    # libyaml-парсер, если PyYAML собран с ним
+    SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    
     config_path = Path(__file__).parent.parent / "config_prod" / "app.yaml"
     with open(config_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=SafeLoader)
 
-def send_telegram_summaries(config: Dict[str, Any], chat_id: int, summaries: Dict[str, str], 
-                           run_id: int, log_func=None) -> bool:
+# Лимит Telegram — 4096 символов на сообщение; оставляем запас под заголовок
+_MESSAGE_MAX_LEN = 4000
+_HEADER_RESERVE = 32
+
+# (ключ в summaries, заголовок) в порядке отправки
+_SUMMARY_SECTIONS = (
+    ('short', 'Краткое саммари'),
+    ('middle', 'Среднее саммари'),
+    ('full', 'Полное саммари'),
+    ('resources', 'Ресурсы'),
+)
+
+def _chunked_messages(title: str, body: str) -> List[str]:
+    """Разбивает секцию на сообщения с заголовком; у частей заголовок с номером"""
+    max_body = _MESSAGE_MAX_LEN - len(title) - _HEADER_RESERVE
+    # Обычный случай — секция помещается в одно сообщение, разбивать нечего
+    if len(body) <= max_body:
+        return ["<b>%s:</b>\n\n%s" % (title, body)]
+    parts = telegram_output.split_long_message(body, max_body)
+    if len(parts) == 1:
+        return ["<b>%s:</b>\n\n%s" % (title, parts[0])]
+    total = len(parts)
+    return ["<b>%s (часть %d/%d):</b>\n\n%s" % (title, i, total, part)
+            for i, part in enumerate(parts, start=1)]
+
+def build_summary_messages(summaries: Dict[str, str]) -> List[str]:
     """
-    Отправляет 4 саммари в Telegram с задержкой
-    
-    Args:
-        config: конфигурация приложения
-        chat_id: ID чата для отправки
-        summaries: словарь с саммари (short, middle, full, resources)
-        run_id: номер записи
-        log_func: функция логирования
-        
-    Returns:
-        True если все сообщения отправлены успешно
+    Собирает сообщения с саммари в порядке отправки: короткое, среднее, полное,
+    ресурсы (длинные разбиты на части) и сообщение о завершении.
     """
-    success = True
-    
-    # Отправляем короткое саммари
-    short_summary = summaries.get('short', '')
-    if short_summary:
-        short_msg = f"<b>Краткое саммари:</b>\n\n{short_summary}"
-        if not telegram_output.send_telegram_message(config, chat_id, short_msg, log_func):
-            success = False
-    
-    # Отправляем среднее саммари
-    middle_summary = summaries.get('middle', '')
-    if middle_summary:
-        # Разбиваем на части если нужно
-        middle_parts = telegram_output.split_long_message(middle_summary, max_length=4000)
-        for i, part in enumerate(middle_parts):
-            if len(middle_parts) > 1:
-                middle_msg = f"<b>Среднее саммари (часть {i+1}/{len(middle_parts)}):</b>\n\n{part}"
-            else:
-                middle_msg = f"<b>Среднее саммари:</b>\n\n{part}"
-            if not telegram_output.send_telegram_message(config, chat_id, middle_msg, log_func):
-                success = False
-    
-    # Отправляем полное саммари
-    full_summary = summaries.get('full', '')
-    if full_summary:
-        # Разбиваем на части если нужно
-        full_parts = telegram_output.split_long_message(full_summary, max_length=4000)
-        for i, part in enumerate(full_parts):
-            if len(full_parts) > 1:
-                full_msg = f"<b>Полное саммари (часть {i+1}/{len(full_parts)}):</b>\n\n{part}"
-            else:
-                full_msg = f"<b>Полное саммари:</b>\n\n{part}"
-            if not telegram_output.send_telegram_message(config, chat_id, full_msg, log_func):
-                success = False
-    
-    # Отправляем ресурсы
-    resources = summaries.get('resources', '')
-    if resources:
-        resources_msg = f"<b>Ресурсы:</b>\n\n{resources}"
-        if not telegram_output.send_telegram_message(config, chat_id, resources_msg, log_func):
-            success = False
-    
-    # Отправляем сообщение о завершении
-    final_msg = f"✅ Все саммари отправлены!"
-    telegram_output.send_telegram_message(config, chat_id, final_msg, log_func)
+    messages = []
+    for key, title in _SUMMARY_SECTIONS:
+        body = summaries.get(key, '')
+        if body:
+            messages.extend(_chunked_messages(title, body))
     
+    # Сообщение о завершении
+    messages.append("✅ Все саммари отправлены!")
+    return messages
+
+def _log_summaries_result(success: bool, log_func=None) -> None:
     if log_func:
         if success:
             log_func("INFO", "telegram_main", "Все саммари отправлены успешно")
         else:
             log_func("ERROR", "telegram_main", "Ошибка отправки некоторых саммари")
-    
-    return success
 
-def process_single_url(config: Dict[str, Any], log_func=None) -> bool:
+def send_telegram_summaries(config: Dict[str, Any], chat_id: int, summaries: Dict[str, str], 
+                           run_id: int, log_func=None) -> bool:
     """
-    Обрабатывает одну ссылку из очереди
+    Отправляет 4 саммари в Telegram по порядку
     
     Args:
         config: конфигурация приложения
+        chat_id: ID чата для отправки
+        summaries: словарь с саммари (short, middle, full, resources)
+        run_id: номер записи
         log_func: функция логирования
         
     Returns:
-        True если есть что обрабатывать и обработка запущена
+        True если все сообщения отправлены успешно
     """
-    # Получаем следующую задачу из очереди
-    task = url_queue.url_queue.get_next_url()
+    success = telegram_output.send_telegram_messages_ordered(
+        config, chat_id, build_summary_messages(summaries), log_func)
+    _log_summaries_result(success, log_func)
+    return success
+
+def _url_concurrency(config: Dict[str, Any]) -> int:
+    """Сколько ссылок очереди обрабатывать одновременно (telegram.concurrency)"""
+    return max(1, int(config.get('telegram', {}).get('concurrency', yt_processor.DEFAULT_URL_CONCURRENCY)))
+
+def _fail_task(task: url_queue.UrlTask, error: Exception, config: Dict[str, Any], log_func=None) -> None:
+    """Завершает задачу с исключением: снимает с обработки и сообщает пользователю"""
+    # Отмечаем задачу как завершенную даже при ошибке
+    url_queue.url_queue.mark_completed(task.task_id)
     
-    if not task:
-        return False  # Очередь пуста
+    # Отправляем сообщение об ошибке
+    error_msg = f"❌ Ошибка обработки: {str(error)}"
+    telegram_output.send_telegram_message(config, task.source, error_msg, log_func)
     
     if log_func:
-        log_func("INFO", "telegram_main", "Начинаем обработку задачи", 
-                task_id=task.task_id, url=task.url, source=task.source)
-    
+        log_func("ERROR", "telegram_main", "Исключение при обработке задачи", 
+                task_id=task.task_id, error=str(error))
+
+def _finish_task(task: url_queue.UrlTask, result: Dict[str, Any], config: Dict[str, Any], log_func=None) -> None:
+    """Отправляет результат обработки задачи и снимает ее с обработки"""
     try:
-        # Обрабатываем URL через универсальный процессор
-        result = yt_processor.process_youtube_url(task.url, config, log_func)
-        
         # Отправляем результаты обработки
         if result['success']:
-            # Отправляем подтверждение завершения
-            final_msg = f"✅ Обработка завершена! Данные сохранены в Notion"
-            telegram_output.send_telegram_message(config, task.source, final_msg, log_func)
-            
-            # Отправляем саммари в Telegram
+            # Подтверждение завершения и саммари уходят одной упорядоченной пачкой
+            # в фоне — цикл сразу переходит к следующей задаче очереди
+            messages = ["✅ Обработка завершена! Данные сохранены в Notion"]
             summaries = result.get('summaries', {})
             if summaries:
-                send_telegram_summaries(config, task.source, summaries, 0, log_func)
+                messages.extend(build_summary_messages(summaries))
+            future = telegram_output.submit_telegram_messages(config, task.source, messages, log_func)
+            if summaries:
+                future.add_done_callback(lambda f: _log_summaries_result(f.result(), log_func))
         else:
             # Отправляем сообщение об ошибке
             error_msg = f"❌ Ошибка обработки: {result.get('error', 'Неизвестная ошибка')}"
@@ -140,22 +154,79 @@ def process_single_url(config: Dict[str, Any], log_func=None) -> bool:
             else:
                 log_func("ERROR", "telegram_main", "Ошибка обработки задачи", 
                         task_id=task.task_id, error=result.get('error'))
-        
-        return True
-        
     except Exception as e:
-        # Отмечаем задачу как завершенную даже при ошибке
-        url_queue.url_queue.mark_completed(task.task_id)
-        
-        # Отправляем сообщение об ошибке
-        error_msg = f"❌ Ошибка обработки: {str(e)}"
-        telegram_output.send_telegram_message(config, task.source, error_msg, log_func)
+        _fail_task(task, e, config, log_func)
+
+def process_url_batch(config: Dict[str, Any], log_func=None, concurrency: Optional[int] = None) -> bool:
+    """
+    Обрабатывает пачку ссылок из головы очереди параллельно; результат каждой
+    отправляется сразу по готовности, не дожидаясь остальных
+    
+    Args:
+        config: конфигурация приложения
+        log_func: функция логирования
+        concurrency: размер пачки (по умолчанию telegram.concurrency)
         
-        if log_func:
-            log_func("ERROR", "telegram_main", "Исключение при обработке задачи", 
-                    task_id=task.task_id, error=str(e))
+    Returns:
+        True если есть что обрабатывать и обработка запущена
+    """
+    tasks = url_queue.url_queue.get_next_urls(concurrency or _url_concurrency(config))
+    
+    if not tasks:
+        return False  # Очередь пуста
+    
+    if log_func:
+        for task in tasks:
+            log_func("INFO", "telegram_main", "Начинаем обработку задачи", 
+                    task_id=task.task_id, url=task.url, source=task.source)
+    
+    finished = set()
+    
+    def _on_result(index: int, result: Dict[str, Any]) -> None:
+        finished.add(index)
+        _finish_task(tasks[index], result, config, log_func)
+    
+    try:
+        # Обрабатываем URL через универсальный процессор
+        yt_processor.process_youtube_urls([task.url for task in tasks], config, log_func,
+                                          concurrency=len(tasks), on_result=_on_result)
+    except Exception as e:
+        for index, task in enumerate(tasks):
+            if index not in finished:
+                _fail_task(task, e, config, log_func)
+    
+    return True
+
+def process_single_url(config: Dict[str, Any], log_func=None) -> bool:
+    """
+    Обрабатывает одну ссылку из очереди
+    
+    Args:
+        config: конфигурация приложения
+        log_func: функция логирования
         
-        return True
+    Returns:
+        True если есть что обрабатывать и обработка запущена
+    """
+    return process_url_batch(config, log_func, concurrency=1)
+
+def _queue_worker(config: Dict[str, Any], log_func, wake: threading.Event,
+                  stop: threading.Event) -> None:
+    """
+    Фоновый обработчик очереди: берет задачи пачками, пока очередь не опустеет,
+    затем ждет сигнала о новой ссылке (или QUEUE_IDLE_WAIT_SEC на всякий случай)
+    """
+    while not stop.is_set():
+        # Сбрасываем сигнал до проверки очереди: ссылка, добавленная после проверки,
+        # снова его выставит и wait вернется сразу
+        wake.clear()
+        try:
+            if process_url_batch(config, log_func):
+                continue
+        except Exception as e:
+            if log_func:
+                log_func("ERROR", "telegram_main", "Ошибка обработчика очереди", error=str(e))
+        wake.wait(QUEUE_IDLE_WAIT_SEC)
 
 def telegram_worker_loop(config: Dict[str, Any], log_func=None):
     """
@@ -178,18 +249,32 @@ def telegram_worker_loop(config: Dict[str, Any], log_func=None):
     print()
     
     last_update_id = 0
+    error_streak = 0
+    
+    # Очередь обрабатывает отдельный поток: пока идет обработка видео,
+    # бот продолжает принимать ссылки и отвечать на сообщения
+    queue_wake = threading.Event()
+    stop_event = threading.Event()
+    worker = threading.Thread(target=_queue_worker, args=(config, log_func, queue_wake, stop_event),
+                              name="url-queue-worker", daemon=True)
+    worker.start()
     
     while True:
         try:
-            # Проверяем новые сообщения
-            updates = telegram_input.get_telegram_updates(config, offset=last_update_id + 1)
+            # Проверяем новые сообщения. Long polling: запрос висит на стороне Telegram
+            # и возвращается сразу с новым сообщением
+            updates = telegram_input.get_telegram_updates(
+                config, offset=last_update_id + 1, long_poll_timeout=LONG_POLL_TIMEOUT_SEC)
             
             if not updates.get("ok"):
-                time.sleep(1)
+                error_streak += 1
+                time.sleep(_error_backoff(error_streak))
                 continue
+            error_streak = 0
             
             # Обрабатываем каждое обновление
-            for update in updates.get("result", []):
+            # Пустую пачку (истек long polling) не разбираем
+            for update in updates.get("result") or ():
                 update_id = update.get("update_id", 0)
                 
                 # Убедимся, что мы не обрабатываем одно и то же обновление дважды
@@ -198,21 +283,24 @@ def telegram_worker_loop(config: Dict[str, Any], log_func=None):
                 
                 last_update_id = update_id
                 
-                message = update.get("message", {})
-                if not message.get("text"):
+                message = update.get("message")
+                if not message:
+                    continue
+                text = message.get("text")
+                if not text:
                     continue
                 
-                chat_id = message.get("chat", {}).get("id")
-                text = message.get("text").strip()
-                user = message.get("from", {})
-                username = user.get("username", "unknown")
+                text = text.strip()
+                chat_id = (message.get("chat") or {}).get("id")
+                username = (message.get("from") or {}).get("username", "unknown")
                 
                 if log_func:
                     log_func("INFO", "telegram_main", "Получено сообщение", 
                             chat_id=chat_id, text=text, username=username)
                 
                 # Валидируем YouTube URL
-                if not yt_processor.validate_youtube_url(text):
+                video_id = yt_processor.parse_youtube_url(text)
+                if video_id is None:
                     error_msg = "❌ Введите корректную YouTube ссылку\n\nПример: https://www.youtube.com/watch?v=..."
                     telegram_output.send_telegram_message(config, chat_id, error_msg, log_func)
                     continue
@@ -222,10 +310,10 @@ def telegram_worker_loop(config: Dict[str, Any], log_func=None):
                 
                 if queue_result['success']:
                     # URL добавлен в очередь успешно - отправляем одно сообщение с подтверждением
-                    video_id = yt_processor.extract_video_id(text)
                     confirm_msg = f"📥 Принята ссылка: {text}\n🆔 Видео: {video_id}\n📍 Позиция в очереди: {queue_result['position']}\n\n⏳ Обработка начнется в ближайшее время..."
                     
                     telegram_output.send_telegram_message(config, chat_id, confirm_msg, log_func)
+                    queue_wake.set()
                     
                     if log_func:
                         log_func("INFO", "telegram_main", "URL добавлен в очередь", 
@@ -235,24 +323,15 @@ def telegram_worker_loop(config: Dict[str, Any], log_func=None):
                     error_msg = f"🚫 {queue_result['message']}\n⏳ Попробуйте позже"
                     telegram_output.send_telegram_message(config, chat_id, error_msg, log_func)
             
-            # Обрабатываем задачи из очереди (только одну задачу за итерацию)
-            # Проверяем, есть ли задачи в очереди, и если есть, обрабатываем одну
-            queue_status = url_queue.url_queue.get_queue_status()
-            if queue_status['queue_size'] > 0:
-                if log_func:
-                    log_func("INFO", "telegram_main", "Обрабатываем задачу из очереди")
-                
-                # Обрабатываем задачу
-                process_single_url(config, log_func)
-            
-            # Небольшая пауза перед следующей итерацией
-            time.sleep(0.5)
-            
         except KeyboardInterrupt:
             if log_func:
                 log_func("INFO", "telegram_main", "Получен сигнал завершения")
+            stop_event.set()
+            queue_wake.set()
+            telegram_http.close()
             break
         except Exception as e:
             if log_func:
                 log_func("ERROR", "telegram_main", "Ошибка в основном цикле", error=str(e))
-            time.sleep(1)  # Пауза при ошибке
\ No newline at end of file
+            error_streak += 1
+            time.sleep(_error_backoff(error_streak))  # Пауза при ошибке
\ No newline at end of file
@@ -1,7 +1,56 @@
-import requests
 import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, Any, Optional, List
 
+from telegram_http import api_url, post_json, response_json
+
+
+class _TokenBucket:
+    """
+    Token bucket, общий для потоков: rate токенов в секунду, не больше capacity в запасе.
+    Пока токены есть, acquire не ждет; иначе резервирует токен и спит до его появления.
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Лимиты Bot API: ~30 сообщений в секунду на бота и ~1 в секунду в один чат
+# (без паузы в чат уходят только первые несколько сообщений)
+_GLOBAL_RATE = _TokenBucket(rate=30, capacity=30)
+_CHAT_RATE_PER_SEC = 1
+_CHAT_BURST = 3
+# 429 повторяем один раз после parameters.retry_after (но не дольше этого потолка)
+_RETRY_AFTER_MAX_SEC = 30
+_chat_buckets: Dict[int, _TokenBucket] = {}
+_chat_buckets_guard = threading.Lock()
+
+
+def _wait_send_slot(chat_id: int) -> None:
+    """Ждет, пока отправка в чат уложится в лимиты Telegram (обычно не ждет вовсе)"""
+    with _chat_buckets_guard:
+        bucket = _chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = _chat_buckets[chat_id] = _TokenBucket(_CHAT_RATE_PER_SEC, _CHAT_BURST)
+    bucket.acquire()
+    _GLOBAL_RATE.acquire()
+
 
 def send_telegram_message(config: Dict[str, Any], chat_id: int, text: str, log_func=None) -> bool:
     """
@@ -22,7 +71,7 @@ def send_telegram_message(config: Dict[str, Any], chat_id: int, text: str, log_f
             log_func("ERROR", "telegram_output", "Отсутствует bot_token в конфигурации")
         return False
     
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    url = api_url(bot_token, "sendMessage")
     
     payload = {
         "chat_id": chat_id,
@@ -35,8 +84,20 @@ def send_telegram_message(config: Dict[str, Any], chat_id: int, text: str, log_f
             log_func("INFO", "telegram_output", "Отправляем сообщение", 
                     chat_id=chat_id, text_preview=text[:50])
         
-        response = requests.post(url, json=payload, timeout=10)
-        result = response.json()
+        _wait_send_slot(chat_id)
+        response = post_json(url, payload, timeout=10)
+        result = response_json(response)
+        
+        if result.get("error_code") == 429:
+            # Лимит превышен — sendMessage (POST) транспорт не повторяет, иначе часть саммари потеряется
+            retry_after = result.get("parameters", {}).get("retry_after", 1)
+            if log_func:
+                log_func("WARN", "telegram_output", "Лимит Telegram, повторяем отправку",
+                        chat_id=chat_id, retry_after=retry_after)
+            time.sleep(min(retry_after, _RETRY_AFTER_MAX_SEC))
+            _wait_send_slot(chat_id)
+            response = post_json(url, payload, timeout=10)
+            result = response_json(response)
         
         if result.get("ok"):
             if log_func:
@@ -74,12 +135,53 @@ def send_telegram_messages(config: Dict[str, Any], chat_id: int, texts: List[str
             success = False
             if log_func:
                 log_func("ERROR", "telegram_output", f"Ошибка отправки сообщения {i+1}/{len(texts)}")
-        # Небольшая задержка между сообщениями
-        import time
-        time.sleep(0.1)
     return success
 
 
+# Фоновая отправка пачек сообщений: обработчик очереди не ждет, пока уйдут все саммари
+_SEND_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tg-send")
+
+# Пачки в один чат отправляются по очереди, чтобы сообщения не перемешивались
+_chat_locks: Dict[int, threading.Lock] = {}
+_chat_locks_guard = threading.Lock()
+
+
+def _chat_lock(chat_id: int) -> threading.Lock:
+    with _chat_locks_guard:
+        lock = _chat_locks.get(chat_id)
+        if lock is None:
+            lock = _chat_locks[chat_id] = threading.Lock()
+        return lock
+
+
+def send_telegram_messages_ordered(config: Dict[str, Any], chat_id: int, texts: List[str],
+                                   log_func=None) -> bool:
+    """
+    Отправляет сообщения в чат строго по порядку (следующее — после ответа на предыдущее)
+    через общую keep-alive сессию. Пачки в один чат не перемешиваются.
+    
+    Returns:
+        True если все сообщения отправлены успешно
+    """
+    success = True
+    with _chat_lock(chat_id):
+        for i, text in enumerate(texts):
+            if not send_telegram_message(config, chat_id, text, log_func):
+                success = False
+                if log_func:
+                    log_func("ERROR", "telegram_output", f"Ошибка отправки сообщения {i+1}/{len(texts)}")
+    return success
+
+
+def submit_telegram_messages(config: Dict[str, Any], chat_id: int, texts: List[str],
+                             log_func=None) -> Future:
+    """
+    Ставит упорядоченную отправку пачки сообщений в фоновый пул.
+    Future возвращает результат send_telegram_messages_ordered.
+    """
+    return _SEND_EXECUTOR.submit(send_telegram_messages_ordered, config, chat_id, texts, log_func)
+
+
 def split_long_message(text: str, max_length: int = 4000) -> List[str]:
     """
     Разбивает длинное сообщение на части
@@ -94,27 +196,35 @@ def split_long_message(text: str, max_length: int = 4000) -> List[str]:
     if len(text) <= max_length:
         return [text]
     
-    # Разбиваем на части
+    # Режем по границам строк для сохранения структуры: конец части ищем через rfind
+    # прямо в исходной строке, без списка всех строк и промежуточных склеек
     parts = []
-    current_part = ""
-    
-    # Разбиваем по строкам для сохранения структуры
-    lines = text.split('\n')
+    text_len = len(text)
+    start = 0
     
-    for line in lines:
-        # Если добавление строки превысит лимит, сохраняем текущую часть
-        if len(current_part) + len(line) + 1 > max_length and current_part:
-            parts.append(current_part.rstrip('\n'))  # Убираем лишний перевод строки в конце
-            current_part = line
-        else:
-            if current_part:
-                current_part += '\n' + line
-            else:
-                current_part = line
-    
-    # Добавляем последнюю часть
-    if current_part:
-        parts.append(current_part)
+    while True:
+        # Пустые строки в начале части пропускаем
+        while start < text_len and text[start] == '\n':
+            start += 1
+        if start >= text_len:
+            break
+        
+        # Остаток помещается целиком — это последняя часть
+        if text_len - start <= max_length:
+            parts.append(text[start:])
+            break
+        
+        # Последний перевод строки, при котором часть укладывается в лимит
+        end = text.rfind('\n', start, start + max_length + 1)
+        if end == -1:
+            # Первая строка сама длиннее лимита — берем ее целиком, ниже она разобьется по символам
+            end = text.find('\n', start)
+            if end == -1:
+                parts.append(text[start:])
+                break
+        
+        parts.append(text[start:end].rstrip('\n'))  # Убираем лишние переводы строки в конце
+        start = end + 1
     
     # Если части все еще слишком длинные, разбиваем по символам
     final_parts = []
@@ -122,9 +232,7 @@ def split_long_message(text: str, max_length: int = 4000) -> List[str]:
         if len(part) <= max_length:
             final_parts.append(part)
         else:
-            # Разбиваем по символам
-            for i in range(0, len(part), max_length):
-                final_parts.append(part[i:i+max_length])
+            final_parts.extend(part[i:i+max_length] for i in range(0, len(part), max_length))
     
     return final_parts
 
@@ -5,15 +5,246 @@ except ImportError:
     Supadata = None
     SupadataError = Exception
 
+try:
+    import ijson
+    _STREAM_JSON_ERRORS = (ijson.JSONError,)
+except ImportError:
+    ijson = None
+    _STREAM_JSON_ERRORS = ()
+
+try:
+    import httpx
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+import contextlib
 import time
+import random
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+
+# Общая HTTP-сессия для HTTP fallback: запрос транскрипта и опросы статуса идут
+# в один хост Supadata по keep-alive соединениям. Если установлены httpx и h2 —
+# HTTP/2: опросы из нескольких потоков мультиплексируются в одном соединении и не
+# ждут свободного слота пула. Иначе — requests.Session (HTTP/1.1).
+# Клиент создается при первом обращении — с установленным SDK он не нужен
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def _get_http_session():
+    """Возвращает общий httpx.Client или requests.Session (создается один раз)"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            if HTTP2_AVAILABLE:
+                # Ретраи — собственные (перебор ключей, опрос статуса), транспорт не повторяет
+                _http_session = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                )
+            else:
+                import requests
+                from requests.adapters import HTTPAdapter
+                
+                session = requests.Session()
+                # Ретраи — собственные (перебор ключей, опрос статуса), адаптер не повторяет
+                session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0))
+                _http_session = session
+        return _http_session
+
+
+def _http_get(url: str, headers: dict, timeout: float, params: dict = None, stream: bool = False):
+    """GET через общий клиент; при stream=True тело читается по мере разбора, ответ нужно закрыть"""
+    session = _get_http_session()
+    if not HTTP2_AVAILABLE:
+        return session.get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+    if not stream:
+        return session.get(url, params=params, headers=headers, timeout=timeout)
+    request = session.build_request("GET", url, params=params, headers=headers, timeout=timeout)
+    return session.send(request, stream=True)
+
+
+def _http_errors() -> Tuple[type, type]:
+    """Классы исключений таймаута и сетевой ошибки для текущего клиента"""
+    if HTTP2_AVAILABLE:
+        return httpx.TimeoutException, httpx.HTTPError
+    import requests
+    return requests.exceptions.Timeout, requests.exceptions.RequestException
+
+
+# Клиенты Supadata SDK по ключу: внутри у каждого своя requests.Session, и пул
+# keep-alive соединений работает только если клиент переиспользуется между вызовами
+_sdk_clients: Dict[str, "Supadata"] = {}
+_sdk_clients_lock = threading.Lock()
+
+
+def _get_sdk_client(api_key: str) -> "Supadata":
+    """Возвращает клиент SDK для ключа (создается один раз на ключ)"""
+    with _sdk_clients_lock:
+        client = _sdk_clients.get(api_key)
+        if client is None:
+            client = Supadata(api_key=api_key)
+            session = getattr(client, 'session', None)
+            if session is not None:
+                from requests.adapters import HTTPAdapter
+                # Свой транспорт SDK не принимает — расширяем пул его сессии, как у HTTP fallback
+                session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0))
+            _sdk_clients[api_key] = client
+        return client
+
+
+# Опрос асинхронных задач: 1, 2, 4, ... секунд (+ до 50% jitter), не больше 16
+_POLL_BASE_SEC = 1.0
+_POLL_MAX_SEC = 16.0
+_POLL_JITTER = 0.5
+
+
+def _poll_delay(attempt: int) -> float:
+    """Пауза перед attempt-м повторным опросом: экспонента с потолком и jitter"""
+    delay = min(_POLL_MAX_SEC, _POLL_BASE_SEC * (2 ** attempt))
+    return delay * (1 + random.uniform(0, _POLL_JITTER))
+
+
+def _sleep_until_next_poll(attempt: int, deadline: float, retry_after=None) -> None:
+    """Спит до следующего опроса (Retry-After сервера важнее backoff), но не дольше дедлайна"""
+    delay = _poll_delay(attempt)
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            pass
+    time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+
+# Повторы первичного запроса транскрипта на том же ключе: временные сбои
+# не должны сжигать ключи из ротации. unauthorized / bad_url не повторяются
+_TRANSIENT_ERRORS = frozenset(("rate_limited", "server_error", "request_timeout", "network_error"))
+_FETCH_RETRIES = 3
+_FETCH_BACKOFF_BASE_SEC = 1.0
+_FETCH_BACKOFF_MAX_SEC = 30.0
+_FETCH_BACKOFF_JITTER = 0.5
+
+
+def _fetch_with_retries(fetch, log) -> dict:
+    """
+    Вызывает fetch() и повторяет его при временных ошибках (_TRANSIENT_ERRORS)
+    с экспоненциальной задержкой и jitter; Retry-After из ответа важнее расчетной задержки
+    """
+    for attempt in range(_FETCH_RETRIES + 1):
+        try:
+            return fetch()
+        except ValueError as e:
+            error_code = str(e)
+            if error_code not in _TRANSIENT_ERRORS or attempt == _FETCH_RETRIES:
+                raise
+            delay = min(_FETCH_BACKOFF_MAX_SEC, _FETCH_BACKOFF_BASE_SEC * (2 ** attempt))
+            delay *= 1 + random.uniform(0, _FETCH_BACKOFF_JITTER)
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after:
+                try:
+                    delay = min(_FETCH_BACKOFF_MAX_SEC, float(retry_after))
+                except ValueError:
+                    pass
+            log("WARN", "transcribe_mod", "transcript_retry", error=error_code,
+                retry=attempt + 1, max_retries=_FETCH_RETRIES, backoff_sec=round(delay, 2))
+            time.sleep(delay)
+
+
+# Ключи, упершиеся в rate limit: {api_key: время, до которого ключ не используем}.
+# Следующие запросы не тратят на них заведомо неудачный 429
+_key_cooldown: Dict[str, float] = {}
+_key_cooldown_lock = threading.Lock()
+_KEY_COOLDOWN_SEC = 60.0
+# Если в паузе все ключи — ждем ближайший, но не дольше
+_KEY_COOLDOWN_MAX_WAIT_SEC = 60.0
+
+
+def _start_key_cooldown(api_key: str, retry_after=None) -> None:
+    """Откладывает ключ на Retry-After секунд (или _KEY_COOLDOWN_SEC)"""
+    cooldown = _KEY_COOLDOWN_SEC
+    if retry_after:
+        try:
+            cooldown = float(retry_after)
+        except ValueError:
+            pass
+    with _key_cooldown_lock:
+        _key_cooldown[api_key] = time.monotonic() + cooldown
+
+
+def _keys_not_in_cooldown(api_keys: List[str], log) -> List[Tuple[int, str]]:
+    """
+    Ключи (с исходными индексами), которые сейчас не на паузе после 429.
+    Если на паузе все — ждет ближайшего освобождения и возвращает все ключи.
+    """
+    now = time.monotonic()
+    with _key_cooldown_lock:
+        unblock = {key: _key_cooldown.get(key, 0.0) for key in api_keys}
+    available = [(i, key) for i, key in enumerate(api_keys) if unblock[key] <= now]
+    if available:
+        return available
+    
+    wait_sec = min(min(unblock.values()) - now, _KEY_COOLDOWN_MAX_WAIT_SEC)
+    log("WARN", "transcribe_mod", "Все API ключи на паузе после rate limit, ждем",
+        wait_sec=round(wait_sec, 1))
+    time.sleep(wait_sec)
+    return list(enumerate(api_keys))
+
+
+# Склейка одновременных запросов одного URL (дубликаты из очереди): первый вызов
+# идёт в API, остальные ждут его Future. Успешный результат живёт ещё _RESULT_TTL_SEC
+_RESULT_TTL_SEC = 60.0
+_inflight: Dict[str, Future] = {}
+_recent_results: Dict[str, Tuple[float, dict]] = {}
+_inflight_lock = threading.Lock()
 
 
 def fetch_transcript(url: str, config, log) -> dict:
     """
     Получить транскрипт через Supadata SDK или fallback на HTTP API.
     Поддерживает как синхронный, так и асинхронный режимы.
+    Повторный запрос того же URL, пока первый не завершился (или в течение
+    _RESULT_TTL_SEC после успеха), не обращается к API повторно.
     """
+    with _inflight_lock:
+        now = time.monotonic()
+        cached = _recent_results.get(url)
+        if cached is not None and now - cached[0] < _RESULT_TTL_SEC:
+            log("INFO", "transcribe_mod", "Транскрипт взят из недавнего запроса", url=url)
+            return cached[1]
+        future = _inflight.get(url)
+        is_leader = future is None
+        if is_leader:
+            future = _inflight[url] = Future()
+    
+    if not is_leader:
+        log("INFO", "transcribe_mod", "Ожидаем уже идущий запрос транскрипта", url=url)
+        return future.result()
     
+    try:
+        result = _fetch_transcript_uncached(url, config, log)
+    except BaseException as e:
+        future.set_exception(e)
+        with _inflight_lock:
+            _inflight.pop(url, None)
+        raise
+    
+    with _inflight_lock:
+        _inflight.pop(url, None)
+        now = time.monotonic()
+        for stale_url in [u for u, (ts, _) in _recent_results.items() if now - ts >= _RESULT_TTL_SEC]:
+            del _recent_results[stale_url]
+        _recent_results[url] = (now, result)
+    future.set_result(result)
+    return result
+
+
+def _fetch_transcript_uncached(url: str, config, log) -> dict:
+    """Запрос транскрипта в API с перебором ключей"""
     supadata_config = config.get('supadata', {})
     api_keys = supadata_config.get('api_keys', [])
     timeout_sec = supadata_config.get('timeout_sec', 30)
@@ -25,25 +256,33 @@ def fetch_transcript(url: str, config, log) -> dict:
     
     log("INFO", "transcribe_mod", "Начинаем запрос транскрипта", url=url, mode=mode)
     
-    # Пробуем ключи по очереди
-    for i, api_key in enumerate(api_keys):
+    # Пробуем ключи по очереди, пропуская упершиеся в лимит
+    keys_to_try = _keys_not_in_cooldown(api_keys, log)
+    for attempt_index, (i, api_key) in enumerate(keys_to_try):
+        is_last_key = attempt_index == len(keys_to_try) - 1
         log("DEBUG", "transcribe_mod", f"Пробуем API ключ {i+1}/{len(api_keys)}")
         
         try:
             if Supadata is not None:
                 # Используем официальный SDK
-                result = _fetch_with_sdk(url, api_key, mode, timeout_sec, log)
+                result = _fetch_with_retries(
+                    lambda: _fetch_with_sdk(url, api_key, mode, timeout_sec, log), log)
             else:
                 # Fallback на HTTP API
-                result = _fetch_with_http(url, api_key, supadata_config, log)
+                result = _fetch_with_retries(
+                    lambda: _fetch_with_http(url, api_key, supadata_config, log), log)
             
+            with _key_cooldown_lock:
+                _key_cooldown.pop(api_key, None)
             return result
             
         except ValueError as e:
             error_code = str(e)
+            if error_code == 'rate_limited':
+                _start_key_cooldown(api_key, getattr(e, 'retry_after', None))
             
             # Если ошибка связана с авторизацией/лимитами - пробуем следующий ключ
-            if error_code in ['unauthorized', 'rate_limited'] and i < len(api_keys) - 1:
+            if error_code in ['unauthorized', 'rate_limited'] and not is_last_key:
                 log("WARN", "transcribe_mod", f"Ошибка с ключом {i+1}, пробуем следующий", error=error_code)
                 continue
             else:
@@ -51,7 +290,7 @@ def fetch_transcript(url: str, config, log) -> dict:
                 raise
         except Exception as e:
             log("ERROR", "transcribe_mod", f"Неожиданная ошибка с ключом {i+1}", error=str(e))
-            if i < len(api_keys) - 1:
+            if not is_last_key:
                 continue
             else:
                 raise ValueError("unexpected_error")
@@ -66,10 +305,9 @@ def _fetch_with_sdk(url: str, api_key: str, mode: str, timeout_sec: int, log) ->
     Получение транскрипта через официальный Supadata SDK
     """
     try:
-        # Инициализируем клиент
-        client = Supadata(api_key=api_key)
+        client = _get_sdk_client(api_key)
         
-        start_time = time.time()
+        start_time = time.monotonic()
         
         # Запрашиваем транскрипт
         transcript = client.transcript(
@@ -78,7 +316,7 @@ def _fetch_with_sdk(url: str, api_key: str, mode: str, timeout_sec: int, log) ->
             mode=mode
         )
         
-        request_time = time.time() - start_time
+        request_time = time.monotonic() - start_time
         log("INFO", "transcribe_mod", "Получен ответ от Supadata SDK", 
             request_time=f"{request_time:.2f}s")
         
@@ -104,12 +342,13 @@ def _fetch_with_sdk(url: str, api_key: str, mode: str, timeout_sec: int, log) ->
     except SupadataError as e:
         log("ERROR", "transcribe_mod", "Ошибка Supadata SDK", error_code=e.error, message=e.message)
         
-        # Мапим ошибки SDK в наши коды
-        if 'unauthorized' in e.error.lower() or 'authentication' in e.error.lower():
+        # Мапим ошибки SDK в наши коды (строки приводим к нижнему регистру один раз)
+        error_lower = e.error.lower()
+        if 'unauthorized' in error_lower or 'authentication' in error_lower:
             raise ValueError("unauthorized")
-        elif 'rate' in e.error.lower() or 'limit' in e.error.lower():
+        elif 'rate' in error_lower or 'limit' in error_lower:
             raise ValueError("rate_limited")
-        elif 'invalid' in e.error.lower() and 'url' in e.message.lower():
+        elif 'invalid' in error_lower and 'url' in e.message.lower():
             raise ValueError("bad_url")
         else:
             raise ValueError("server_error")
@@ -122,10 +361,11 @@ def _poll_sdk_job(client, job_id: str, timeout_sec: int, log) -> dict:
     """
     Опрашиваем статус асинхронной задачи через SDK
     """
-    start_time = time.time()
-    poll_interval = 2
+    deadline = time.monotonic() + timeout_sec
+    attempt = 0
+    last_status = None
     
-    while time.time() - start_time < timeout_sec:
+    while time.monotonic() < deadline:
         try:
             # Пробуем получить результаты
             # Примечание: это может потребовать уточнения API
@@ -145,34 +385,62 @@ def _poll_sdk_job(client, job_id: str, timeout_sec: int, log) -> dict:
             elif results.status == 'failed':
                 log("ERROR", "transcribe_mod", "Асинхронная задача провалилась", job_id=job_id)
                 raise ValueError("async_job_failed")
-            elif results.status in ['pending', 'processing']:
+            
+            # Задача продвинулась (pending -> processing) — снова опрашиваем чаще
+            if results.status != last_status:
+                last_status = results.status
+                attempt = 0
+            
+            if results.status in ['pending', 'processing']:
                 log("DEBUG", "transcribe_mod", "Асинхронная задача выполняется", 
                     job_id=job_id, status=results.status)
-                time.sleep(poll_interval)
-                continue
             else:
                 log("WARN", "transcribe_mod", "Неизвестный статус задачи", 
                     job_id=job_id, status=results.status)
-                time.sleep(poll_interval)
-                continue
                 
         except Exception as e:
             log("WARN", "transcribe_mod", "Ошибка при опросе статуса SDK", error=str(e))
-            time.sleep(poll_interval)
-            continue
+        
+        _sleep_until_next_poll(attempt, deadline)
+        attempt += 1
     
     log("ERROR", "transcribe_mod", "Таймаут опроса асинхронной задачи SDK", 
         job_id=job_id, timeout_sec=timeout_sec)
     raise ValueError("job_timeout")
 
 
+def _read_transcript_json(response) -> dict:
+    """
+    JSON ответа с транскриптом. С ijson верхние ключи читаются потоком прямо из сокета:
+    в памяти не держатся одновременно сырые байты, декодированная строка и dict
+    """
+    if ijson is None:
+        return response.json()
+    if HTTP2_AVAILABLE:
+        return dict(ijson.kvitems(_ChunkReader(response.iter_bytes()), '', use_float=True))
+    # Снимаем gzip/deflate, которые requests иначе распаковывает только в .content
+    response.raw.decode_content = True
+    return dict(ijson.kvitems(response.raw, '', use_float=True))
+
+
+class _ChunkReader:
+    """Файлоподобная обертка над итератором байтовых чанков httpx (для ijson)"""
+    
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+    
+    def read(self, size: int = -1) -> bytes:
+        return next(self._chunks, b'')
+
+
 def _fetch_with_http(url: str, api_key: str, supadata_config: dict, log) -> dict:
     """
     Fallback метод для работы через HTTP API в случае отсутствия SDK
     """
-    import requests
     import json
     
+    timeout_error, network_error = _http_errors()
+    
     base_url = supadata_config.get('base_url')
     timeout_sec = supadata_config.get('timeout_sec', 30)
     mode = supadata_config.get('mode', 'auto')
@@ -189,73 +457,89 @@ def _fetch_with_http(url: str, api_key: str, supadata_config: dict, log) -> dict
     
     try:
         log("INFO", "transcribe_mod", "Используем HTTP fallback API")
-        start_time = time.time()
-        response = requests.get(base_url, params=params, headers=headers, timeout=timeout_sec)
-        request_time = time.time() - start_time
+        start_time = time.monotonic()
+        response = _http_get(base_url, headers, timeout_sec, params=params, stream=ijson is not None)
+        request_time = time.monotonic() - start_time
         
         log("INFO", "transcribe_mod", "Получен ответ от HTTP API", 
             status_code=response.status_code, request_time=f"{request_time:.2f}s")
+        log("DEBUG", "transcribe_mod", "Протокол HTTP API",
+            http_version=getattr(response, 'http_version', 'HTTP/1.1'))
         
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                if 'content' in data and 'lang' in data:
-                    content_len = len(data['content'])
-                    log("INFO", "transcribe_mod", "Транскрипт получен через HTTP API", 
-                        lang=data['lang'], content_length=content_len)
-                    return {
-                        'content': data['content'],
-                        'lang': data['lang'],
-                        'meta': data
-                    }
-                else:
-                    raise ValueError("unexpected_response_format")
-            except json.JSONDecodeError:
-                raise ValueError("json_decode_error")
+        # stream=True (при ijson): тело 200-ответа разбирается потоком; closing возвращает
+        # соединение в пул и для ответов, тело которых не читалось
+        with contextlib.closing(response):
+            if response.status_code == 200:
+                try:
+                    data = _read_transcript_json(response)
+                    if 'content' in data and 'lang' in data:
+                        content_len = len(data['content'])
+                        log("INFO", "transcribe_mod", "Транскрипт получен через HTTP API", 
+                            lang=data['lang'], content_length=content_len)
+                        return {
+                            'content': data['content'],
+                            'lang': data['lang'],
+                            'meta': data
+                        }
+                    else:
+                        raise ValueError("unexpected_response_format")
+                except (json.JSONDecodeError, *_STREAM_JSON_ERRORS):
+                    raise ValueError("json_decode_error")
         
-        elif response.status_code == 202:
-            try:
-                data = response.json()
-                if 'jobId' in data:
-                    job_id = data['jobId']
-                    log("INFO", "transcribe_mod", "Получен jobId через HTTP API", job_id=job_id)
-                    return _poll_http_job_status(job_id, api_key, supadata_config, log)
-                else:
-                    raise ValueError("no_job_id")
-            except json.JSONDecodeError:
-                raise ValueError("json_decode_error")
+            elif response.status_code == 202:
+                # Потоковый ответ httpx нельзя разобрать .json() без явного чтения тела
+                # (requests дочитывает его сам)
+                if HTTP2_AVAILABLE:
+                    response.read()
+                try:
+                    data = response.json()
+                    if 'jobId' in data:
+                        job_id = data['jobId']
+                        log("INFO", "transcribe_mod", "Получен jobId через HTTP API", job_id=job_id)
+                    else:
+                        raise ValueError("no_job_id")
+                except (json.JSONDecodeError, *_STREAM_JSON_ERRORS):
+                    raise ValueError("json_decode_error")
         
-        elif response.status_code in [401, 403]:
-            raise ValueError("unauthorized")
-        elif response.status_code == 429:
-            raise ValueError("rate_limited")
-        elif response.status_code >= 500:
-            raise ValueError("server_error")
-        elif response.status_code == 400:
-            raise ValueError("bad_url")
-        else:
-            raise ValueError("unexpected_status")
+            elif response.status_code in [401, 403]:
+                raise ValueError("unauthorized")
+            elif response.status_code == 429:
+                error = ValueError("rate_limited")
+                error.retry_after = response.headers.get('Retry-After')
+                raise error
+            elif response.status_code >= 500:
+                raise ValueError("server_error")
+            elif response.status_code == 400:
+                raise ValueError("bad_url")
+            else:
+                raise ValueError("unexpected_status")
+        
+        # Сюда доходит только 202 с jobId; исходный ответ уже закрыт и не держит
+        # соединение на время опроса
+        return _poll_http_job_status(job_id, api_key, supadata_config, log)
             
-    except requests.exceptions.Timeout:
+    except timeout_error:
         raise ValueError("request_timeout")
-    except requests.exceptions.RequestException:
+    except network_error:
         raise ValueError("network_error")
 
 
 def _poll_http_job_status(job_id: str, api_key: str, supadata_config: dict, log) -> dict:
     """Опрашиваем статус асинхронной задачи через HTTP"""
-    import requests
+    _, network_error = _http_errors()
     
     timeout_sec = supadata_config.get('timeout_sec', 30)
     base_url = supadata_config.get('base_url')
     headers = {'x-api-key': api_key}
     
-    start_time = time.time()
-    poll_interval = 2
+    deadline = time.monotonic() + timeout_sec
+    attempt = 0
+    last_status = None
     
-    while time.time() - start_time < timeout_sec:
+    while time.monotonic() < deadline:
+        retry_after = None
         try:
-            status_response = requests.get(f"{base_url}/status/{job_id}", headers=headers, timeout=10)
+            status_response = _http_get(f"{base_url}/status/{job_id}", headers, 10)
             
             if status_response.status_code == 200:
                 data = status_response.json()
@@ -275,22 +559,23 @@ def _poll_http_job_status(job_id: str, api_key: str, supadata_config: dict, log)
                 elif status == 'failed':
                     raise ValueError("async_job_failed")
                 
-                elif status in ['pending', 'processing']:
+                # Задача продвинулась (pending -> processing) — снова опрашиваем чаще
+                if status != last_status:
+                    last_status = status
+                    attempt = 0
+                
+                if status in ['pending', 'processing']:
                     log("DEBUG", "transcribe_mod", "Опрашиваем статус задачи (HTTP)", 
                         job_id=job_id, status=status)
-                    time.sleep(poll_interval)
-                    continue
-                
-                else:
-                    time.sleep(poll_interval)
-                    continue
             
             else:
-                time.sleep(poll_interval)
-                continue
+                # 429/503: сервер сам подсказывает, когда спрашивать снова
+                retry_after = status_response.headers.get('Retry-After')
                 
-        except requests.exceptions.RequestException:
-            time.sleep(poll_interval)
-            continue
+        except network_error:
+            pass
+        
+        _sleep_until_next_poll(attempt, deadline, retry_after)
+        attempt += 1
     
     raise ValueError("job_timeout")
\ No newline at end of file
@@ -1,11 +1,12 @@
 import threading
 import time
-from typing import List, Optional, Dict, Any
+from collections import deque
+from typing import Deque, Optional, Dict, Any, List
 from dataclasses import dataclass
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class UrlTask:
     """Задача обработки URL"""
     url: str
@@ -32,9 +33,11 @@ class UrlQueue:
             max_size: максимальный размер очереди
         """
         self.max_size = max_size
-        self._queue: List[UrlTask] = []
+        # deque: извлечение из головы за O(1); размер ограничивает add_url (maxlen молча вытеснял бы задачи)
+        self._queue: Deque[UrlTask] = deque()
         self._lock = threading.Lock()
-        self._processing_task: Optional[UrlTask] = None
+        # Задачи, выданные на обработку (пачкой может обрабатываться несколько сразу)
+        self._processing_tasks: List[UrlTask] = []
     
     def add_url(self, url: str, source: str = "unknown") -> Dict[str, Any]:
         """
@@ -82,13 +85,23 @@ class UrlQueue:
         Returns:
             UrlTask или None если очередь пуста
         """
+        tasks = self.get_next_urls(1)
+        return tasks[0] if tasks else None
+    
+    def get_next_urls(self, limit: int) -> List[UrlTask]:
+        """
+        Извлекает до limit задач из головы очереди для параллельной обработки
+        
+        Args:
+            limit: максимальное число задач
+            
+        Returns:
+            Список UrlTask в порядке очереди (пустой, если очередь пуста)
+        """
         with self._lock:
-            if not self._queue:
-                return None
-                
-            task = self._queue.pop(0)
-            self._processing_task = task
-            return task
+            tasks = [self._queue.popleft() for _ in range(min(limit, len(self._queue)))]
+            self._processing_tasks.extend(tasks)
+            return tasks
     
     def mark_completed(self, task_id: str) -> bool:
         """
@@ -101,10 +114,10 @@ class UrlQueue:
             True если задача была в обработке
         """
         with self._lock:
-            if (self._processing_task and 
-                self._processing_task.task_id == task_id):
-                self._processing_task = None
-                return True
+            for i, task in enumerate(self._processing_tasks):
+                if task.task_id == task_id:
+                    del self._processing_tasks[i]
+                    return True
             return False
     
     def get_queue_status(self) -> Dict[str, Any]:
@@ -114,25 +127,32 @@ class UrlQueue:
         Returns:
             Dict со статусом очереди
         """
+        # Под блокировкой только копируем состояние; словари и strftime — снаружи,
+        # чтобы не задерживать add_url / get_next_url
         with self._lock:
-            return {
-                'queue_size': len(self._queue),
-                'max_size': self.max_size,
-                'is_full': len(self._queue) >= self.max_size,
-                'is_empty': len(self._queue) == 0,
-                'processing_task': (
-                    self._processing_task.task_id if self._processing_task else None
-                ),
-                'waiting_tasks': [
-                    {
-                        'task_id': task.task_id,
-                        'url': task.url,
-                        'source': task.source,
-                        'added_at': task.added_at.strftime('%H:%M:%S')
-                    }
-                    for task in self._queue
-                ]
-            }
+            waiting = list(self._queue)
+            processing_tasks = list(self._processing_tasks)
+        
+        queue_size = len(waiting)
+        return {
+            'queue_size': queue_size,
+            'max_size': self.max_size,
+            'is_full': queue_size >= self.max_size,
+            'is_empty': queue_size == 0,
+            'processing_task': (
+                processing_tasks[0].task_id if processing_tasks else None
+            ),
+            'processing_tasks': [task.task_id for task in processing_tasks],
+            'waiting_tasks': [
+                {
+                    'task_id': task.task_id,
+                    'url': task.url,
+                    'source': task.source,
+                    'added_at': task.added_at.strftime('%H:%M:%S')
+                }
+                for task in waiting
+            ]
+        }
     
     def clear_queue(self) -> Dict[str, Any]:
         """
@@ -180,7 +200,8 @@ class UrlQueue:
         with self._lock:
             for i, task in enumerate(self._queue):
                 if task.task_id == task_id:
-                    removed_task = self._queue.pop(i)
+                    removed_task = self._queue[i]
+                    del self._queue[i]
                     return {
                         'success': True,
                         'message': f'Задача {task_id} удалена из очереди',
@@ -1,18 +1,36 @@
 import re
 import time
-import sys
-import os
-from typing import Dict, Any, Optional
-from pathlib import Path
+import zlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
 import datetime
 
-# Добавляем путь для импорта существующих модулей
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-import log_mod
 import transcribe_mod
-import ai_chat
-import notion_mod
+
+# notion_mod (notion-client, httpx) и ai_chat импортируются в месте использования:
+# модулю, которому нужен только разбор URL, они не грузятся
+
+
+# Клиент и база Notion по настройкам: {(token, database_id, parent_page_url): (время, client, db_info)}
+_NOTION_CACHE_TTL_SEC = 3600
+_notion_cache: Dict[tuple, tuple] = {}
+_notion_cache_lock = threading.Lock()
+
+# Допустимые YouTube URL (youtube.com/watch с www./m./music. и youtu.be), группа 1 — ID видео
+_YOUTUBE_URL_RE = re.compile(
+    r'^https?://(?:(?:(?:www|m|music)\.)?youtube\.com/watch\?v=|(?:www\.)?youtu\.be/)([\w-]+)'
+)
+
+# Длина префикса URL, в котором должно встретиться "youtu" (https://music.youtu...)
+_HOST_PREFIX_LEN = 24
+
+# Поиск ID видео в произвольной строке; порядок важен — первый совпавший шаблон
+_VIDEO_ID_RES = (
+    re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([a-zA-Z0-9_-]+)'),
+    re.compile(r'youtube\.com/v/([a-zA-Z0-9_-]+)'),
+)
 
 
 def generate_run_id(video_id: str) -> int:
@@ -32,13 +50,10 @@ def generate_run_id(video_id: str) -> int:
     minutes = now.minute
     seconds = now.second
     
-    # Создаем строку из video_id и времени
-    # Используем хеширование для получения числового значения
-    time_component = minutes * 100 + seconds  # Простое представление времени как MMSS
-    
-    # Комбинируем video_id и время, затем хешируем
+    # Комбинируем video_id и время (MM:SS), затем хешируем.
+    # crc32, а не hash(): встроенный hash строк рандомизирован между запусками
     combined = f"{video_id}_{minutes:02d}:{seconds:02d}"
-    hash_value = hash(combined) & 0x7FFFFFFF  # Обеспечиваем положительное значение
+    hash_value = zlib.crc32(combined.encode('utf-8')) & 0x7FFFFFFF  # Обеспечиваем положительное значение
     
     # Возвращаем хеш как run_id
     return hash_value
@@ -54,24 +69,28 @@ def validate_youtube_url(url: str) -> bool:
     Returns:
         True если URL валидный YouTube адрес
     """
+    return parse_youtube_url(url) is not None
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_youtube_url(url: str) -> Optional[str]:
+    """
+    Проверка и извлечение ID за одно сопоставление: ID видео, если URL валидный
+    YouTube адрес (как validate_youtube_url), иначе None
+    """
     if not url or not isinstance(url, str):
-        return False
-    
-    # Паттерны YouTube URL
-    youtube_patterns = [
-        r'^https?://(?:www\.)?youtube\.com/watch\?v=[\w-]+',
-        r'^https?://(?:www\.)?youtu\.be/[\w-]+',
-        r'^https?://(?:m\.)?youtube\.com/watch\?v=[\w-]+',
-        r'^https?://(?:music\.)?youtube\.com/watch\?v=[\w-]+',
-    ]
+        return None
     
-    for pattern in youtube_patterns:
-        if re.match(pattern, url.strip()):
-            return True
+    url = url.strip()
+    # Дешевый отсев мусора из чата до regex
+    if not url.startswith(('https://', 'http://')) or 'youtu' not in url[:_HOST_PREFIX_LEN]:
+        return None
     
-    return False
+    match = _YOUTUBE_URL_RE.match(url)
+    return match.group(1) if match else None
 
 
+@functools.lru_cache(maxsize=1024)
 def extract_video_id(url: str) -> Optional[str]:
     """
     Извлекает video ID из YouTube URL
@@ -82,19 +101,55 @@ def extract_video_id(url: str) -> Optional[str]:
     Returns:
         Video ID или None
     """
-    patterns = [
-        r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([a-zA-Z0-9_-]+)',
-        r'youtube\.com/v/([a-zA-Z0-9_-]+)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in _VIDEO_ID_RES:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     
     return None
 
 
+def _get_notion_database(config: Dict[str, Any], log_func):
+    """
+    Клиент Notion и информация о базе, закэшированные на _NOTION_CACHE_TTL_SEC:
+    init_client/ensure_database не повторяются на каждую ссылку
+    """
+    notion_config = config.get('notion', {})
+    cache_key = (notion_config.get('token'), notion_config.get('database_id'),
+                 notion_config.get('parent_page_url'))
+    with _notion_cache_lock:
+        cached = _notion_cache.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < _NOTION_CACHE_TTL_SEC:
+        return cached[1], cached[2]
+    
+    import notion_mod
+    notion_client = notion_mod.init_client(config, log_func)
+    if not notion_client:
+        return None, None
+    notion_db_info = notion_mod.ensure_database(notion_client, config, log_func)
+    if notion_db_info:
+        # Неудачу не кэшируем — следующая ссылка попробует снова
+        with _notion_cache_lock:
+            _notion_cache[cache_key] = (time.monotonic(), notion_client, notion_db_info)
+    return notion_client, notion_db_info
+
+
+def _prepare_notion_page(url: str, run_id: int, config: Dict[str, Any], log_func):
+    """
+    Инициализирует клиент Notion, проверяет базу и создает/находит страницу запуска.
+    Возвращает (client, page_id); None на месте того, что подготовить не удалось.
+    """
+    notion_client, notion_db_info = _get_notion_database(config, log_func)
+    if not notion_client or not notion_db_info:
+        return notion_client, None
+    import notion_mod
+    created_at_iso = datetime.date.today().isoformat()
+    notion_page_id = notion_mod.upsert_page_for_run(
+        notion_client, notion_db_info['id'], run_id, url, None, created_at_iso, log_func
+    )
+    return notion_client, notion_page_id
+
+
 def process_youtube_url(url: str, config: Dict[str, Any], log_func=None) -> Dict[str, Any]:
     """
     Универсальная функция обработки YouTube URL
@@ -122,7 +177,7 @@ def process_youtube_url(url: str, config: Dict[str, Any], log_func=None) -> Dict
     if log_func is None:
         log_func = lambda level, module, message, **kwargs: None
 
-    start_time = time.time()
+    start_time = time.monotonic_ns()
     processing_times = {}
     video_id = None  # Инициализируем video_id заранее
     
@@ -147,27 +202,22 @@ def process_youtube_url(url: str, config: Dict[str, Any], log_func=None) -> Dict
         # Генерируем уникальный run_id
         run_id = generate_run_id(video_id) if video_id else 0
         
-        # Инициализируем Notion если включен
-        notion_client = None
-        notion_page_id = None
+        # Инициализируем Notion если включен: клиент, база и страница готовятся в фоне,
+        # параллельно с транскрибацией и AI — до сохранения результатов они не нужны
+        notion_future = None
         notion_config = config.get('notion', {})
         if notion_config.get('enabled', False):
-            notion_client = notion_mod.init_client(config, log_func)
-            if notion_client:
-                notion_db_info = notion_mod.ensure_database(notion_client, config, log_func)
-                if notion_db_info:
-                    created_at_iso = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    notion_page_id = notion_mod.upsert_page_for_run(
-                        notion_client, notion_db_info['id'], run_id, url, None, created_at_iso, log_func
-                    )
+            notion_executor = ThreadPoolExecutor(max_workers=1)
+            notion_future = notion_executor.submit(_prepare_notion_page, url, run_id, config, log_func)
+            notion_executor.shutdown(wait=False)
         
         # Шаг 1: Транскрибация
         log_func("INFO", "yt_processor", "Получаем транскрипт")
-        transcript_start = time.time()
+        transcript_start = time.monotonic_ns()
         
         try:
             transcript_result = transcribe_mod.fetch_transcript(url, config, log_func)
-            processing_times['transcript'] = int((time.time() - transcript_start) * 1000)
+            processing_times['transcript'] = (time.monotonic_ns() - transcript_start) // 1_000_000
             
             if not transcript_result or not transcript_result.get('content'):
                 return {
@@ -198,11 +248,12 @@ def process_youtube_url(url: str, config: Dict[str, Any], log_func=None) -> Dict
         
         # Шаг 2: AI обработка
         log_func("INFO", "yt_processor", "Запускаем AI обработку")
-        ai_start = time.time()
+        ai_start = time.monotonic_ns()
         
         try:
+            import ai_chat
             ai_results = ai_chat.process_transcript_chat(transcript_result['content'], config, log_func)
-            processing_times['ai'] = int((time.time() - ai_start) * 1000)
+            processing_times['ai'] = (time.monotonic_ns() - ai_start) // 1_000_000
             
             if ai_results.get('error'):
                 # AI обработка завершилась с ошибкой
@@ -242,28 +293,31 @@ def process_youtube_url(url: str, config: Dict[str, Any], log_func=None) -> Dict
         }
         
         # Сохраняем в Notion если включено
+        notion_client, notion_page_id = None, None
+        if notion_future is not None:
+            try:
+                notion_client, notion_page_id = notion_future.result()
+            except Exception as e:
+                log_func("ERROR", "yt_processor", "Ошибка подготовки страницы Notion", error=str(e))
         if notion_client and notion_page_id:
             try:
+                import notion_mod
                 # Получаем максимальную длину свойства из конфигурации
                 prop_max_len = notion_config.get('prop_max_len', 1950)
                 
-                # Обновляем страницу с результатами, используя функцию с обработкой переполнения
-                # Шорт саммари
-                notion_mod.set_rich_text(notion_client, notion_page_id, "Шорт саммари", 
-                                       summaries['short'], prop_max_len, log_func)
-                
-                # Мидл саммари
-                notion_mod.set_rich_text(notion_client, notion_page_id, "Мидл саммари", 
-                                       summaries['middle'], prop_max_len, log_func)
-                
-                # Фулл саммари с обработкой переполнения
-                notion_mod.set_rich_text_with_overflow(notion_client, notion_page_id, 
-                                                     "Фулл саммари", summaries['full'], 
-                                                     prop_max_len, "Большое саммари 2", log_func)
+                # Все саммари и Материалы обновляем одним запросом; остаток длинного
+                # Фулл саммари уходит в дополнительное свойство того же запроса
+                properties = {
+                    "Шорт саммари": summaries['short'],
+                    "Мидл саммари": summaries['middle'],
+                    "Материалы": summaries['resources'],
+                }
+                properties.update(notion_mod.overflow_texts(
+                    notion_client, notion_page_id, "Фулл саммари", summaries['full'],
+                    prop_max_len, "Большое саммари 2", log_func))
                 
-                # Материалы
-                notion_mod.set_rich_text(notion_client, notion_page_id, "Материалы", 
-                                       summaries['resources'], prop_max_len, log_func)
+                notion_mod.set_properties_bulk(notion_client, notion_page_id, properties,
+                                               prop_max_len, log_func)
                 
                 log_func("INFO", "yt_processor", "Результаты сохранены в Notion", page_id=notion_page_id)
             except Exception as e:
@@ -271,7 +325,7 @@ def process_youtube_url(url: str, config: Dict[str, Any], log_func=None) -> Dict
                 log_func("ERROR", "yt_processor", error_msg, error=str(e))
                 # Не прерываем основной процесс из-за ошибки Notion
         
-        processing_times['total'] = int((time.time() - start_time) * 1000)
+        processing_times['total'] = (time.monotonic_ns() - start_time) // 1_000_000
         
         return {
             'success': True,
@@ -296,5 +350,51 @@ def process_youtube_url(url: str, config: Dict[str, Any], log_func=None) -> Dict
             'transcript': None,
             'ai_results': None,
             'summaries': None,
-            'processing_time': {'total': int((time.time() - start_time) * 1000) if 'start_time' in locals() else 0}
-        }
\ No newline at end of file
+            'processing_time': {'total': (time.monotonic_ns() - start_time) // 1_000_000 if 'start_time' in locals() else 0}
+        }
+
+# Сколько URL обрабатывается одновременно по умолчанию: этапы почти целиком
+# ждут сеть (Supadata, Gemini, Notion), поэтому потоки перекрывают ожидания
+DEFAULT_URL_CONCURRENCY = 4
+
+
+def process_youtube_urls(urls: List[str], config: Dict[str, Any], log_func=None,
+                         concurrency: int = DEFAULT_URL_CONCURRENCY,
+                         on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Пакетная обработка: до concurrency URL параллельно через process_youtube_url.
+    Повторы одного видео в пачке обрабатываются один раз
+    
+    Args:
+        urls: список YouTube URL
+        config: конфигурация приложения
+        log_func: функция логирования
+        concurrency: максимум одновременно обрабатываемых URL
+        on_result: вызывается (индекс, результат) сразу по готовности каждого URL,
+                   не дожидаясь остальных (из рабочего потока)
+        
+    Returns:
+        Результаты process_youtube_url в порядке urls
+    """
+    if not urls:
+        return []
+    
+    # Одно видео в пачке обрабатываем один раз: копии получили бы тот же run_id
+    # (video_id + MM:SS) и наперегонки создали бы две страницы Notion.
+    # Результат раздается всем задачам, которые его запросили
+    groups: Dict[str, List[int]] = {}
+    for index, url in enumerate(urls):
+        groups.setdefault(extract_video_id(url) or url, []).append(index)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+    
+    def _process(indices: List[int]) -> None:
+        result = process_youtube_url(urls[indices[0]], config, log_func)
+        for index in indices:
+            results[index] = result
+            if on_result is not None:
+                on_result(index, result)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(groups)))) as executor:
+        for _ in executor.map(_process, groups.values()):
+            pass
+    return results
@@ -6,30 +6,134 @@ Main entry point for the application
 
 import sys
 import os
+import mmap
+import pickle
+import stat
+import struct
 from pathlib import Path
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
 
-import yaml
 import log_mod
-import src.telegram_main as telegram_main
+
+# yaml and telegram_main are imported where they are used: a cached config skips
+# the YAML parser, and a missing config exits before the Telegram stack loads
+
+_CONFIG_PATH = Path(__file__).resolve().parent / "config_prod" / "app.yaml"
+_CONFIG_CACHE_PATH = _CONFIG_PATH.with_suffix('.yaml.pkl')
+
+# Parsed config sidecar: header (mtime_ns, size) of app.yaml + pickled dict
+_CACHE_HEADER = struct.Struct('<qq')
+
+
+def _cache_file_trusted(st):
+    """
+    The sidecar is unpickled, so it must be a regular file owned by us and not
+    writable or readable by anyone else (it also holds the tokens from app.yaml)
+    """
+    if not stat.S_ISREG(st.st_mode):
+        return False
+    if not hasattr(os, 'getuid'):
+        # No POSIX owner/mode bits (Windows): rely on the directory ACL
+        return True
+    return st.st_uid == os.getuid() and not (st.st_mode & 0o077)
+
+
+def _read_config_cache(cache_path, header):
+    """Return the cached config if it was built from the current app.yaml, else None"""
+    try:
+        fd = os.open(cache_path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except OSError:
+        return None
+    try:
+        with os.fdopen(fd, 'rb') as f:
+            if not _cache_file_trusted(os.fstat(f.fileno())):
+                return None
+            if f.read(_CACHE_HEADER.size) != header:
+                return None
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def _write_config_cache(cache_path, header, config):
+    """Atomically store the parsed config; a read-only config dir just skips caching"""
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        # Fresh owner-only file: O_EXCL refuses a planted file or symlink at tmp_path
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            pickle.dump(config, f, protocol=5)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def _config_error(message):
+    """Report a configuration problem on stderr and stop"""
+    sys.stderr.write("ERROR: " + message + "\n")
+    sys.exit(1)
+
+
+# Sections every module reads with config.get(section, {}); each must be a mapping
+_CONFIG_SECTIONS = ('telegram', 'logging', 'supadata', 'ai', 'notion', 'excel')
+
+
+def _validate_config(config):
+    """Check the config shape once at startup; return an error message or None"""
+    if not isinstance(config, dict):
+        return "Configuration root must be a mapping"
+    for section in _CONFIG_SECTIONS:
+        if not isinstance(config.get(section, {}), dict):
+            return f"Configuration section '{section}' must be a mapping"
+    token = config.get('telegram', {}).get('bot_token')
+    if not isinstance(token, str) or not token:
+        return "telegram.bot_token is required"
+    return None
+
 
 def load_config():
     """Load production configuration"""
-    config_path = Path(__file__).parent / "config_prod" / "app.yaml"
-    
-    if not config_path.exists():
-        print(f"ERROR: Configuration file not found: {config_path}")
-        sys.exit(1)
-    
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+        # Reuse the parsed config while app.yaml is unchanged; any edit changes mtime/size.
+        # The same stat doubles as the existence check
+        st = _CONFIG_PATH.stat()
+        header = _CACHE_HEADER.pack(st.st_mtime_ns, st.st_size)
+        config = _read_config_cache(_CONFIG_CACHE_PATH, header)
+        if config is not None:
+            return config
+        
+        import yaml
+        # Use the libyaml-backed loader when PyYAML is built with it
+        SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        
+        # libyaml reads the mapped bytes and decodes UTF-8 itself; an empty file cannot be mapped
+        try:
+            with open(_CONFIG_PATH, 'rb') as f:
+                if st.st_size == 0:
+                    config = yaml.load(b'', Loader=SafeLoader)
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        config = yaml.load(mm, Loader=SafeLoader)
+        except yaml.YAMLError as e:
+            _config_error("Failed to read configuration: " + str(e))
+        
+        # Only a valid config reaches the sidecar, so a cache hit needs no re-check
+        error = _validate_config(config)
+        if error is not None:
+            _config_error(error)
+        _write_config_cache(_CONFIG_CACHE_PATH, header, config)
         return config
-    except Exception as e:
-        print(f"ERROR: Failed to read configuration: {e}")
-        sys.exit(1)
+    except FileNotFoundError:
+        _config_error("Configuration file not found: " + str(_CONFIG_PATH))
+    except OSError as e:
+        _config_error("Failed to read configuration: " + str(e))
 
 def main():
     """Main entry point for the production bot"""
@@ -38,6 +142,8 @@ def main():
     # Load configuration
     config = load_config()
     
+    import src.telegram_main as telegram_main
+    
     # Initialize logging
     log_mod.init_logging(config)
     log = log_mod.log
@@ -52,7 +158,7 @@ def main():
         log("INFO", "main", "Bot stopped by user")
     except Exception as e:
         print(f"❌ Fatal error: {e}")
-        log("ERROR", "main", "Fatal error", error=str(e))
+        log("ERROR", "main", "Fatal error", error=e)
         sys.exit(1)
 
 if __name__ == "__main__":